@@ -0,0 +1 @@
+"""Lets the tests import the src package from the repository root"""
@@ -0,0 +1,161 @@
+"""Adaptive Tiered Analysis
+
+Most captures are far from every compliance threshold, so their verdicts do not need the
+full-resolution pipeline. estimate() computes the frequency and percent flicker from a
+decimated copy of the capture, with bounds on each. When the verdicts of every standard are the
+same everywhere within the bounds (see standards.verdicts_constant), the estimate is kept;
+otherwise the capture is escalated to the full pipeline (see waveform.adaptive_import).
+
+The bounds are heuristic, not statistical guarantees. They bound the values the full pipeline
+would report, which are not always those of the light:
+
+    * Frequency: the estimate is 1 / mean period, with periods segmented at rising edges
+      through the midpoint with hysteresis (see periods.period_starts). The full pipeline
+      instead averages the intervals between every crossing of v_avg (see waveform.frequency),
+      which is biased when half periods of unequal length (e.g. PWM) are not paired, and moves
+      by about 1 / (number of crossings) with every spurious crossing, e.g. from a glitch near
+      v_avg. The bounds span both estimators, widened by the relative spread of the periods,
+      a fixed relative margin, the timing resolution of the decimated data and CROSSING_SLACK
+      spurious or missed crossings, then the rounding of the full pipeline. Glitches are too
+      short to see in the decimated data, so captures with fewer than MIN_CROSSINGS crossings,
+      where a single glitch moves the frequency by more than the margin, are unbounded.
+    * Percent flicker: block averaging shrinks the peaks, so the estimate is computed at two
+      decimation levels. The bound adds the difference between them (the attenuation) to a
+      relative and an absolute margin, which cover the denoising of the full pipeline.
+    * When the denoise window of the full pipeline spans more than MAX_WINDOW_FRACTION of a
+      period (e.g. 1 kHz PWM sampled at 1 MHz), the filter rather than the light sets the
+      shape, and so the percent flicker and frequency, of the full pipeline: both are unbounded.
+
+Unbounded values (0, inf) always escalate the capture to the full pipeline.
+
+The tier only pays off for long captures away from the thresholds. The estimate of a 0.5 s,
+500 kHz capture takes about 2 ms against about 100 ms for the full analysis, but parsing the
+same capture from CSV takes about 600 ms, so most of the saving comes with binary or in-memory
+inputs. Short captures always escalate: the sample CSVs in this repository are 28 ms long,
+with fewer than MIN_CROSSINGS crossings, so for them adaptive_import costs the estimate on top
+of the full pipeline, and batch_import should be used instead.
+
+The functions are:
+
+    * estimate - Estimates the frequency and percent flicker of a waveform, with bounds
+"""
+
+import numpy as np
+from . import kernels
+from .screening import decimate
+from .periods import period_starts
+
+
+# The frame rate the capture is decimated to, which also smooths it like the denoising stage
+ESTIMATE_RATE = 10000
+
+# The maximum number of samples the estimate is computed from
+ESTIMATE_SAMPLES = 65536
+
+# Relative frequency margin
+FREQUENCY_MARGIN = 0.05
+
+# Relative and absolute (percentage points) percent flicker margins
+PERCENT_FLICKER_MARGIN = (0.15, 1.0)
+
+# The number of spurious or missed crossings of v_avg the frequency bounds allow for
+CROSSING_SLACK = 2
+
+# Captures with fewer crossings of v_avg have unbounded frequencies, as a single glitch near
+# v_avg moves the frequency of the full pipeline by more than about 1 / MIN_CROSSINGS
+MIN_CROSSINGS = 40
+
+# The window length of the denoise stage of the full pipeline
+DENOISE_WINDOW = 901
+
+# Captures whose period is shorter than the denoise window over this fraction are unbounded
+MAX_WINDOW_FRACTION = 0.25
+
+UNBOUNDED = (0.0, np.inf)
+
+
+def _percent_flicker(volts:np.ndarray) -> float:
+    v_max = volts.max()
+    return (v_max - volts.min()) / v_max * 100
+
+
+def _rounded_bounds(low:float, high:float) -> tuple:
+    """Widens frequency bounds to the values frequency() may round them to"""
+
+    (low, high) = (max(low - 0.5, 0.0), high + 0.5)
+
+    # frequency() rounds everything in the range 115-130 Hz to 120 Hz
+    if low <= 130 and high >= 115:
+        (low, high) = (min(low, 120.0), max(high, 120.0))
+    return (low, high)
+
+
+def estimate(data:np.ndarray, framerate:int, rate:int=ESTIMATE_RATE, max_samples:int=ESTIMATE_SAMPLES,
+             window_length:int=DENOISE_WINDOW) -> tuple:
+    """Estimates the frequency and percent flicker of a waveform, with bounds
+
+    Parameters
+    ----------
+    data : ndarray
+        The waveform data as a 2D array
+    framerate : int
+        The frame rate (samples per second)
+    rate : int
+        The frame rate the capture is decimated to
+    max_samples : int
+        The maximum number of samples the capture is decimated to
+    window_length : int
+        The window length of the denoise stage of the full pipeline the bounds are for
+
+    Returns
+    -------
+    tuple
+        (the estimated frequency in Hertz,
+         the estimated percent flicker,
+         the (lowest, highest) frequency the full pipeline could report,
+         the (lowest, highest) percent flicker the full pipeline could report)
+    """
+
+    max_samples = min(max_samples, int(len(data) * rate / framerate))
+    (volts, rate) = decimate(np.asarray(data[:,1], dtype=np.float64), framerate, max_samples)
+    (coarse, _) = decimate(volts, rate, max(len(volts) // 2, 1))
+
+    # Percent flicker, widened by the attenuation between the two decimation levels
+    pf = _percent_flicker(volts)
+    (rel, abs_) = PERCENT_FLICKER_MARGIN
+    pf_margin = abs(pf - _percent_flicker(coarse)) + rel * pf + abs_
+    pf_bounds = (max(pf - pf_margin, 0.0), pf + pf_margin)
+
+    # Frequency from the periods between rising edges through the midpoint
+    (v_max, v_min) = (volts.max(), volts.min())
+    v_mid = (v_max + v_min) / 2
+    starts = period_starts(volts, v_mid, v_max - v_min)
+    if len(starts) < 3:
+        return (np.nan, pf, UNBOUNDED, pf_bounds)
+
+    periods = np.diff(starts) / rate
+    f = 1 / periods.mean()
+
+    # Match frequency(), which rounds everything in the range 115-130 Hz to 120 Hz
+    f_rounded = round(f)
+    if f_rounded >= 115 and f_rounded <= 130:
+        f_rounded = 120.0
+
+    # The denoise filter dominates the shape of short periods
+    if window_length > MAX_WINDOW_FRACTION * framerate / f:
+        return (float(f_rounded), pf, UNBOUNDED, UNBOUNDED)
+
+    # The estimator of the full pipeline, on the crossings of the decimated data
+    crossings = kernels.crossings(volts, v_mid)
+    if len(crossings) < MIN_CROSSINGS:
+        return (float(f_rounded), pf, UNBOUNDED, pf_bounds)
+    intervals = len(crossings) - 1
+    f_crossings = rate * intervals / (2 * (crossings[-1] - crossings[0]))
+
+    spread = periods.std() / periods.mean()
+    resolution = 2 / (starts[-1] - starts[0])
+    margin = FREQUENCY_MARGIN + spread + resolution
+    low = min(f, f_crossings) * (1 - margin) * (intervals - CROSSING_SLACK) / intervals
+    high = max(f, f_crossings) * (1 + margin) * (intervals + CROSSING_SLACK) / intervals
+
+    return (float(f_rounded), pf, _rounded_bounds(low, high), pf_bounds)
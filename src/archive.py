@@ -0,0 +1,633 @@
+"""Compressed Waveform Archives
+
+CSV exports are several times larger than the samples they hold, and reading any part of one
+means parsing the whole file. A waveform archive (.bfw) stores the voltages as zlib-compressed
+chunks of a fixed number of samples, followed by a JSON footer with the scope header and an
+index of the chunks:
+
+    magic | chunk 0 | chunk 1 | ... | footer (JSON) | footer length (8 bytes) | magic
+
+Each chunk holds little-endian float64 volts. The time axis is not stored: the index records
+the time of the first sample of each chunk, and the samples of a chunk are 1 / framerate apart.
+The index also records the minimum and maximum of each chunk, so the voltage range of a capture
+is known without decompressing it.
+
+read_archive() returns a WaveformArchive, which is accessed like a [time, volts] array but only
+decompresses the chunks that are indexed. See Waveform.from_archive and ARCHIVE_PIPELINE, which
+compute the metrics in a streaming pass and read only the first periods for get_n_periods()
+and plotting.
+
+The classes are:
+
+    * WaveformArchive - A chunked waveform archive, accessed like a [time, volts] array
+
+The functions are:
+
+    * write_archive - Writes waveform data to an archive
+    * read_archive - Opens an archive for random access
+    * convert_csv - Converts a waveform CSV to an archive
+    * convert_directory - Converts the waveform CSVs in a directory (and subdirectories) to archives
+    * denoise_archive - Applies the Savitzky-Golay Filter to an archive as its chunks are read
+    * archive_v_stats - Gets the voltage statistics of an archive
+    * archive_crossings - Finds the samples after which an archive crosses a voltage
+"""
+
+import os
+import json
+import zlib
+import struct
+import threading
+import numpy as np
+from collections import OrderedDict
+from scipy.signal import savgol_filter
+from .scope import read_scope_header
+from .batch import ImportFailure
+from . import kernels
+
+
+MAGIC = b'BFWAVE\x00\x01'
+
+ARCHIVE_EXTENSION = '.bfw'
+
+# The number of samples in each chunk
+CHUNK_SIZE = 1 << 16
+
+# The number of decompressed chunks kept in memory by each archive
+CACHE_CHUNKS = 4
+
+# The fields of each entry of the chunk index
+CHUNK_FIELDS = ('offset', 'length', 't_start', 'v_min', 'v_max')
+
+
+def write_archive(filename:str, data:np.ndarray, header:dict=None, chunk_size:int=CHUNK_SIZE,
+                  level:int=6) -> str:
+    """Writes waveform data to an archive
+
+    Parameters
+    ----------
+    filename : str
+        The name of the archive file
+    data : ndarray
+        The waveform data as a 2D array in the format [time(seconds), volts], sampled at a
+        constant frame rate
+    header : dict or None
+        The header information of the export, e.g. {'Sample Rate': '500MSa/s'}
+    chunk_size : int
+        The number of samples in each chunk
+    level : int
+        The zlib compression level, from 1 (fastest) to 9 (smallest)
+
+    Returns
+    -------
+    str
+        The name of the archive file
+    """
+
+    data = np.asarray(data, dtype=np.float64)
+    if data.ndim != 2 or data.shape[1] < 2 or len(data) < 2:
+        raise ValueError('Expected a 2D [time, volts] array with at least 2 samples, got shape ' + \
+                         str(data.shape))
+
+    t_0 = float(data[0,0])
+    chunks = []
+    with open(filename, 'wb') as f:
+        f.write(MAGIC)
+        for start in range(0, len(data), chunk_size):
+            volts = data[start:start + chunk_size, 1]
+            payload = zlib.compress(volts.astype('<f8').tobytes(), level)
+            chunks.append([f.tell(), len(payload), float(data[start,0]) - t_0,
+                           float(volts.min()), float(volts.max())])
+            f.write(payload)
+
+        footer = {
+            'version': 1,
+            'samples': len(data),
+            'chunk_size': chunk_size,
+            'framerate': int(round(1/(data[1,0]-data[0,0]))),
+            't_0': t_0,
+            'dtype': '<f8',
+            'compression': 'zlib',
+            'header': header or {},
+            'chunk_fields': list(CHUNK_FIELDS),
+            'chunks': chunks,
+        }
+        footer = json.dumps(footer).encode('utf-8')
+        f.write(footer)
+        f.write(struct.pack('<Q', len(footer)))
+        f.write(MAGIC)
+
+    return filename
+
+
+class _ChunkCache:
+    """Reads and decompresses the chunks of an archive, keeping the most recent in memory"""
+
+    def __init__(self, filename:str, index:dict):
+        self.filename = filename
+        self.chunks = index['chunks']
+        self.dtype = np.dtype(index['dtype'])
+        self.reads = 0
+        self._cache = OrderedDict()
+        self._lock = threading.Lock()
+
+
+    def get(self, i:int) -> np.ndarray:
+        with self._lock:
+            if i in self._cache:
+                self._cache.move_to_end(i)
+                return self._cache[i]
+
+        (offset, length) = self.chunks[i][:2]
+        with open(self.filename, 'rb') as f:
+            f.seek(offset)
+            payload = f.read(length)
+        volts = np.frombuffer(zlib.decompress(payload), dtype=self.dtype).astype(np.float64)
+
+        with self._lock:
+            self.reads += 1
+            self._cache[i] = volts
+            while len(self._cache) > CACHE_CHUNKS:
+                self._cache.popitem(last=False)
+        return volts
+
+
+    def get_nbytes(self) -> int:
+        with self._lock:
+            return sum(v.nbytes for v in self._cache.values())
+
+
+class WaveformArchive:
+    """A chunked waveform archive, accessed like a [time, volts] array
+
+    Indexing returns float64 arrays, e.g. archive[:,1] or archive[1000:2000,:], but only the
+    chunks holding the requested rows are decompressed. np.asarray(archive) reads every chunk.
+    With a filter (see with_filter), the volts are denoised as they are read, reading enough
+    samples either side of the requested rows that the result is the same as filtering the
+    whole capture.
+
+    Attributes
+    ----------
+    filename : str
+        The name of the archive file
+    header : dict
+        The header information of the export, e.g. {'Sample Rate': '500MSa/s'}
+    framerate : int
+        The number of samples per second
+    chunk_size : int
+        The number of samples in each chunk
+    window_length : int or None
+        The window length of the Savitzky-Golay Filter applied as the volts are read, if any
+    shape : tuple
+        (number of samples, 2)
+    nbytes : int
+        The bytes of memory held by the decompressed chunks kept in memory
+
+    Methods
+    -------
+    volts(start=None, stop=None)
+        Gets the voltages of a range of samples
+    times(start=None, stop=None)
+        Gets the times of a range of samples
+    sample_at(t)
+        Gets the index of the sample nearest a time
+    chunk_range(start, stop)
+        Gets the chunks holding a range of samples
+    with_filter(window_length)
+        Returns a view of this archive that is denoised as it is read
+    get_chunks_read()
+        Returns the number of chunks decompressed so far
+    """
+
+    ndim = 2
+    dtype = np.dtype(np.float64)
+
+    def __init__(self, filename:str, index:dict, window_length:int=None, _chunks:_ChunkCache=None):
+        """Initializes this WaveformArchive. Use read_archive() to open an archive file
+
+        Parameters
+        ----------
+        filename : str
+            The name of the archive file
+        index : dict
+            The footer of the archive
+        window_length : int or None
+            The window length of the Savitzky-Golay Filter applied as the volts are read.
+            If None, the volts are returned as stored
+        """
+
+        self.filename = filename
+        self.index = index
+        self.header = index['header']
+        self.framerate = index['framerate']
+        self.chunk_size = index['chunk_size']
+        self.window_length = window_length
+        self.shape = (index['samples'], 2)
+        self._t_starts = np.array([c[2] for c in index['chunks']])
+        self._chunks = _chunks if _chunks is not None else _ChunkCache(filename, index)
+
+
+    def __len__(self) -> int:
+        return self.shape[0]
+
+
+    def __repr__(self):
+        return 'WaveformArchive({!r}, samples={}, chunks={})'.format(self.filename, len(self),
+                                                                    len(self._t_starts))
+
+
+    @property
+    def nbytes(self) -> int:
+        """The bytes of memory held by the decompressed chunks kept in memory"""
+
+        return self._chunks.get_nbytes()
+
+
+    def __array__(self, dtype=None, copy=None):
+        out = self[:,:]
+        return out if dtype is None else out.astype(dtype)
+
+
+    def __getitem__(self, key):
+        if isinstance(key, tuple):
+            (rows, cols) = key
+        else:
+            (rows, cols) = (key, slice(None))
+
+        scalar_row = isinstance(rows, (int, np.integer))
+        if scalar_row:
+            i = range(len(self))[rows]
+            rows = slice(i, i + 1)
+
+        if isinstance(rows, slice):
+            idx = np.arange(*rows.indices(len(self)))
+        else:
+            idx = np.arange(len(self))[rows]
+
+        want = range(2)[cols]
+        if isinstance(want, int):
+            want = [want]
+        out = np.empty((len(idx), len(want)))
+
+        if len(idx):
+            (lo, hi) = (int(idx.min()), int(idx.max()) + 1)
+            for (j, col) in enumerate(want):
+                if col == 0:
+                    out[:,j] = self._times(idx)
+                else:
+                    out[:,j] = self.volts(lo, hi)[idx - lo]
+
+        if isinstance(cols, (int, np.integer)):
+            out = out[:,0]
+        if scalar_row:
+            out = out[0]
+        return out
+
+
+    def chunk_range(self, start:int, stop:int) -> range:
+        """Gets the chunks holding a range of samples
+
+        Parameters
+        ----------
+        start, stop : int
+            The range of samples
+
+        Returns
+        -------
+        range
+            The indices of the chunks
+        """
+
+        if stop <= start:
+            return range(0)
+        return range(start // self.chunk_size, (stop - 1) // self.chunk_size + 1)
+
+
+    def _raw(self, start:int, stop:int) -> np.ndarray:
+        """Gets the stored voltages of a range of samples, decompressing only the chunks needed"""
+
+        parts = []
+        for i in self.chunk_range(start, stop):
+            c_start = i * self.chunk_size
+            chunk = self._chunks.get(i)
+            parts.append(chunk[max(start - c_start, 0):stop - c_start])
+
+        if not parts:
+            return np.empty(0)
+        return parts[0] if len(parts) == 1 else np.concatenate(parts)
+
+
+    def volts(self, start:int=None, stop:int=None) -> np.ndarray:
+        """Gets the voltages of a range of samples
+
+        Parameters
+        ----------
+        start, stop : int or None
+            The range of samples, as in a slice
+
+        Returns
+        -------
+        ndarray
+            The voltages as a 1D float64 array
+        """
+
+        (start, stop, _) = slice(start, stop).indices(len(self))
+        if self.window_length is None or stop <= start:
+            return self._raw(start, stop).copy()
+
+        # Read enough samples either side that every requested sample is filtered with the
+        # same window as when filtering the whole capture
+        half = self.window_length // 2
+        lo = max(start - half, 0)
+        hi = min(stop + half, len(self))
+        if hi - lo < self.window_length:
+            lo = max(min(lo, len(self) - self.window_length), 0)
+            hi = min(lo + self.window_length, len(self))
+
+        filtered = savgol_filter(self._raw(lo, hi), self.window_length, 3)
+        return filtered[start - lo:stop - lo]
+
+
+    def _times(self, idx:np.ndarray) -> np.ndarray:
+        """Gets the times of an array of sample indices from the chunk index"""
+
+        c = idx // self.chunk_size
+        return self._t_starts[c] + (idx - c * self.chunk_size) / self.framerate
+
+
+    def times(self, start:int=None, stop:int=None) -> np.ndarray:
+        """Gets the times of a range of samples
+
+        Parameters
+        ----------
+        start, stop : int or None
+            The range of samples, as in a slice
+
+        Returns
+        -------
+        ndarray
+            The times in seconds, starting from 0 at the first sample of the capture
+        """
+
+        return self._times(np.arange(*slice(start, stop).indices(len(self))))
+
+
+    def sample_at(self, t:float) -> int:
+        """Gets the index of the sample nearest a time
+
+        Only the chunk index is used, so no chunks are decompressed
+
+        Parameters
+        ----------
+        t : float
+            The time in seconds, from the first sample of the capture
+
+        Returns
+        -------
+        int
+            The index of the sample, e.g. for archive[archive.sample_at(0.01):archive.sample_at(0.02)]
+        """
+
+        c = max(int(np.searchsorted(self._t_starts, t, side='right')) - 1, 0)
+        i = c * self.chunk_size + int(round((t - self._t_starts[c]) * self.framerate))
+        return min(max(i, 0), len(self) - 1)
+
+
+    def with_filter(self, window_length:int):
+        """Returns a view of this archive that is denoised as it is read
+
+        Parameters
+        ----------
+        window_length : int
+            The window length of the Savitzky-Golay Filter
+
+        Returns
+        -------
+        WaveformArchive
+            The filtered view, sharing the decompressed chunks of this archive
+        """
+
+        return WaveformArchive(self.filename, self.index, window_length, _chunks=self._chunks)
+
+
+    def get_chunks_read(self) -> int:
+        """Returns the number of chunks decompressed so far
+
+        Returns
+        -------
+        int
+            The number of chunk reads, by this archive and every view of it
+        """
+
+        return self._chunks.reads
+
+
+def read_archive(filename:str) -> WaveformArchive:
+    """Opens an archive for random access
+
+    Only the footer is read; chunks are decompressed when they are accessed
+
+    Parameters
+    ----------
+    filename : str
+        The name of the archive file
+
+    Returns
+    -------
+    WaveformArchive
+        The archive
+    """
+
+    with open(filename, 'rb') as f:
+        if f.read(len(MAGIC)) != MAGIC:
+            raise ValueError(filename + ' is not a waveform archive')
+        f.seek(-(8 + len(MAGIC)), os.SEEK_END)
+        (length,) = struct.unpack('<Q', f.read(8))
+        if f.read(len(MAGIC)) != MAGIC:
+            raise ValueError(filename + ' is truncated: the archive footer is missing')
+        f.seek(-(8 + len(MAGIC) + length), os.SEEK_END)
+        index = json.loads(f.read(length).decode('utf-8'))
+
+    if index.get('version') != 1:
+        raise ValueError('Unsupported archive version ' + repr(index.get('version')) + ' in ' + filename)
+
+    return WaveformArchive(filename, index)
+
+
+def convert_csv(csv_filename:str, archive_filename:str=None, header=None,
+                chunk_size:int=CHUNK_SIZE) -> str:
+    """Converts a waveform CSV to an archive
+
+    Parameters
+    ----------
+    csv_filename : str
+        The name of the CSV file, in the format [time(seconds), volts]. Header lines at the
+        top of the file are kept in the archive header
+    archive_filename : str or None
+        The name of the archive file. If None, the CSV file name with the .bfw extension
+    header : str or dict or None
+        Extra header information, or the name of a file holding it (e.g. CSVs/info.csv).
+        Header lines in the CSV itself take precedence
+    chunk_size : int
+        The number of samples in each chunk
+
+    Returns
+    -------
+    str
+        The name of the archive file
+    """
+
+    if archive_filename is None:
+        archive_filename = os.path.splitext(csv_filename)[0] + ARCHIVE_EXTENSION
+
+    if isinstance(header, str):
+        header = read_scope_header(header)[0]
+    header = dict(header or {})
+
+    (csv_header, _, skiprows) = read_scope_header(csv_filename)
+    header.update(csv_header)
+
+    data = np.genfromtxt(csv_filename, delimiter=',', skip_header=skiprows, dtype=np.float64)
+    if data.ndim != 2 or data.shape[1] < 2 or np.isnan(data[:,:2]).any():
+        raise ValueError(csv_filename + ' is not a [time(seconds), volts] CSV')
+
+    return write_archive(archive_filename, data[:,:2], header=header, chunk_size=chunk_size)
+
+
+def convert_directory(src_dir:str, dst_dir:str, header_name:str='info.csv',
+                      chunk_size:int=CHUNK_SIZE) -> tuple:
+    """Converts the waveform CSVs in a directory (and subdirectories) to archives
+
+    The directory layout is mirrored in dst_dir, e.g. CSVs/2019-03-20/CFL.csv is converted to
+    dst_dir/2019-03-20/CFL.bfw. Each CSV gets the header of the nearest header file in its
+    directory or a parent directory, as CSVs/info.csv holds the header of the CSVs under it.
+
+    Parameters
+    ----------
+    src_dir : str
+        The directory of CSV files, e.g. 'CSVs'
+    dst_dir : str
+        The directory the archives are written to
+    header_name : str
+        The name of the header files, which are not converted themselves
+    chunk_size : int
+        The number of samples in each chunk
+
+    Returns
+    -------
+    tuple
+        (a list of the archive files written,
+         a list of ImportFailure, one per CSV that could not be converted)
+    """
+
+    archives = []
+    failures = []
+    headers = {}
+    src_dir = os.path.normpath(src_dir)
+
+    for (dirpath, dirnames, filenames) in os.walk(src_dir):
+        dirnames.sort()
+
+        # The header of this directory, or else the header of its parent
+        header = headers.get(os.path.dirname(dirpath))
+        if header_name in filenames:
+            try:
+                header = read_scope_header(os.path.join(dirpath, header_name))[0]
+            except (OSError, UnicodeDecodeError):
+                pass
+        headers[dirpath] = header
+
+        out_dir = os.path.join(dst_dir, os.path.relpath(dirpath, src_dir))
+        for f in sorted(filenames):
+            if f == header_name or f.startswith('.') or not f.lower().endswith('.csv'):
+                continue
+
+            p = os.path.join(dirpath, f)
+            try:
+                os.makedirs(out_dir, exist_ok=True)
+                archives.append(convert_csv(p, os.path.join(out_dir, os.path.splitext(f)[0] + ARCHIVE_EXTENSION),
+                                            header=header, chunk_size=chunk_size))
+            except Exception as e:
+                failures.append(ImportFailure(p, 'convert', e, False))
+
+    return (archives, failures)
+
+
+def denoise_archive(archive:WaveformArchive, window_length:int=901) -> WaveformArchive:
+    """Applies the Savitzky-Golay Filter to an archive as its chunks are read
+
+    Parameters
+    ----------
+    archive : WaveformArchive
+        The archive
+    window_length : int
+        The window length for the filter. Higher equals more smoothing
+
+    Returns
+    -------
+    WaveformArchive
+        A view of the archive with noise removed
+    """
+
+    if len(archive) < window_length:
+        raise ValueError('The capture has ' + str(len(archive)) + ' samples, fewer than the filter window of ' + \
+                         str(window_length))
+    return archive.with_filter(window_length)
+
+
+def archive_v_stats(archive:WaveformArchive) -> tuple:
+    """Gets the voltage statistics of an archive
+
+    Unfiltered archives use the chunk index, without decompressing any chunks. Filtered
+    archives are read one chunk at a time
+
+    Parameters
+    ----------
+    archive : WaveformArchive
+        The archive
+
+    Returns
+    -------
+    tuple
+        (v_max, v_min, v_pp, v_avg), where v_avg is the mean of v_max and v_min
+    """
+
+    if archive.window_length is None:
+        v_min = min(c[3] for c in archive.index['chunks'])
+        v_max = max(c[4] for c in archive.index['chunks'])
+    else:
+        (v_min, v_max) = (np.inf, -np.inf)
+        for start in range(0, len(archive), archive.chunk_size):
+            (lo, hi) = kernels.minmax(archive.volts(start, start + archive.chunk_size))
+            (v_min, v_max) = (min(v_min, lo), max(v_max, hi))
+
+    v_pp = v_max - v_min
+    v_avg = np.mean([v_max, v_min])
+
+    return (v_max, v_min, v_pp, v_avg)
+
+
+def archive_crossings(archive:WaveformArchive, v_avg:float) -> np.ndarray:
+    """Finds the samples after which an archive crosses a voltage
+
+    The archive is read one chunk at a time
+
+    Parameters
+    ----------
+    archive : WaveformArchive
+        The archive
+    v_avg : float
+        The voltage, e.g. the average voltage
+
+    Returns
+    -------
+    ndarray
+        The indices i at which the sign of (volts - v_avg) differs between i and i+1
+    """
+
+    out = []
+    for start in range(0, len(archive) - 1, archive.chunk_size):
+        # Overlap the chunks by one sample, to catch crossings between chunks
+        volts = archive.volts(start, start + archive.chunk_size + 1)
+        out.append(kernels.crossings(volts, v_avg) + start)
+
+    return np.concatenate(out) if out else np.empty(0, dtype=np.int64)
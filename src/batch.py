@@ -0,0 +1,367 @@
+"""Fault-Tolerant Batch Imports
+
+These helpers let a batch import keep going when a file fails. A failure is recorded as an
+ImportFailure with the path, the pipeline stage that failed and the error. Files that failed
+can be quarantined by their fingerprint, so they are skipped on later runs until they change.
+Only failures that will recur on the same contents (parse and analysis errors) are
+quarantined; timeouts, I/O errors and crashed workers are retried on the next run. A per-file
+timeout stops one pathological file from stalling the batch. Files with identical contents
+(e.g. the same capture copied into several folders) can be found before the import, so each
+capture is analyzed once.
+
+See waveform.batch_import, which uses these helpers.
+
+The classes are:
+
+    * ImportFailure - The record of a file that could not be imported
+    * Quarantine - A persistent set of files that failed to import, by fingerprint
+    * ImportTimeout - The error recorded when a file takes longer than the timeout
+
+The functions are:
+
+    * file_fingerprint - Returns a fingerprint identifying the contents of a file
+    * should_quarantine - Whether a failure will recur on the same file contents
+    * run_with_timeout - Runs a function, giving up after a timeout
+    * content_hash - Returns a hash of the whole contents of a file
+    * find_duplicates - Finds the files whose contents are identical to an earlier file
+"""
+
+import os
+import json
+import hashlib
+import threading
+from collections import namedtuple
+
+
+ImportFailure = namedtuple('ImportFailure', ['path', 'stage', 'error', 'quarantined'])
+ImportFailure.__doc__ = """The record of a file that could not be imported
+
+stage is the name of the pipeline stage that failed, 'timeout' if the file took too long, or
+None if the error was raised outside the pipeline. error is the exception (for a file skipped
+because it is quarantined, the error recorded when it was quarantined, as a string).
+quarantined is True if the file was skipped because it is in the Quarantine."""
+
+
+class ImportTimeout(Exception):
+    """The error recorded when a file takes longer than the timeout"""
+    pass
+
+
+def file_fingerprint(path:str, sample_size:int=65536) -> str:
+    """Returns a fingerprint identifying the contents of a file
+
+    The fingerprint hashes the size of the file and its first and last sample_size bytes, so it
+    is cheap to compute on large captures and changes when a file is replaced or re-exported.
+
+    Parameters
+    ----------
+    path : str
+        The path to the file
+    sample_size : int
+        The number of bytes hashed at the start and at the end of the file
+
+    Returns
+    -------
+    str
+        The fingerprint, as a hex string
+    """
+
+    size = os.path.getsize(path)
+    h = hashlib.blake2b(str(size).encode(), digest_size=16)
+    with open(path, 'rb') as f:
+        h.update(f.read(sample_size))
+        if size > sample_size:
+            f.seek(max(size - sample_size, sample_size))
+            h.update(f.read(sample_size))
+
+    return h.hexdigest()
+
+
+# Errors that may not recur on the next run, e.g. a busy network drive or a full memory
+TRANSIENT_ERRORS = (OSError, MemoryError, ImportTimeout)
+
+# The stages of failures that say nothing about the file itself
+TRANSIENT_STAGES = ('timeout', 'worker')
+
+
+def should_quarantine(failure:ImportFailure) -> bool:
+    """Whether a failure will recur on the same file contents
+
+    Parse and analysis errors are deterministic, so quarantining the file saves parsing it again.
+    Timeouts, I/O errors, running out of memory and crashed worker processes depend on the
+    machine and its load, so the file is retried on the next run
+
+    Parameters
+    ----------
+    failure : ImportFailure
+        The failure of a file
+
+    Returns
+    -------
+    bool
+        True if the file should be quarantined
+    """
+
+    return failure.stage not in TRANSIENT_STAGES and not isinstance(failure.error, TRANSIENT_ERRORS)
+
+
+class Quarantine:
+    """A persistent set of files that failed to import, by fingerprint
+
+    Entries are keyed by file_fingerprint(), so a file is skipped wherever it is moved, and is
+    retried once its contents change. Each entry also records the size of the file, so only
+    files with the size of a quarantined file are fingerprinted: checking a file that is not
+    quarantined costs one stat, and the fingerprint of a new entry is computed when it fails.
+
+    Attributes
+    ----------
+    filename : str or None
+        The JSON file the entries are saved to. If None, the quarantine is kept in memory only
+
+    Methods
+    -------
+    get(path)
+        Returns the quarantine entry of a file
+    add(failure)
+        Quarantines a failed file
+    remove(path)
+        Removes a file from the quarantine
+    get_entries()
+        Returns every quarantine entry
+    save()
+        Saves the entries to the file
+    """
+
+    def __init__(self, filename:str=None):
+        """Initializes this Quarantine, loading the entries of filename if it exists
+
+        Parameters
+        ----------
+        filename : str or None
+            The JSON file the entries are saved to. If None, the quarantine is kept in memory only
+        """
+
+        self.filename = filename
+        self._entries = {}
+        self._sizes = {}
+        self._lock = threading.Lock()
+
+        if filename is not None and os.path.exists(filename):
+            with open(filename, 'r') as f:
+                self._entries = json.load(f)
+        for entry in self._entries.values():
+            self._count_size(entry.get('size'), 1)
+
+
+    def _count_size(self, size:int, n:int):
+        """Counts the entries of each file size (None for entries saved without their size)"""
+
+        count = self._sizes.get(size, 0) + n
+        if count > 0:
+            self._sizes[size] = count
+        else:
+            self._sizes.pop(size, None)
+
+
+    def _may_contain(self, path:str) -> bool:
+        """Whether an entry may match a file, i.e. whether it has to be fingerprinted"""
+
+        return None in self._sizes or os.path.getsize(path) in self._sizes
+
+
+    def get(self, path:str) -> dict:
+        """Returns the quarantine entry of a file
+
+        Parameters
+        ----------
+        path : str
+            The path to the file
+
+        Returns
+        -------
+        dict or None
+            {'path', 'stage', 'error', 'size'} as recorded when the file was quarantined, or None
+            if the file (with its current contents) is not quarantined
+        """
+
+        if not self._may_contain(path):
+            return None
+        return self._entries.get(file_fingerprint(path))
+
+
+    def add(self, failure:ImportFailure):
+        """Quarantines a failed file
+
+        Parameters
+        ----------
+        failure : ImportFailure
+            The failure of the file
+        """
+
+        entry = {'path': failure.path, 'stage': failure.stage,
+                 'error': type(failure.error).__name__ + ': ' + str(failure.error),
+                 'size': os.path.getsize(failure.path)}
+        key = file_fingerprint(failure.path)
+        with self._lock:
+            if key in self._entries:
+                self._count_size(self._entries[key].get('size'), -1)
+            self._entries[key] = entry
+            self._count_size(entry['size'], 1)
+
+
+    def remove(self, path:str):
+        """Removes a file from the quarantine
+
+        Parameters
+        ----------
+        path : str
+            The path to the file
+        """
+
+        if not self._may_contain(path):
+            return
+        with self._lock:
+            entry = self._entries.pop(file_fingerprint(path), None)
+            if entry is not None:
+                self._count_size(entry.get('size'), -1)
+
+
+    def get_entries(self) -> dict:
+        """Returns every quarantine entry
+
+        Returns
+        -------
+        dict
+            {fingerprint: {'path', 'stage', 'error', 'size'}}
+        """
+
+        return dict(self._entries)
+
+
+    def save(self):
+        """Saves the entries to the file, if this Quarantine has one"""
+
+        if self.filename is None:
+            return
+        with self._lock:
+            with open(self.filename, 'w') as f:
+                json.dump(self._entries, f, indent=1)
+
+
+def run_with_timeout(func, timeout:float=None, *args, **kwargs):
+    """Runs a function, giving up after a timeout
+
+    The function runs in a daemon thread. Python threads cannot be killed, so the timeout does
+    not stop the work: on timeout the thread is abandoned, and it keeps running, using CPU time
+    and holding its memory, until func returns. It only stops blocking the caller (and does not
+    block the exit of the interpreter). To stop work that times out, run it in a process that
+    can be terminated, e.g. with waveform.batch_import(workers=...).
+
+    Parameters
+    ----------
+    func : function
+        The function to run
+    timeout : float or None
+        The timeout in seconds. If None, func is called directly
+    *args, **kwargs
+        Passed to func
+
+    Returns
+    -------
+    object
+        The return value of func
+
+    Raises
+    ------
+    ImportTimeout
+        If func does not return within the timeout
+    """
+
+    if timeout is None:
+        return func(*args, **kwargs)
+
+    result = {}
+    def target():
+        try:
+            result['value'] = func(*args, **kwargs)
+        except BaseException as e:
+            result['error'] = e
+
+    thread = threading.Thread(target=target, daemon=True)
+    thread.start()
+    thread.join(timeout)
+
+    if thread.is_alive():
+        raise ImportTimeout('Timed out after ' + str(timeout) + ' s')
+    if 'error' in result:
+        raise result['error']
+    return result['value']
+
+
+def content_hash(path:str, block_size:int=1 << 20) -> str:
+    """Returns a hash of the whole contents of a file
+
+    The file is read in blocks of block_size bytes, so memory use does not grow with its size.
+
+    Parameters
+    ----------
+    path : str
+        The path to the file
+    block_size : int
+        The number of bytes read at once
+
+    Returns
+    -------
+    str
+        The BLAKE2b hash, as a hex string
+    """
+
+    h = hashlib.blake2b(digest_size=20)
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(block_size), b''):
+            h.update(block)
+
+    return h.hexdigest()
+
+
+def find_duplicates(paths) -> dict:
+    """Finds the files whose contents are identical to an earlier file
+
+    Only files that share their size with another file are hashed, so a directory without
+    duplicates costs one stat per file. Files that cannot be read are treated as unique
+
+    Parameters
+    ----------
+    paths : list
+        The file paths
+
+    Returns
+    -------
+    dict
+        {path of a duplicate: path of the first file with the same contents}, in the order of
+        paths. Files without duplicates are not included
+    """
+
+    by_size = {}
+    for p in paths:
+        try:
+            by_size.setdefault(os.path.getsize(p), []).append(p)
+        except OSError:
+            pass
+
+    duplicates = {}
+    for group in by_size.values():
+        if len(group) < 2:
+            continue
+        first = {}
+        for p in dict.fromkeys(group):
+            try:
+                key = content_hash(p)
+            except OSError:
+                continue
+            if key in first:
+                duplicates[p] = first[key]
+            else:
+                first[key] = p
+
+    return {p: duplicates[p] for p in paths if p in duplicates}
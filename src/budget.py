@@ -0,0 +1,188 @@
+"""Memory Budgets
+
+A Waveform keeps its raw data and one period in memory for plotting, which dominates the memory
+used by a large WaveformCollection. A MemoryBudget caps the bytes held by these arrays: when the
+cap is exceeded, the arrays of the least recently used waveforms are evicted. The metrics of
+every waveform are always kept. An evicted waveform reloads its arrays when they are needed,
+e.g. by get_data() or plot(), from a spill directory if one was given, or by rerunning its
+pipeline on the source file otherwise.
+
+The classes are:
+
+    * MemoryBudget - Keeps the raw arrays of a set of waveforms under a memory budget
+
+The functions are:
+
+    * parse_size - Parses a size in bytes, e.g. '512MB'
+"""
+
+import os
+import threading
+from collections import OrderedDict
+
+
+SIZE_UNITS = {'B': 1, 'KB': 1e3, 'MB': 1e6, 'GB': 1e9, 'TB': 1e12,
+              'KIB': 1 << 10, 'MIB': 1 << 20, 'GIB': 1 << 30, 'TIB': 1 << 40}
+
+
+def parse_size(size) -> int:
+    """Parses a size in bytes, e.g. '512MB'
+
+    Parameters
+    ----------
+    size : int or str
+        A number of bytes, or a string such as '512MB', '2GB' or '1.5GiB'
+
+    Returns
+    -------
+    int
+        The number of bytes
+    """
+
+    if isinstance(size, (int, float)):
+        return int(size)
+
+    text = size.strip().upper().replace(' ', '')
+    for unit in sorted(SIZE_UNITS, key=len, reverse=True):
+        if text.endswith(unit):
+            return int(float(text[:-len(unit)]) * SIZE_UNITS[unit])
+    return int(float(text))
+
+
+class MemoryBudget:
+    """Keeps the raw arrays of a set of waveforms under a memory budget
+
+    Waveforms are kept in least recently used order. A waveform is used when it is added or
+    analyzed, and whenever its arrays are accessed (e.g. by get_data()), evicted or not.
+    Waveforms whose inputs are in-memory arrays are only evicted if there is a spill directory,
+    since rerunning their pipeline would not free memory.
+
+    Attributes
+    ----------
+    limit : int
+        The maximum number of bytes held by the raw arrays
+    spill_dir : str or None
+        The directory evicted arrays are saved to, as .npy files. If None, evicted arrays
+        are recomputed from the source file when needed
+    evictions : int
+        The number of times a waveform's arrays have been evicted
+    reloads : int
+        The number of times a waveform's arrays have been reloaded
+
+    Methods
+    -------
+    add(waveform)
+        Starts tracking a waveform, evicting others if the budget is exceeded
+    touch(waveform, reloaded=False)
+        Marks a waveform as most recently used, evicting others if the budget is exceeded
+    remove(waveform)
+        Stops tracking a waveform
+    get_resident_bytes()
+        Returns the number of bytes currently held by the raw arrays
+    """
+
+    def __init__(self, limit, spill_dir:str=None):
+        """Initializes this MemoryBudget
+
+        Parameters
+        ----------
+        limit : int or str
+            The maximum number of bytes held by the raw arrays, e.g. 2e9 or '2GB'
+        spill_dir : str or None
+            The directory evicted arrays are saved to. If None, evicted arrays are recomputed
+            from the source file when needed
+        """
+
+        self.limit = parse_size(limit)
+        self.spill_dir = spill_dir
+        if spill_dir is not None:
+            os.makedirs(spill_dir, exist_ok=True)
+        self.evictions = 0
+        self.reloads = 0
+        # The resident waveforms that can be evicted, least recently used first, and the sizes
+        # of the resident waveforms that cannot. Evicted waveforms are in neither
+        self._lru = OrderedDict()
+        self._pinned = {}
+        self._total = 0
+        self._lock = threading.RLock()
+
+
+    def add(self, waveform):
+        """Starts tracking a waveform, evicting others if the budget is exceeded
+
+        Parameters
+        ----------
+        waveform : Waveform
+            The waveform
+        """
+
+        waveform._budget = self
+        self.touch(waveform)
+
+
+    def touch(self, waveform, reloaded:bool=False):
+        """Marks a waveform as most recently used, evicting others if the budget is exceeded
+
+        The waveform itself is never evicted by its own touch, so the arrays it needs stay
+        in memory even if they alone exceed the budget. Evicted waveforms leave the LRU order
+        and rejoin it when they are reloaded, so a touch only visits the waveforms it evicts.
+
+        Parameters
+        ----------
+        waveform : Waveform
+            The waveform
+        reloaded : bool
+            Whether the waveform has just reloaded its evicted arrays, counted in reloads
+        """
+
+        with self._lock:
+            self.reloads += reloaded
+            key = id(waveform)
+            if key in self._lru:
+                self._total -= self._lru.pop(key)[1]
+            self._total -= self._pinned.pop(key, 0)
+
+            size = waveform.get_resident_bytes()
+            if size and waveform.can_evict(self.spill_dir):
+                self._lru[key] = (waveform, size)
+            elif size:
+                self._pinned[key] = size
+            self._total += size
+
+            while self._total > self.limit and self._lru:
+                (k, (w, size)) = self._lru.popitem(last=False)
+                if k == key:
+                    self._lru[key] = (w, size)
+                    break
+                w.evict(self.spill_dir)
+                self._total -= size
+                self.evictions += 1
+
+
+    def remove(self, waveform):
+        """Stops tracking a waveform
+
+        Parameters
+        ----------
+        waveform : Waveform
+            The waveform
+        """
+
+        with self._lock:
+            key = id(waveform)
+            if key in self._lru:
+                self._total -= self._lru.pop(key)[1]
+            self._total -= self._pinned.pop(key, 0)
+            waveform._budget = None
+
+
+    def get_resident_bytes(self) -> int:
+        """Returns the number of bytes currently held by the raw arrays
+
+        Returns
+        -------
+        int
+            The total size of the arrays of every tracked waveform that is in memory
+        """
+
+        return self._total
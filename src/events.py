@@ -0,0 +1,164 @@
+"""Transient Flicker Events
+
+The metrics of a Waveform describe the capture as if it were perfectly periodic, so dropouts,
+dimmer glitches and intermittent bursts in a long recording are averaged away. These functions
+find such events from the per-period metrics (see periods.py) rather than from the samples,
+so a capture of tens of millions of samples is reduced to one value per period before any
+rolling statistics are computed.
+
+Each period is compared with its neighbours: the rolling median and the rolling median
+absolute deviation (MAD) over a centered window of periods give a robust z-score for the
+period length, the amplitude (v_max - v_min) and the mean level. Periods whose score exceeds
+the threshold in any of these are anomalous, and runs of consecutive anomalous periods are
+merged into events with their start and stop times.
+
+A dropout long enough to stop the rising edges shows up as one very long period. Samples
+before the first period start and after the last one are not examined.
+
+The functions are:
+
+    * rolling_median - Computes the median of a centered window around every value
+    * robust_scores - Scores how far every value is from the values around it
+    * detect_events - Finds the intervals where the per-period metrics are anomalous
+"""
+
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+
+# The number of periods in the rolling window
+EVENT_WINDOW = 31
+
+# Periods scoring above this many robust standard deviations are anomalous
+EVENT_THRESHOLD = 5.0
+
+# Deviations smaller than this fraction of the typical period, or of the typical amplitude for
+# the amplitude and mean level, are never anomalous, so perfectly steady captures (MAD of 0)
+# do not flag every small variation
+MIN_DEVIATION = 0.02
+
+# Scales the MAD to a standard deviation for normally distributed values
+MAD_SCALE = 1.4826
+
+
+def rolling_median(values:np.ndarray, window:int=EVENT_WINDOW) -> np.ndarray:
+    """Computes the median of a centered window around every value
+
+    The values are reflected at both ends, so every window is full
+
+    Parameters
+    ----------
+    values : ndarray
+        A 1D array
+    window : int
+        The number of values in each window. Rounded up to an odd number
+
+    Returns
+    -------
+    ndarray
+        The rolling median, the same length as values
+    """
+
+    values = np.asarray(values, dtype=np.float64)
+    if len(values) == 0:
+        return values.copy()
+
+    half = min(window // 2, len(values) - 1)
+    padded = np.pad(values, half, mode='reflect') if half > 0 else values
+    return np.median(sliding_window_view(padded, 2 * half + 1), axis=1)
+
+
+def robust_scores(values:np.ndarray, window:int=EVENT_WINDOW, min_scale:float=0.0) -> np.ndarray:
+    """Scores how far every value is from the values around it
+
+    The score is |value - rolling median| / (MAD_SCALE * rolling MAD), a z-score that is not
+    pulled by the anomalies it looks for
+
+    Parameters
+    ----------
+    values : ndarray
+        A 1D array
+    window : int
+        The number of values in the rolling window
+    min_scale : float
+        The smallest standard deviation used, so constant values do not divide by zero
+
+    Returns
+    -------
+    ndarray
+        The score of every value
+    """
+
+    median = rolling_median(values, window)
+    deviation = np.abs(values - median)
+    scale = np.maximum(MAD_SCALE * rolling_median(deviation, window), min_scale)
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return np.where(scale > 0, deviation / scale, np.where(deviation > 0, np.inf, 0.0))
+
+
+def detect_events(data:np.ndarray, starts:np.ndarray, metrics:dict, window:int=EVENT_WINDOW,
+                  threshold:float=EVENT_THRESHOLD, min_deviation:float=MIN_DEVIATION) -> list:
+    """Finds the intervals where the per-period metrics are anomalous
+
+    Parameters
+    ----------
+    data : ndarray
+        The waveform data as a 2D array in the format [time(seconds), volts]
+    starts : ndarray
+        The index of the first sample of each period, see periods.period_starts()
+    metrics : dict
+        The metrics of every period, see periods.period_metrics()
+    window : int
+        The number of periods in the rolling window
+    threshold : float
+        The robust z-score above which a period is anomalous
+    min_deviation : float
+        Deviations smaller than this fraction of the median period (or median amplitude) are
+        never anomalous
+
+    Returns
+    -------
+    list
+        A dict for each event, in time order:
+        'start', 'stop' - the time of the first and after the last sample of the event (seconds)
+        'periods' - the (first, last + 1) period indices of the event
+        'metrics' - the names of the metrics that were anomalous ('period', 'amplitude', 'level')
+        'score' - the highest score in the event
+    """
+
+    n = len(metrics['period'])
+    if n < 3:
+        return []
+
+    amplitude = metrics['v_max'] - metrics['v_min']
+    typical_period = np.median(metrics['period'])
+    typical_amplitude = np.median(amplitude)
+
+    scores = {
+        'period': robust_scores(metrics['period'], window, min_deviation * typical_period),
+        'amplitude': robust_scores(amplitude, window, min_deviation * typical_amplitude),
+        'level': robust_scores(metrics['v_mean'], window, min_deviation * typical_amplitude),
+    }
+    score = np.max(np.vstack(list(scores.values())), axis=0)
+
+    # Merge runs of consecutive anomalous periods
+    anomalous = score > threshold
+    if not anomalous.any():
+        return []
+    edges = np.diff(np.concatenate(([0], anomalous.astype(np.int8), [0])))
+    firsts = np.flatnonzero(edges == 1)
+    lasts = np.flatnonzero(edges == -1)
+
+    times = np.asarray(data[starts, 0], dtype=np.float64)
+    events = []
+    for (i, j) in zip(firsts, lasts):
+        events.append({
+            'start': float(times[i]),
+            'stop': float(times[j]),
+            'periods': (int(i), int(j)),
+            'metrics': [k for k, s in scores.items() if (s[i:j] > threshold).any()],
+            'score': float(score[i:j].max()),
+        })
+
+    return events
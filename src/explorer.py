@@ -0,0 +1,279 @@
+"""Interactive Waveform Explorer
+
+Static plots draw every sample, so zooming into a long capture means plotting it again. A
+WaveformExplorer redraws only the visible window whenever the x limits change (by panning or
+zooming with the toolbar of an interactive backend such as %matplotlib widget, or with
+set_range): windows of up to MAX_RAW_POINTS samples are drawn sample by sample, and wider
+windows from the min/max envelope pyramid of the waveform (see pyramid.py), so each redraw
+takes about the same time whatever the length of the capture.
+
+The window is overlaid with v_avg, the period boundaries (when the waveform has period stats
+and few enough periods are visible), and the percent flicker and flicker index of each
+visible period when only a few are visible. The title shows the statistics of the window.
+
+explore() adds ipywidgets controls, a time range slider and, for a WaveformCollection, a
+waveform selector. ipywidgets is optional and only imported by explore().
+
+The classes are:
+
+    * WaveformExplorer - An interactive plot of a waveform that redraws only the visible window
+
+The functions are:
+
+    * explore - Displays an explorer with widget controls for a Waveform or WaveformCollection
+"""
+
+import numpy as np
+
+
+# Windows with at most this many samples are drawn sample by sample
+MAX_RAW_POINTS = 4000
+
+# The number of envelope blocks drawn across the window
+ENVELOPE_WIDTH = 2000
+
+# Period boundaries are drawn when at most this many are visible
+MAX_PERIOD_MARKERS = 200
+
+# Per-period metrics are labeled when at most this many periods are visible
+MAX_PERIOD_LABELS = 12
+
+
+class WaveformExplorer:
+    """An interactive plot of a waveform that redraws only the visible window
+
+    Attributes
+    ----------
+    waveform : Waveform
+        The waveform shown
+    fig, ax : Figure, Axes
+        The matplotlib figure and axes
+    show_periods : bool
+        Whether period boundaries are drawn
+    show_metrics : bool
+        Whether the metrics of each visible period are labeled
+    redraws : int
+        The number of times the window has been drawn
+
+    Methods
+    -------
+    set_waveform(waveform)
+        Shows a different waveform
+    set_range(t_start, t_stop)
+        Shows a time range of the waveform
+    get_range()
+        Returns the visible time range
+    """
+
+    def __init__(self, waveform, figsize:tuple=(10,4), show_periods:bool=True, show_metrics:bool=True):
+        """Initializes this WaveformExplorer, showing the whole waveform
+
+        Parameters
+        ----------
+        waveform : Waveform
+            The waveform to show
+        figsize : tuple
+            The (horizontal, vertical) figure size
+        show_periods : bool
+            If True, period boundaries are drawn when the waveform has period stats
+        show_metrics : bool
+            If True, the percent flicker and flicker index of each visible period are labeled
+        """
+
+        import matplotlib.pyplot as plt
+
+        self.fig, self.ax = plt.subplots(1, 1, figsize=figsize)
+        self.ax.set_xlabel('Time (ms)')
+        self.ax.set_ylabel('Volts')
+        self.ax.spines['top'].set_color('none')
+        self.ax.spines['right'].set_color('none')
+
+        self.show_periods = show_periods
+        self.show_metrics = show_metrics
+        self.redraws = 0
+        self._artists = []
+        self._updating = False
+
+        self.set_waveform(waveform)
+        self.ax.callbacks.connect('xlim_changed', self._on_xlim)
+
+
+    def set_waveform(self, waveform):
+        """Shows a different waveform, zoomed out to its whole length
+
+        Parameters
+        ----------
+        waveform : Waveform
+            The waveform to show
+        """
+
+        self.waveform = waveform
+        self._pyramid = waveform.get_pyramid()
+
+        for artist in getattr(self, '_static', []):
+            artist.remove()
+        margin = 0.05 * (waveform.v_max - waveform.v_min)
+        self._static = [self.ax.axhline(waveform.v_avg, color='gray', linestyle='--', linewidth=1)]
+
+        self.ax.set_autoscale_on(False)
+        self.ax.set_ylim(waveform.v_min - margin, waveform.v_max + margin)
+        self.set_range(self._pyramid.t_0, self._pyramid.t_0 + (self._pyramid.length - 1) / self._pyramid.framerate)
+
+
+    def set_range(self, t_start:float, t_stop:float):
+        """Shows a time range of the waveform
+
+        Parameters
+        ----------
+        t_start, t_stop : float
+            The time range in seconds
+        """
+
+        self._updating = True
+        try:
+            self.ax.set_xlim(t_start * 1000, t_stop * 1000)
+        finally:
+            self._updating = False
+        self._draw(t_start, t_stop)
+
+
+    def get_range(self) -> tuple:
+        """Returns the visible time range
+
+        Returns
+        -------
+        tuple
+            (start, stop) in seconds
+        """
+
+        (x_0, x_1) = self.ax.get_xlim()
+        return (x_0 / 1000, x_1 / 1000)
+
+
+    def _on_xlim(self, ax):
+        if not self._updating:
+            self._draw(*self.get_range())
+
+
+    def _samples(self, t_start:float, t_stop:float) -> tuple:
+        """Gets the range of samples visible between two times"""
+
+        p = self._pyramid
+        start = int(np.floor((t_start - p.t_0) * p.framerate))
+        stop = int(np.ceil((t_stop - p.t_0) * p.framerate)) + 1
+        return (min(max(start, 0), p.length - 1), min(max(stop, 1), p.length))
+
+
+    def _draw(self, t_start:float, t_stop:float):
+        """Redraws the visible window"""
+
+        for artist in self._artists:
+            artist.remove()
+        self._artists = []
+
+        w = self.waveform
+        (start, stop) = self._samples(t_start, t_stop)
+        if stop <= start:
+            stop = start + 1
+
+        # The samples themselves when zoomed in, otherwise the envelope
+        if stop - start <= MAX_RAW_POINTS:
+            rows = w.get_data()[start:stop,:]
+            self._artists += self.ax.plot(rows[:,0] * 1000, rows[:,1], color='C0')
+        else:
+            (times, mins, maxs, _) = self._pyramid.envelope(start, stop, ENVELOPE_WIDTH)
+            self._artists.append(self.ax.fill_between(times * 1000, mins, maxs, color='C0', linewidth=1))
+
+        # Period boundaries and per-period metrics
+        starts = getattr(w, 'period_starts', None)
+        metrics = getattr(w, 'period_metrics', None)
+        if self.show_periods and starts is not None:
+            (i_0, i_1) = np.searchsorted(starts, [start, stop])
+            if i_1 - i_0 <= MAX_PERIOD_MARKERS:
+                t = self._pyramid.t_0 + starts[i_0:i_1] / self._pyramid.framerate
+                self._artists.append(self.ax.vlines(t * 1000, 0, 1, transform=self.ax.get_xaxis_transform(),
+                                                    color='gray', linewidth=0.5, alpha=0.6))
+
+            if self.show_metrics and metrics is not None and i_1 - i_0 <= MAX_PERIOD_LABELS:
+                n = len(metrics['period'])
+                for i in range(max(i_0 - 1, 0), min(i_1, n)):
+                    t = self._pyramid.t_0 + (starts[i] + starts[i+1]) / 2 / self._pyramid.framerate
+                    if t < t_start or t > t_stop:
+                        continue
+                    label = 'PF ' + str(round(metrics['percent flicker'][i], 1)) + '%\n' + \
+                        'FI ' + str(round(metrics['flicker index'][i], 3))
+                    self._artists.append(self.ax.text(t * 1000, 0.98, label, ha='center', va='top', fontsize=8,
+                                                      transform=self.ax.get_xaxis_transform()))
+
+        # The statistics of the window, from the pyramid
+        (v_min, v_max, v_mean) = self._pyramid.range_stats(start, stop)
+        self.ax.set_title(w.name + ': ' + '{:,}'.format(stop - start) + ' samples, ' + \
+                          'min ' + str(round(v_min, 3)) + ' V, max ' + str(round(v_max, 3)) + ' V, ' + \
+                          'percent flicker ' + str(round((v_max - v_min) / v_max * 100, 1)) + '%', fontsize=10)
+
+        self.redraws += 1
+        self.fig.canvas.draw_idle()
+
+
+def explore(obj, figsize:tuple=(10,4), show_periods:bool=True, show_metrics:bool=True) -> WaveformExplorer:
+    """Displays an explorer with widget controls for a Waveform or WaveformCollection
+
+    The controls are a time range slider and, for a WaveformCollection, a waveform selector.
+    Use an interactive backend (e.g. %matplotlib widget) to also pan and zoom with the mouse.
+    Requires ipywidgets
+
+    Parameters
+    ----------
+    obj : Waveform or WaveformCollection
+        The waveform, or the collection of waveforms, to explore
+    figsize : tuple
+        The (horizontal, vertical) figure size
+    show_periods : bool
+        If True, period boundaries are drawn when the waveform has period stats
+    show_metrics : bool
+        If True, the percent flicker and flicker index of each visible period are labeled
+
+    Returns
+    -------
+    WaveformExplorer
+        The explorer
+    """
+
+    try:
+        import ipywidgets as widgets
+        from IPython.display import display
+    except ImportError as e:
+        raise ImportError('explore() requires ipywidgets (pip install ipywidgets). '
+                          'WaveformExplorer can be used without it') from e
+
+    waveforms = obj.get_waveforms() if hasattr(obj, 'get_waveforms') else [obj]
+    if not waveforms:
+        raise ValueError('There are no waveforms to explore')
+
+    explorer = WaveformExplorer(waveforms[0], figsize=figsize, show_periods=show_periods,
+                                show_metrics=show_metrics)
+
+    def duration(w):
+        p = w.get_pyramid()
+        return (p.length - 1) / p.framerate * 1000
+
+    slider = widgets.FloatRangeSlider(value=(0, duration(waveforms[0])), min=0, max=duration(waveforms[0]),
+                                      step=duration(waveforms[0]) / 1000, description='Time (ms)',
+                                      continuous_update=False, layout=widgets.Layout(width='90%'))
+    slider.observe(lambda change: explorer.set_range(change['new'][0] / 1000, change['new'][1] / 1000),
+                   names='value')
+    controls = [slider]
+
+    if len(waveforms) > 1:
+        selector = widgets.Dropdown(options=[(w.name, i) for i, w in enumerate(waveforms)], description='Waveform')
+        def select(change):
+            w = waveforms[change['new']]
+            explorer.set_waveform(w)
+            slider.max = duration(w)
+            slider.value = (0, duration(w))
+            slider.step = duration(w) / 1000
+        selector.observe(select, names='value')
+        controls.insert(0, selector)
+
+    display(widgets.VBox(controls))
+    return explorer
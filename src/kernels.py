@@ -0,0 +1,347 @@
+"""Per-Sample Kernels
+
+These functions are the per-sample loops of the waveform metrics: the rising-edge search, zero
+crossing detection, clipping for the flicker index, and min/max scans. Each one has a pure
+NumPy implementation and, when Numba is installed, a JIT-compiled implementation. The Numba
+backend is used automatically when available, and NumPy otherwise. Set the environment
+variable BEAUTIFUL_FLICKER_BACKEND to 'numpy' or 'numba' to choose a backend, or call
+set_backend(). Numba is only imported, and the kernels compiled, on the first call with the
+Numba backend. Profiles record the active backend (see profiling.Profiler).
+
+Importing Numba and loading the compiled kernels costs about 0.5 s in every new process, even
+with the kernels cached on disk. A worker process of a parallel import pays it once, when it
+starts (see warm_up), so on a batch of only a few captures the Numba backend can be slower
+than NumPy overall; set BEAUTIFUL_FLICKER_BACKEND=numpy for small batches.
+
+The functions are:
+
+    * available_backends - Returns the names of the backends that can be used
+    * get_backend - Returns the name of the active backend
+    * set_backend - Sets the active backend
+    * rising_edge_idx - Finds the sample nearest to a value that is on a rising edge
+    * crossings - Finds the samples after which the waveform crosses a level
+    * clip_above - Returns the part of the waveform above a level, relative to that level
+    * minmax - Gets the minimum and maximum of an array
+    * warm_up - Compiles or loads every kernel of the active backend
+    * check_agreement - Checks that every backend gives the same results
+"""
+
+import os
+import time
+import importlib.util
+import numpy as np
+
+
+# NumPy implementations
+
+def _rising_edge_idx_numpy(array, value):
+    start = 0
+    n = len(array)
+    while start < n:
+        idx = start + np.abs(array[start:] - value).argmin()
+        if 0 < idx < n - 1 and array[idx-1] < array[idx] < array[idx+1]:
+            return idx
+        start = idx + 1
+    return -1
+
+
+def _crossings_numpy(array, level):
+    return np.flatnonzero(np.diff(np.sign(array - level)))
+
+
+def _clip_above_numpy(array, level):
+    return np.maximum(array - level, 0)
+
+
+def _minmax_numpy(array):
+    return (array.min(), array.max())
+
+
+_KERNELS = {
+    'numpy': {
+        'rising_edge_idx': _rising_edge_idx_numpy,
+        'crossings': _crossings_numpy,
+        'clip_above': _clip_above_numpy,
+        'minmax': _minmax_numpy,
+    },
+}
+
+
+# Numba implementations, defined when a kernel is first called with the numba backend, so that
+# importing this module does not import Numba
+
+def _load_numba():
+    import numba
+
+    @numba.njit(cache=True, nogil=True)
+    def _rising_edge_idx_numba(array, value):
+        start = 0
+        n = len(array)
+        while start < n:
+            idx = start
+            best = abs(array[start] - value)
+            for i in range(start + 1, n):
+                d = abs(array[i] - value)
+                if d < best:
+                    best = d
+                    idx = i
+            if 0 < idx < n - 1 and array[idx-1] < array[idx] < array[idx+1]:
+                return idx
+            start = idx + 1
+        return -1
+
+    @numba.njit(cache=True, nogil=True)
+    def _crossings_numba(array, level):
+        out = np.empty(max(len(array) - 1, 0), dtype=np.int64)
+        k = 0
+        prev = np.sign(array[0] - level) if len(array) else 0.0
+        for i in range(1, len(array)):
+            sign = np.sign(array[i] - level)
+            if sign - prev != 0:
+                out[k] = i - 1
+                k += 1
+            prev = sign
+        return out[:k]
+
+    @numba.njit(cache=True, nogil=True)
+    def _clip_above_numba(array, level):
+        out = np.empty(len(array))
+        for i in range(len(array)):
+            d = array[i] - level
+            out[i] = d if d > 0 else 0.0
+        return out
+
+    @numba.njit(cache=True, nogil=True)
+    def _minmax_numba(array):
+        lo = array[0]
+        hi = array[0]
+        for i in range(1, len(array)):
+            x = array[i]
+            if x < lo:
+                lo = x
+            elif x > hi:
+                hi = x
+        return (lo, hi)
+
+    _KERNELS['numba'] = {
+        'rising_edge_idx': _rising_edge_idx_numba,
+        'crossings': _crossings_numba,
+        'clip_above': _clip_above_numba,
+        'minmax': _minmax_numba,
+    }
+
+
+def available_backends() -> list:
+    """Returns the names of the backends that can be used
+
+    Returns
+    -------
+    list
+        'numpy', plus 'numba' if Numba is installed
+    """
+
+    out = list(_KERNELS)
+    if 'numba' not in out and importlib.util.find_spec('numba') is not None:
+        out.append('numba')
+    return out
+
+
+def set_backend(name:str):
+    """Sets the active backend
+
+    Parameters
+    ----------
+    name : str
+        'numpy' or 'numba'
+    """
+
+    global _backend
+
+    if name not in available_backends():
+        raise ValueError('Backend ' + repr(name) + ' is not available. Available backends: ' + \
+                         ', '.join(available_backends()))
+    _backend = name
+
+
+def get_backend() -> str:
+    """Returns the name of the active backend
+
+    Returns
+    -------
+    str
+        'numpy' or 'numba'
+    """
+
+    return _backend
+
+
+set_backend(os.environ.get('BEAUTIFUL_FLICKER_BACKEND', 'numba' if 'numba' in available_backends() else 'numpy'))
+
+
+def _kernel(name:str):
+    """Returns a kernel of the active backend, compiling the Numba kernels on first use"""
+
+    if _backend not in _KERNELS:
+        _load_numba()
+    return _KERNELS[_backend][name]
+
+
+def _float64(array:np.ndarray) -> np.ndarray:
+    """Returns the array as float64, without copying float64 arrays
+
+    Strided views such as the volts column data[:,1] are passed as they are: both backends
+    accept them (Numba compiles a specialization for non-contiguous arrays), and reading the
+    strided view is faster than copying it to a contiguous array first
+    """
+
+    return np.asarray(array, dtype=np.float64)
+
+
+def rising_edge_idx(array:np.ndarray, value:float) -> int:
+    """Finds the sample nearest to a value that is on a rising edge
+
+    The search finds the sample nearest to value. If it is not on a rising edge, the search
+    continues after it, until a sample on a rising edge is found.
+
+    Parameters
+    ----------
+    array : ndarray
+        A 1D array to search
+    value : float
+        The closest value to search for in the array
+
+    Returns
+    -------
+    int
+        The index of the sample, or -1 if there is no such sample
+    """
+
+    return int(_kernel('rising_edge_idx')(_float64(array), value))
+
+
+def crossings(array:np.ndarray, level:float) -> np.ndarray:
+    """Finds the samples after which the waveform crosses a level
+
+    Parameters
+    ----------
+    array : ndarray
+        A 1D array
+    level : float
+        The level, e.g. v_avg
+
+    Returns
+    -------
+    ndarray
+        The indices i at which the sign of (array - level) differs between i and i+1
+    """
+
+    return _kernel('crossings')(_float64(array), level)
+
+
+def clip_above(array:np.ndarray, level:float) -> np.ndarray:
+    """Returns the part of the waveform above a level, relative to that level
+
+    Parameters
+    ----------
+    array : ndarray
+        A 1D array
+    level : float
+        The level, e.g. v_avg
+
+    Returns
+    -------
+    ndarray
+        max(array - level, 0) for every sample
+    """
+
+    return _kernel('clip_above')(_float64(array), level)
+
+
+def minmax(array:np.ndarray) -> tuple:
+    """Gets the minimum and maximum of an array
+
+    Parameters
+    ----------
+    array : ndarray
+        A 1D array
+
+    Returns
+    -------
+    tuple
+        (minimum, maximum)
+    """
+
+    return _kernel('minmax')(_float64(array))
+
+
+def warm_up() -> float:
+    """Compiles or loads every kernel of the active backend
+
+    Runs each kernel on a small contiguous array and on a strided column, the two array types
+    the waveform functions pass, so that the first capture analyzed does not pay the Numba
+    compilation. Parallel imports call it when a worker process starts, so the cost is not
+    counted against the timeout of the worker's first capture.
+
+    Returns
+    -------
+    float
+        The time taken in seconds
+    """
+
+    start = time.perf_counter()
+    array = np.linspace(0, 1, 16)
+    strided = np.column_stack((array, array))[:,1]
+    for a in (array, strided):
+        rising_edge_idx(a, 0.5)
+        crossings(a, 0.5)
+        clip_above(a, 0.5)
+        minmax(a)
+    return time.perf_counter() - start
+
+
+def check_agreement(size:int=100000, seed:int=0) -> dict:
+    """Checks that every backend gives the same results
+
+    Runs every kernel on a noisy synthetic waveform with each available backend, and compares
+    the results to the NumPy backend. Each kernel is run on a contiguous array and on the volts
+    column of a [time, volts] array, a strided view as passed by the waveform functions.
+
+    Parameters
+    ----------
+    size : int
+        The number of samples in the test waveform
+    seed : int
+        The random seed for the test waveform
+
+    Returns
+    -------
+    dict
+        {backend: {kernel: True if the results agree}}, for every backend other than NumPy
+    """
+
+    rng = np.random.default_rng(seed)
+    t = np.arange(size) / size
+    array = 1 + 0.2 * np.sin(2 * np.pi * 12 * t) + rng.normal(0, 0.01, size)
+    strided = np.column_stack((t, array))[:,1]
+    level = 1.0
+
+    if 'numba' in available_backends() and 'numba' not in _KERNELS:
+        _load_numba()
+
+    reference = _KERNELS['numpy']
+    out = {}
+    for name, kernels in _KERNELS.items():
+        if name == 'numpy':
+            continue
+        out[name] = {}
+        for a in (array, strided):
+            agree = {
+                'rising_edge_idx': bool(kernels['rising_edge_idx'](a, level) == reference['rising_edge_idx'](a, level)),
+                'crossings': np.array_equal(kernels['crossings'](a, level), reference['crossings'](a, level)),
+                'clip_above': np.allclose(kernels['clip_above'](a, level), reference['clip_above'](a, level)),
+                'minmax': np.allclose(kernels['minmax'](a), reference['minmax'](a)),
+            }
+            for (kernel, ok) in agree.items():
+                out[name][kernel] = out[name].get(kernel, True) and ok
+
+    return out
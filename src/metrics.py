@@ -0,0 +1,174 @@
+"""Compact Waveform Metrics
+
+A Waveform holds its data and one period, so pickling it to return it from a worker process
+or to cache it copies megabytes per capture when only its metrics are needed. A
+WaveformMetrics is an immutable record of the metrics alone: a namedtuple (so it has no
+per-instance __dict__) of plain Python values, which pickles to a few hundred bytes.
+
+Many records can be converted to columns, one NumPy array per field, e.g. to save a survey
+with np.savez or to build a table, and back again.
+
+The classes are:
+
+    * WaveformMetrics - The metrics of a waveform, without its data
+
+The functions are:
+
+    * to_columns - Converts WaveformMetrics records to one array per field
+    * from_columns - Converts arrays of fields back to WaveformMetrics records
+"""
+
+import numpy as np
+from collections import namedtuple
+
+
+# The fields stored as float64 columns, with NaN for None
+FLOAT_FIELDS = ('frequency', 'period', 'framerate', 'v_max', 'v_min', 'v_avg', 'v_pp',
+                'percent_flicker', 'flicker_index')
+
+# The fields stored as int8 columns, with -1 for None
+BOOL_FIELDS = ('well_standard_v2', 'california_ja8_2019')
+
+# The fields stored as string columns, with '' for None
+STR_FIELDS = ('name', 'filename', 'ieee_1789_2015')
+
+FIELDS = ('name', 'filename') + FLOAT_FIELDS + ('ieee_1789_2015',) + BOOL_FIELDS
+
+
+def _plain(value):
+    """Converts NumPy scalars to the equivalent Python values, so records pickle compactly"""
+
+    return value.item() if isinstance(value, np.generic) else value
+
+
+class WaveformMetrics(namedtuple('WaveformMetrics', FIELDS)):
+    """The metrics of a waveform, without its data
+
+    Attributes
+    ----------
+    name : str
+        The name of the waveform
+    filename : str or None
+        The file the waveform was imported from
+    frequency : float
+        The dominant flicker frequency, in Hertz
+    period : float
+        The period (1 / frequency), in seconds
+    framerate : int
+        The number of samples per second
+    v_max, v_min, v_avg, v_pp : float
+        The voltage statistics
+    percent_flicker : float
+        The percent flicker
+    flicker_index : float
+        The flicker index
+    ieee_1789_2015 : str
+        The IEEE 1789-2015 risk level
+    well_standard_v2 : bool
+        Whether the waveform complies with WELL v2 L7
+    california_ja8_2019 : bool
+        Whether the waveform complies with California JA8 2019
+
+    Values that were not computed by the pipeline are None
+
+    Methods
+    -------
+    from_waveform(waveform)
+        Creates the record of a Waveform
+    to_dict()
+        Returns the fields as a dict
+    """
+
+    __slots__ = ()
+
+    @classmethod
+    def from_waveform(cls, waveform):
+        """Creates the record of a Waveform
+
+        Parameters
+        ----------
+        waveform : Waveform
+            The waveform
+
+        Returns
+        -------
+        WaveformMetrics
+            The record, with unrounded values
+        """
+
+        return cls(*[_plain(getattr(waveform, f, None)) for f in FIELDS])
+
+
+    def to_dict(self) -> dict:
+        """Returns the fields as a dict
+
+        Returns
+        -------
+        dict
+            {field: value}, in the order of FIELDS
+        """
+
+        return dict(self._asdict())
+
+
+def to_columns(records:list) -> dict:
+    """Converts WaveformMetrics records to one array per field
+
+    Parameters
+    ----------
+    records : list
+        The WaveformMetrics records
+
+    Returns
+    -------
+    dict
+        {field: 1D array} in the order of FIELDS. Numeric fields are float64 with NaN for
+        None, the compliance verdicts are int8 with -1 for None, and text fields are strings
+        with '' for None
+    """
+
+    columns = {}
+    for (i, f) in enumerate(FIELDS):
+        values = [r[i] for r in records]
+        if f in FLOAT_FIELDS:
+            columns[f] = np.array([np.nan if v is None else v for v in values], dtype=np.float64)
+        elif f in BOOL_FIELDS:
+            columns[f] = np.array([-1 if v is None else bool(v) for v in values], dtype=np.int8)
+        else:
+            columns[f] = np.array(['' if v is None else str(v) for v in values], dtype=str)
+
+    return columns
+
+
+def from_columns(columns:dict) -> list:
+    """Converts arrays of fields back to WaveformMetrics records
+
+    Parameters
+    ----------
+    columns : dict
+        {field: 1D array} as returned by to_columns(), e.g. loaded with np.load. Missing
+        fields are None
+
+    Returns
+    -------
+    list
+        The WaveformMetrics records
+    """
+
+    n = len(columns['name'])
+    fields = []
+    for f in FIELDS:
+        if f not in columns:
+            fields.append([None] * n)
+        elif f in FLOAT_FIELDS:
+            values = np.asarray(columns[f], dtype=np.float64)
+            out = [None if np.isnan(v) else v for v in values.tolist()]
+            if f == 'framerate':
+                out = [None if v is None else int(v) for v in out]
+            fields.append(out)
+        elif f in BOOL_FIELDS:
+            fields.append([None if v < 0 else bool(v) for v in np.asarray(columns[f]).tolist()])
+        else:
+            fields.append([str(v) or None for v in np.asarray(columns[f]).tolist()])
+
+    return [WaveformMetrics(*values) for values in zip(*fields)]
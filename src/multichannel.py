@@ -0,0 +1,202 @@
+"""Multi-Channel Flicker Captures
+
+Rigs that capture several photodiodes at once export one file with a shared time base and one
+column per channel. The MultiChannelCapture class parses such a file once, computes the metrics
+of all channels in a vectorized pass over the channel matrix, and exposes each channel as a
+Waveform whose data is a view into the shared array (no copy).
+
+The classes are:
+
+    * MultiChannelCapture - A class used to represent a capture of several synchronized channels
+"""
+
+import numpy as np
+from . import vectorized
+from .waveform import Waveform, FULL_PIPELINE, import_multichannel_csv, framerate
+from .profiling import profile_stage
+
+
+class MultiChannelCapture:
+    """A class used to represent a capture of several synchronized channels
+
+    Attributes
+    ----------
+    name : str
+        The name of the capture. Channel waveforms are named '<name> <channel name>'
+    filename : str
+        The name of the CSV file the capture was imported from
+    data : ndarray
+        The 2D array holding the capture. Format is [time(seconds), channel 1 volts, channel 2 volts, ...]
+    channel_names : list
+        The name of each channel, e.g. ['ch1', 'ch2']
+    header : dict
+        The header information of the export, e.g. {'Sample Rate': '500MSa/s'}
+    denoised : bool
+        Whether or not the channels have been filtered to remove noise
+    framerate : int
+        The number of samples per second
+    v_max, v_min, v_pp, v_avg : ndarray
+        The voltage statistics of each channel
+    frequency : ndarray
+        The dominant flicker frequency of each channel, in Hertz
+    percent_flicker : ndarray
+        The percent flicker of each channel
+
+    Methods
+    -------
+    get_channel_names()
+        Returns the names of the channels
+    get_data()
+        Gets the 2D array containing the capture
+    get_channel_data(channel)
+        Gets a view of the [time, volts] data of one channel
+    get_waveform(channel)
+        Returns one channel as a Waveform
+    get_waveforms()
+        Returns every channel as a Waveform
+    """
+
+    def __init__(self, filename:str, name:str, remove_noise:bool=True, profiler=None, pipeline=None):
+        """Initializes this MultiChannelCapture and computes the metrics of every channel
+
+        Parameters
+        ----------
+        filename : str
+            The name of the CSV file to import
+        name : str
+            The name of the capture
+        remove_noise : bool
+            If True (default), every channel will be denoised
+        profiler : Profiler or None
+            If specified, the time and memory used by each step will be recorded by this Profiler
+        pipeline : Pipeline or None
+            The pipeline used for the remaining per-channel stages (one period, flicker index
+            and standards). If None, FULL_PIPELINE is used
+        """
+
+        self.name = name
+        self.filename = filename
+        self.profiler = profiler
+        self.pipeline = FULL_PIPELINE if pipeline is None else pipeline
+        self._waveforms = {}
+
+        with profile_stage(profiler, 'import', filename):
+            (self.data, self.channel_names, self.header) = import_multichannel_csv(filename)
+
+        volts = self.data[:,1:]
+        if remove_noise:
+            with profile_stage(profiler, 'denoise', filename):
+                volts[...] = vectorized.denoise(volts, axis=0)
+        self.denoised = remove_noise
+
+        with profile_stage(profiler, 'framerate', filename):
+            self.framerate = framerate(self.data)
+        with profile_stage(profiler, 'v_stats', filename):
+            (self.v_max, self.v_min, self.v_pp, self.v_avg) = vectorized.v_stats(volts, axis=0)
+        with profile_stage(profiler, 'frequency', filename):
+            self.frequency = vectorized.frequency(volts, self.framerate, self.v_avg, axis=0)
+        with profile_stage(profiler, 'percent_flicker', filename):
+            self.percent_flicker = vectorized.percent_flicker(self.v_max, self.v_pp)
+
+
+    def _channel_index(self, channel) -> int:
+        """Returns the index of a channel given its name or index"""
+
+        if isinstance(channel, str):
+            return self.channel_names.index(channel)
+        return int(channel)
+
+
+    def get_channel_names(self) -> list:
+        """Returns the names of the channels
+
+        Returns
+        -------
+        list
+            The channel names, in column order
+        """
+
+        return self.channel_names
+
+
+    def get_data(self) -> np.ndarray:
+        """Gets the 2D array containing the capture
+
+        Returns
+        -------
+        ndarray
+            Format is [time(seconds), channel 1 volts, channel 2 volts, ...]
+        """
+
+        return self.data
+
+
+    def get_channel_data(self, channel) -> np.ndarray:
+        """Gets a view of the [time, volts] data of one channel
+
+        The view shares memory with the capture: the time column and the channel column are
+        selected with a stride, not copied.
+
+        Parameters
+        ----------
+        channel : str or int
+            The channel name, or its index (0 for the first channel)
+
+        Returns
+        -------
+        ndarray
+            The 2D array holding the channel. Format is [time(seconds), voltage:float]
+        """
+
+        col = self._channel_index(channel) + 1
+        return self.data[:, 0:col+1:col]
+
+
+    def get_waveform(self, channel) -> Waveform:
+        """Returns one channel as a Waveform
+
+        The Waveform uses the metrics already computed for the channel, and only runs the
+        remaining pipeline stages (one period, flicker index and standards). Its data is a
+        view into this capture.
+
+        Parameters
+        ----------
+        channel : str or int
+            The channel name, or its index (0 for the first channel)
+
+        Returns
+        -------
+        Waveform
+            The Waveform of the channel
+        """
+
+        i = self._channel_index(channel)
+        if i not in self._waveforms:
+            inputs = {
+                'data': self.get_channel_data(i),
+                'denoised': self.denoised,
+                'framerate': self.framerate,
+                'v_max': self.v_max[i],
+                'v_min': self.v_min[i],
+                'v_pp': self.v_pp[i],
+                'v_avg': self.v_avg[i],
+                'frequency': self.frequency[i],
+                'percent_flicker': self.percent_flicker[i],
+            }
+            self._waveforms[i] = Waveform.from_inputs(
+                inputs, self.name + ' ' + self.channel_names[i], filename=self.filename,
+                profiler=self.profiler, pipeline=self.pipeline)
+
+        return self._waveforms[i]
+
+
+    def get_waveforms(self) -> list:
+        """Returns every channel as a Waveform
+
+        Returns
+        -------
+        list
+            A list of Waveform objects, one per channel
+        """
+
+        return [self.get_waveform(i) for i in range(len(self.channel_names))]
@@ -0,0 +1,218 @@
+"""Per-Period Flicker Metrics
+
+The Waveform class computes the flicker index from the first period of the capture, so one
+atypical period can skew the result. These functions segment the whole capture into periods
+at once and compute the metrics of every period in a single vectorized pass, giving the
+distribution of each metric across the capture.
+
+Periods are segmented at rising edges through the middle level of the waveform, with hysteresis
+so that noise near it does not produce false edges. The levels are taken from the typical block
+of the capture (see segment_levels), so a dropout does not move them away from the periods
+around it. The per-period reductions use np.ufunc.reduceat on the original
+array, so the periods are never copied out of the data.
+
+The functions are:
+
+    * segment_levels - Gets the middle level and the swing used to segment a waveform into periods
+    * period_starts - Finds the sample index at which every period starts
+    * period_metrics - Computes the metrics of every period
+    * distribution - Summarizes the distribution of a metric
+    * period_stats - Segments a waveform into periods and summarizes the metrics of every period
+"""
+
+import numpy as np
+
+
+# The length of the blocks whose extremes give the segment levels, in seconds. Longer than the
+# period of any flicker of interest
+LEVEL_BLOCK = 0.1
+
+
+def segment_levels(volts:np.ndarray, framerate:int, v_avg:float, v_pp:float, block:float=LEVEL_BLOCK) -> tuple:
+    """Gets the middle level and the swing used to segment a waveform into periods
+
+    The low and high levels are the medians of the minimum and the maximum of every block of
+    the capture, so a dropout or a burst that spans fewer than half of the blocks does not move
+    them. A capture of fewer than two blocks is segmented at its own v_avg and v_pp
+
+    Parameters
+    ----------
+    volts : ndarray
+        The voltages of the waveform as a 1D array
+    framerate : int
+        The frame rate (samples per second)
+    v_avg : float
+        The average voltage of the whole capture
+    v_pp : float
+        The peak-to-peak voltage of the whole capture
+    block : float
+        The length of each block, in seconds
+
+    Returns
+    -------
+    tuple
+        (the middle level, the peak-to-peak swing), as the v_avg and v_pp of period_starts()
+    """
+
+    n = max(int(block * framerate), 1)
+    blocks = len(volts) // n
+    if blocks < 2:
+        return (v_avg, v_pp)
+
+    shaped = volts[:blocks * n].reshape(blocks, n)
+    (v_low, v_high) = (np.median(shaped.min(axis=1)), np.median(shaped.max(axis=1)))
+
+    return ((v_high + v_low) / 2, v_high - v_low)
+
+
+def period_starts(volts:np.ndarray, v_avg:float, v_pp:float, hysteresis:float=0.1) -> np.ndarray:
+    """Finds the sample index at which every period starts
+
+    A period starts when the waveform rises above v_avg + hysteresis * v_pp, having been below
+    v_avg - hysteresis * v_pp since the previous start.
+
+    Parameters
+    ----------
+    volts : ndarray
+        The voltages of the waveform as a 1D array
+    v_avg : float
+        The average voltage
+    v_pp : float
+        The peak-to-peak voltage
+    hysteresis : float
+        The half-width of the hysteresis band, as a fraction of v_pp
+
+    Returns
+    -------
+    ndarray
+        The index of the first sample of each period
+    """
+
+    # The samples at which the waveform enters the high and the low band. Only these are kept
+    # as indices, so no index array as long as the waveform is built
+    high = volts > v_avg + hysteresis * v_pp
+    rises = np.flatnonzero(high[1:] > high[:-1]) + 1
+    del high
+    low = volts < v_avg - hysteresis * v_pp
+    falls = np.flatnonzero(low[1:] > low[:-1]) + 1
+    if len(low) and low[0]:
+        falls = np.concatenate(([0], falls))
+    del low
+
+    # A period starts when the waveform enters the high band and last left the low band,
+    # i.e. the entry before it (in sample order) is into the low band
+    order = np.argsort(np.concatenate((rises, falls)), kind='stable')
+    is_rise = order < len(rises)
+    starts = is_rise[1:] & ~is_rise[:-1]
+
+    return rises[order[1:][starts]]
+
+
+def period_metrics(volts:np.ndarray, starts:np.ndarray, v_avg:float, framerate:int) -> dict:
+    """Computes the metrics of every period
+
+    Each period runs from one start to the next, so there is one period fewer than starts.
+
+    Parameters
+    ----------
+    volts : ndarray
+        The voltages of the waveform as a 1D array
+    starts : ndarray
+        The index of the first sample of each period, see period_starts()
+    v_avg : float
+        The average voltage of the waveform, used to split each period for the flicker index
+    framerate : int
+        The frame rate (samples per second)
+
+    Returns
+    -------
+    dict
+        1D arrays with one value per period: 'period' (seconds), 'v_max', 'v_min', 'v_mean',
+        'percent flicker' and 'flicker index'
+    """
+
+    if len(starts) < 2:
+        empty = np.empty(0)
+        return {'period': empty, 'v_max': empty, 'v_min': empty, 'v_mean': empty,
+                'percent flicker': empty, 'flicker index': empty}
+
+    # reduceat reduces over [starts[i], starts[i+1]); the last segment runs to the end of the
+    # array, which is an incomplete period, so it is dropped
+    lengths = np.diff(starts)
+    v_max = np.maximum.reduceat(volts, starts)[:-1]
+    v_min = np.minimum.reduceat(volts, starts)[:-1]
+    area_all = np.add.reduceat(volts, starts)[:-1]
+    area_top = np.add.reduceat(np.maximum(volts - v_avg, 0), starts)[:-1]
+
+    out = {}
+    out['period'] = lengths / framerate
+    out['v_max'] = v_max
+    out['v_min'] = v_min
+    out['v_mean'] = area_all / lengths
+    out['percent flicker'] = (v_max - v_min) / v_max * 100
+    out['flicker index'] = area_top / area_all
+
+    return out
+
+
+def distribution(values:np.ndarray, percentiles:tuple=(5, 50, 95)) -> dict:
+    """Summarizes the distribution of a metric
+
+    Parameters
+    ----------
+    values : ndarray
+        The value of the metric for every period
+    percentiles : tuple
+        The percentiles to compute
+
+    Returns
+    -------
+    dict
+        'count', 'mean', 'std', 'min', 'max', and 'p<N>' for each percentile
+        (None for every statistic if there are no values)
+    """
+
+    out = {'count': len(values)}
+    if len(values) == 0:
+        for k in ['mean', 'std', 'min', 'max'] + ['p' + str(p) for p in percentiles]:
+            out[k] = None
+        return out
+
+    out['mean'] = values.mean()
+    out['std'] = values.std()
+    out['min'] = values.min()
+    out['max'] = values.max()
+    for p, v in zip(percentiles, np.percentile(values, percentiles)):
+        out['p' + str(p)] = v
+
+    return out
+
+
+def period_stats(data:np.ndarray, v_avg:float, v_pp:float, framerate:int) -> tuple:
+    """Segments a waveform into periods and summarizes the metrics of every period
+
+    Parameters
+    ----------
+    data : ndarray
+        The waveform data as a 2D array
+    v_avg : float
+        The average voltage
+    v_pp : float
+        The peak-to-peak voltage
+    framerate : int
+        The frame rate (samples per second)
+
+    Returns
+    -------
+    tuple
+        (the index of the first sample of each period, see period_starts(),
+         the metrics of every period, see period_metrics(),
+         the distribution of 'period', 'percent flicker' and 'flicker index', see distribution())
+    """
+
+    volts = data[:,1]
+    starts = period_starts(volts, *segment_levels(volts, framerate, v_avg, v_pp))
+    metrics = period_metrics(volts, starts, v_avg, framerate)
+    stats = {k: distribution(metrics[k]) for k in ('period', 'percent flicker', 'flicker index')}
+
+    return (starts, metrics, stats)
@@ -0,0 +1,430 @@
+"""Waveform Analysis Pipelines
+
+A Pipeline is an ordered list of named Stages. Each Stage is a function with declared inputs
+and outputs: it reads its inputs by name from the values produced so far, and writes its
+outputs back under their names. The Waveform class is built by running a Pipeline, so stages
+can be skipped, swapped for other algorithms, or added without changing the Waveform class.
+
+Stage outputs can be cached. The cache key of a stage depends on the stage itself and on the
+keys of the stages that produced its inputs, so when a pipeline is re-run with one stage
+changed, only that stage and the stages downstream of it are recomputed.
+
+The classes are:
+
+    * Stage - A named step of a Pipeline, with declared inputs and outputs
+    * Pipeline - An ordered list of Stages that computes values from inputs
+    * StageError - An error raised by a stage while running a Pipeline
+"""
+
+from .profiling import profile_stage
+
+
+class StageError(Exception):
+    """An error raised by a stage while running a Pipeline
+
+    Attributes
+    ----------
+    stage : str
+        The name of the stage that failed
+    file : str or None
+        The file being processed, if any
+    error : Exception
+        The original error (also available as __cause__)
+    """
+
+    def __init__(self, stage:str, file:str, error:Exception):
+        message = 'Stage ' + repr(stage) + ' failed'
+        if file is not None:
+            message += ' on ' + str(file)
+        message += ': ' + type(error).__name__ + ': ' + str(error)
+        super().__init__(message)
+
+        self.stage = stage
+        self.file = file
+        self.error = error
+
+
+class Stage:
+    """A named step of a Pipeline, with declared inputs and outputs
+
+    Attributes
+    ----------
+    name : str
+        The name of the stage, unique within a Pipeline
+    func : function
+        The function run by this stage. It is called with the input values as positional
+        arguments (in the order of inputs), followed by params as keyword arguments
+    inputs : tuple
+        The names of the values passed to func
+    outputs : tuple
+        The names of the values returned by func. If there is more than one output,
+        func must return a tuple of the same length
+    params : dict
+        Extra keyword arguments passed to func, e.g. {'window_length': 501}
+    cache : bool
+        Whether the outputs of this stage are kept in the cache between runs
+
+    Methods
+    -------
+    run(values)
+        Runs this stage on a dict of named values
+    """
+
+    def __init__(self, name:str, func, inputs:tuple=(), outputs:tuple=(), params:dict=None,
+                 cache:bool=True):
+        """Initializes this Stage
+
+        Parameters
+        ----------
+        name : str
+            The name of the stage, unique within a Pipeline
+        func : function
+            The function run by this stage
+        inputs : tuple
+            The names of the values passed to func
+        outputs : tuple
+            The names of the values returned by func
+        params : dict or None
+            Extra keyword arguments passed to func
+        cache : bool
+            If True (default), the outputs of this stage are kept in the cache between runs
+        """
+
+        self.name = name
+        self.func = func
+        self.inputs = tuple(inputs)
+        self.outputs = tuple(outputs)
+        self.params = params or {}
+        self.cache = cache
+
+
+    def __repr__(self):
+        return 'Stage({!r}, {}{} -> {})'.format(self.name, getattr(self.func, '__name__', self.func),
+                                                self.inputs, self.outputs)
+
+
+    def run(self, values:dict) -> dict:
+        """Runs this stage on a dict of named values
+
+        Parameters
+        ----------
+        values : dict
+            The values computed so far, by name. Must contain every input of this stage
+
+        Returns
+        -------
+        dict
+            The outputs of this stage, by name
+        """
+
+        result = self.func(*[values[i] for i in self.inputs], **self.params)
+        if len(self.outputs) == 1:
+            result = (result,)
+        return dict(zip(self.outputs, result))
+
+
+def _token(value):
+    """Returns a hashable token identifying an input value for cache keys"""
+
+    if value is None or isinstance(value, (str, bytes, int, float, bool)):
+        return value
+    return id(value)
+
+
+class Pipeline:
+    """An ordered list of Stages that computes values from inputs
+
+    Attributes
+    ----------
+    name : str
+        The name of this pipeline, e.g. 'full' or 'fast'
+    stages : list
+        The Stages, in the order they are run
+
+    Methods
+    -------
+    get_stage_names()
+        Returns the names of the stages, in order
+    get_stage(name)
+        Returns a stage by its name
+    without(*names)
+        Returns a copy of this Pipeline without the named stages
+    replace(name, stage)
+        Returns a copy of this Pipeline with the named stage replaced
+    insert(stage, after=None)
+        Returns a copy of this Pipeline with a stage added
+    preload(cache, values, name, outputs)
+        Stores outputs computed elsewhere in a cache, as if a stage had run
+    run(values, cache=None, profiler=None, file=None)
+        Runs the pipeline
+    """
+
+    def __init__(self, stages:list, name:str='custom'):
+        """Initializes this Pipeline
+
+        Parameters
+        ----------
+        stages : list
+            The Stages, in the order they are run
+        name : str
+            The name of this pipeline
+        """
+
+        names = [s.name for s in stages]
+        if len(set(names)) != len(names):
+            raise ValueError('Stage names must be unique: ' + ', '.join(names))
+
+        self.name = name
+        self.stages = list(stages)
+
+
+    def __repr__(self):
+        return 'Pipeline({!r}: {})'.format(self.name, ' -> '.join(self.get_stage_names()))
+
+
+    def __contains__(self, name:str) -> bool:
+        return name in self.get_stage_names()
+
+
+    def __iter__(self):
+        return iter(self.stages)
+
+
+    def __len__(self):
+        return len(self.stages)
+
+
+    def get_stage_names(self) -> list:
+        """Returns the names of the stages, in order
+
+        Returns
+        -------
+        list
+            The stage names
+        """
+
+        return [s.name for s in self.stages]
+
+
+    def get_stage(self, name:str) -> Stage:
+        """Returns a stage by its name
+
+        Parameters
+        ----------
+        name : str
+            The name of the stage
+
+        Returns
+        -------
+        Stage
+            The stage
+        """
+
+        for s in self.stages:
+            if s.name == name:
+                return s
+        raise KeyError('No stage named ' + repr(name))
+
+
+    def without(self, *names, new_name:str=None):
+        """Returns a copy of this Pipeline without the named stages
+
+        Names that are not in the pipeline are ignored.
+
+        Parameters
+        ----------
+        *names : str
+            The names of the stages to remove
+        new_name : str or None
+            The name of the new pipeline. If None, keeps this pipeline's name
+
+        Returns
+        -------
+        Pipeline
+            The new pipeline
+        """
+
+        return Pipeline([s for s in self.stages if s.name not in names], new_name or self.name)
+
+
+    def replace(self, name:str, stage:Stage, new_name:str=None):
+        """Returns a copy of this Pipeline with the named stage replaced
+
+        Parameters
+        ----------
+        name : str
+            The name of the stage to replace
+        stage : Stage
+            The new stage
+        new_name : str or None
+            The name of the new pipeline. If None, keeps this pipeline's name
+
+        Returns
+        -------
+        Pipeline
+            The new pipeline
+        """
+
+        self.get_stage(name)
+        stages = [stage if s.name == name else s for s in self.stages]
+        return Pipeline(stages, new_name or self.name)
+
+
+    def insert(self, stage:Stage, after:str=None, new_name:str=None):
+        """Returns a copy of this Pipeline with a stage added
+
+        Parameters
+        ----------
+        stage : Stage
+            The new stage
+        after : str or None
+            The name of the stage after which to insert the new stage. If None, appends it
+        new_name : str or None
+            The name of the new pipeline. If None, keeps this pipeline's name
+
+        Returns
+        -------
+        Pipeline
+            The new pipeline
+        """
+
+        stages = list(self.stages)
+        if after is None:
+            stages.append(stage)
+        else:
+            stages.insert(self.get_stage_names().index(after) + 1, stage)
+        return Pipeline(stages, new_name or self.name)
+
+
+    def _plan(self, values:dict) -> tuple:
+        """Computes the cache key of every stage from the keys of its inputs
+
+        Returns (keys, the stages each stage needs, the stages that are skipped because their
+        outputs are given, the final producer of every value)
+        """
+
+        provenance = {k: ('input', k, _token(v)) for k, v in values.items()}
+        producers = {}
+        keys = []
+        needs = []
+        skipped = set()
+        for i, s in enumerate(self.stages):
+            # Stages whose outputs are all given as inputs are not needed
+            if s.outputs and all(name in values for name in s.outputs):
+                skipped.add(i)
+                keys.append(None)
+                needs.append([])
+                continue
+
+            for name in s.inputs:
+                if name not in provenance:
+                    raise ValueError('Stage ' + repr(s.name) + ' requires ' + repr(name) + \
+                                     ', which is not an input and is not produced by an earlier stage')
+            key = (s.name, s.func, repr(sorted(s.params.items())), tuple(provenance[n] for n in s.inputs))
+            keys.append(key)
+            needs.append([producers[n] for n in s.inputs if n in producers])
+            for name in s.outputs:
+                provenance[name] = (key, name)
+                producers[name] = i
+
+        return (keys, needs, skipped, producers)
+
+
+    def preload(self, cache:dict, values:dict, name:str, outputs:dict):
+        """Stores outputs computed elsewhere in a cache, as if a stage had run
+
+        A later run with the same cache and values uses these outputs instead of running the
+        stage, e.g. for data parsed ahead of time by a Prefetcher.
+
+        Parameters
+        ----------
+        cache : dict
+            The cache of stage outputs, later passed to run()
+        values : dict
+            The input values the pipeline will be run with
+        name : str
+            The name of the stage
+        outputs : dict
+            The outputs of the stage, by name
+        """
+
+        keys = self._plan(values)[0]
+        cache[keys[self.get_stage_names().index(name)]] = outputs
+
+
+    def run(self, values:dict, cache:dict=None, profiler=None, file:str=None) -> dict:
+        """Runs the pipeline
+
+        Only the stages needed to produce the final value of each output are run. Stages whose
+        outputs are all given in values are skipped, so a pipeline can be started part way
+        through, e.g. from data that has already been imported and denoised. A stage is
+        not run if its outputs are in the cache under the same key, which depends on the stage
+        and on everything upstream of it. After the run, the cache only holds the entries of
+        stages that produce a final value of this pipeline, so stale results and intermediate
+        values replaced by a later stage (e.g. the raw data before denoising) are not kept.
+
+        Parameters
+        ----------
+        values : dict
+            The input values, by name, e.g. {'filename': '../CSVs/Example_Waveform.csv'}
+        cache : dict or None
+            The cache of stage outputs. Pass the same dict to later runs to reuse results.
+            If None, every stage is run
+        profiler : Profiler or None
+            If specified, every stage run will be recorded by this Profiler
+        file : str or None
+            The file being processed, for profiling
+
+        Returns
+        -------
+        dict
+            The input values plus the final value of every stage output, by name
+
+        Raises
+        ------
+        StageError
+            If a stage raises an error, with the name of the stage and the original error
+        """
+
+        if cache is None:
+            cache = {}
+
+        (keys, needs, skipped, producers) = self._plan(values)
+
+        # Work out which stages must run: the final producer of every output, plus whatever
+        # they need that is not cached
+        to_run = set()
+        def require(i):
+            if i in to_run or (self.stages[i].cache and keys[i] in cache):
+                return
+            to_run.add(i)
+            for j in needs[i]:
+                require(j)
+
+        final = set(producers.values())
+        for i in final:
+            require(i)
+
+        # Run the stages in order, loading cached outputs where available
+        out = dict(values)
+        for i, s in enumerate(self.stages):
+            if i in skipped:
+                continue
+            if i in to_run:
+                try:
+                    with profile_stage(profiler, s.name, file):
+                        result = s.run(out)
+                except Exception as e:
+                    raise StageError(s.name, file, e) from e
+                if s.cache:
+                    cache[keys[i]] = result
+                out.update(result)
+            elif s.cache and keys[i] in cache:
+                out.update(cache[keys[i]])
+
+        # Drop cached entries that are stale or hold intermediate values
+        keep = [keys[i] for i in final]
+        for key in [k for k in cache if k not in keep]:
+            del cache[key]
+
+        return out
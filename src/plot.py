@@ -6,6 +6,7 @@ The functions are:
 
     * ieee_par_1789_graph - Plots the IEEE PAR 1789 logarithmic graph
     * waveform_graph - Plots the time-domain flicker waveform
+    * minmax_scale - Linearly scales an array so its minimum and maximum match a range
     * standards_color - Returns colors for decorating standards result labels
 """
 
@@ -16,8 +17,14 @@ import matplotlib.colors
 import itertools
 from matplotlib.ticker import PercentFormatter, ScalarFormatter
 from .utils import bool_to_pass_fail
-from sklearn.preprocessing import minmax_scale
-from pylab import text
+from .pyramid import build_pyramid
+
+
+# Waveforms with more samples are plotted from their min/max envelope
+MAX_PLOT_POINTS = 20000
+
+# The number of envelope blocks plotted across the figure
+ENVELOPE_WIDTH = 2000
 
 
 def ieee_par_1789_graph(
@@ -134,11 +141,20 @@ def waveform_graph(waveform, figsize:tuple=(8,4), suppress:bool=False, filename:
     data : np.ndarray or None
         If None, will plot the regular waveform
         If ndarray, will plot the array 
+
+    Waveforms with more than MAX_PLOT_POINTS samples are drawn from their min/max envelope
+    (see pyramid.py), which looks the same at the size of the figure
     """
     
-    # Get the data from the waveform
-    if data is None:
-        data = waveform.get_data()
+    # Get the data from the waveform, from its envelope pyramid if it is large
+    envelope = False
+    if data is None and not num_periods:
+        pyramid = waveform.get_pyramid()
+        if pyramid.length > MAX_PLOT_POINTS:
+            data = pyramid.envelope_data(width=ENVELOPE_WIDTH)
+            envelope = True
+        else:
+            data = waveform.get_data()
 
     # Create the figure
     fig, ax = plt.subplots(1, 1, figsize=figsize)
@@ -152,6 +168,9 @@ def waveform_graph(waveform, figsize:tuple=(8,4), suppress:bool=False, filename:
     # get the number of periods to display
     if num_periods:
         data = waveform.get_n_periods(num_periods=num_periods)
+    if len(data) > MAX_PLOT_POINTS:
+        data = build_pyramid(data).envelope_data(width=ENVELOPE_WIDTH)
+        envelope = True
 
     # scale the x axis to milliseconds
     x_data = data[:,0] * 1000
@@ -167,27 +186,34 @@ def waveform_graph(waveform, figsize:tuple=(8,4), suppress:bool=False, filename:
         # scale y axis to 0.99 because of strange clipping at 1.0
         y_data = minmax_scale(data[:,1], feature_range=(y_min,0.99)) 
     else:
-        ax.spines['left'].set_smart_bounds(True)
+        if hasattr(ax.spines['left'], 'set_smart_bounds'):
+            ax.spines['left'].set_smart_bounds(True)
 
         # scale y axis to (0,1)
         y_data = minmax_scale(data[:,1], feature_range=(y_min,0.99))
 
-    # make the left and bottom axis look cleaner
-    ax.spines['bottom'].set_smart_bounds(True)
+    # make the left and bottom axis look cleaner (set_smart_bounds was removed in matplotlib 3.4)
+    if hasattr(ax.spines['bottom'], 'set_smart_bounds'):
+        ax.spines['bottom'].set_smart_bounds(True)
     
-    # plot
-    ax.plot(x_data, y_data)
+    # plot (an envelope is filled between its minima and maxima, which renders much faster
+    # than a line zigzagging between them)
+    if envelope:
+        ax.fill_between(x_data[0::2], y_data[0::2], y_data[1::2], color='C0',
+                        linewidth=plt.rcParams['lines.linewidth'])
+    else:
+        ax.plot(x_data, y_data)
 
     # show stats on the graph
     if showstats:
-        text(0.02, 0.1, waveform.summary(), ha='left', va='center', transform=ax.transAxes)
+        ax.text(0.02, 0.1, waveform.summary(), ha='left', va='center', transform=ax.transAxes)
 
     # show standard test results on the graph
     if showstandards:
         std_text = "IEEE 1789: " + waveform.get_ieee_1789_2015() + \
             "\nCalifornia JA8: " +  bool_to_pass_fail(waveform.get_california_ja8_2019()) + \
             "\nWELL v2: " +  bool_to_pass_fail(waveform.get_well_standard_v2())
-        text(0.955, 0.1, std_text, ha='right', va='center', transform=ax.transAxes) #, backgroundcolor='silver')
+        ax.text(0.955, 0.1, std_text, ha='right', va='center', transform=ax.transAxes) #, backgroundcolor='silver')
 
     # save the figure if a filename was specified
     if filename:
@@ -198,6 +224,30 @@ def waveform_graph(waveform, figsize:tuple=(8,4), suppress:bool=False, filename:
         plt.show()
 
 
+def minmax_scale(array:np.ndarray, feature_range:tuple=(0,1)) -> np.ndarray:
+    """Linearly scales an array so its minimum and maximum match a range
+
+    Parameters
+    ----------
+    array : ndarray
+        A 1D array
+    feature_range : tuple
+        The (min, max) of the output
+
+    Returns
+    -------
+    ndarray
+        The scaled array. A constant array is scaled to the bottom of the range
+    """
+
+    (lo, hi) = feature_range
+    a_min = array.min()
+    a_range = array.max() - a_min
+    if a_range == 0:
+        return np.full(len(array), lo, dtype=np.float64)
+    return (array - a_min) * ((hi - lo) / a_range) + lo
+
+
 def standards_color(result:str) -> str:
     """Returns colors for decorating standards result labels
 
@@ -0,0 +1,181 @@
+"""Prefetching File Loader
+
+Importing a directory alternates between reading a file and analyzing it, so the CPU is idle
+during reads and the disk is idle during analysis. A Prefetcher loads (reads and parses)
+upcoming files on a bounded thread pool while the caller analyzes the current one. At most
+depth files are loaded or loading ahead of the caller, and no new load is started while the
+loaded-but-unconsumed data exceeds the memory cap. Counters show how much of the load time
+was hidden behind the analysis.
+
+See waveform.batch_import, which uses a Prefetcher for the import stage.
+
+The classes are:
+
+    * Prefetcher - Loads upcoming files on a thread pool while the current one is processed
+"""
+
+import time
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from .budget import parse_size
+
+
+def _nbytes(value) -> int:
+    """Returns the bytes held by a loaded value: an array, or a dict or tuple of arrays"""
+
+    if isinstance(value, dict):
+        return sum(_nbytes(v) for v in value.values())
+    if isinstance(value, (tuple, list)):
+        return sum(_nbytes(v) for v in value)
+    return getattr(value, 'nbytes', 0)
+
+
+class Prefetcher:
+    """Loads upcoming files on a thread pool while the current one is processed
+
+    Attributes
+    ----------
+    workers : int
+        The number of files loaded at once
+    depth : int
+        The maximum number of files loaded or loading ahead of the consumer
+    memory_cap : int or None
+        No new load is started while the loaded, unconsumed data exceeds this many bytes.
+        Loads already in flight may exceed it by up to depth - 1 files
+
+    Methods
+    -------
+    map(paths, load)
+        Loads files ahead of the consumer, yielding them in order
+    get_counters()
+        Returns the utilization counters
+    """
+
+    def __init__(self, workers:int=2, depth:int=4, memory_cap=None):
+        """Initializes this Prefetcher
+
+        Parameters
+        ----------
+        workers : int
+            The number of files loaded at once
+        depth : int
+            The maximum number of files loaded or loading ahead of the consumer
+        memory_cap : int or str or None
+            The maximum bytes of loaded, unconsumed data before loading pauses, e.g. '1GB'.
+            If None, only depth limits the data held
+        """
+
+        self.workers = max(int(workers), 1)
+        self.depth = max(int(depth), 1)
+        self.memory_cap = None if memory_cap is None else parse_size(memory_cap)
+
+        self._lock = threading.Lock()
+        self._queued_bytes = 0
+        self._counters = {
+            'files': 0,
+            'errors': 0,
+            'bytes': 0,
+            'load_time': 0.0,
+            'wait_time': 0.0,
+            'elapsed': 0.0,
+            'peak_depth': 0,
+            'peak_bytes': 0,
+            'cap_stalls': 0,
+        }
+
+
+    def _load(self, load, path):
+        """Loads one file in a worker thread, updating the counters"""
+
+        t_0 = time.perf_counter()
+        try:
+            value = load(path)
+        except Exception as e:
+            with self._lock:
+                self._counters['errors'] += 1
+                self._counters['load_time'] += time.perf_counter() - t_0
+            return (None, e, 0)
+
+        size = _nbytes(value)
+        with self._lock:
+            self._counters['files'] += 1
+            self._counters['bytes'] += size
+            self._counters['load_time'] += time.perf_counter() - t_0
+            self._queued_bytes += size
+            self._counters['peak_bytes'] = max(self._counters['peak_bytes'], self._queued_bytes)
+        return (value, None, size)
+
+
+    def map(self, paths, load):
+        """Loads files ahead of the consumer, yielding them in order
+
+        Parameters
+        ----------
+        paths : iterable
+            The file paths
+        load : function
+            Called with each path in a worker thread; returns the loaded value
+
+        Returns
+        -------
+        generator
+            (path, loaded value or None, error or None) for each path, in order. Errors raised
+            by load are returned rather than raised
+        """
+
+        t_start = time.perf_counter()
+        paths = iter(paths)
+        pending = deque()
+
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            def fill():
+                while len(pending) < self.depth:
+                    if pending and self.memory_cap is not None and self._queued_bytes >= self.memory_cap:
+                        with self._lock:
+                            self._counters['cap_stalls'] += 1
+                        return
+                    path = next(paths, None)
+                    if path is None:
+                        return
+                    pending.append((path, executor.submit(self._load, load, path)))
+                    self._counters['peak_depth'] = max(self._counters['peak_depth'], len(pending))
+
+            try:
+                fill()
+                while pending:
+                    (path, future) = pending.popleft()
+
+                    t_0 = time.perf_counter()
+                    (value, error, size) = future.result()
+                    with self._lock:
+                        self._counters['wait_time'] += time.perf_counter() - t_0
+                        self._queued_bytes -= size
+
+                    # Start the next loads before handing this file to the consumer
+                    fill()
+                    yield (path, value, error)
+            finally:
+                for (_, future) in pending:
+                    future.cancel()
+                with self._lock:
+                    self._counters['elapsed'] += time.perf_counter() - t_start
+
+
+    def get_counters(self) -> dict:
+        """Returns the utilization counters
+
+        Returns
+        -------
+        dict
+            'files' and 'errors' loaded, 'bytes' loaded, 'load_time' (seconds spent loading,
+            summed over workers), 'wait_time' (seconds the consumer waited for a load),
+            'elapsed' (seconds in map()), 'hidden_time' (load time overlapped with the
+            consumer), 'peak_depth' (most files ahead of the consumer), 'peak_bytes' (most
+            loaded, unconsumed bytes) and 'cap_stalls' (times loading paused at the memory cap)
+        """
+
+        with self._lock:
+            out = dict(self._counters)
+        out['hidden_time'] = max(out['load_time'] - out['wait_time'], 0.0)
+        return out
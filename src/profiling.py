@@ -0,0 +1,392 @@
+"""Pipeline Profiling
+
+These classes record the wall time, CPU time and peak allocated memory of each step of the
+waveform pipeline, per file. Profiling is opt-in: pass a Profiler to a Waveform or
+WaveformCollection. When no Profiler is passed, the steps run inside a shared no-op context,
+so the overhead is a single function call per step.
+
+CPU time is that of the thread running the stage. Stages may be nested (e.g. 'pyramid' inside
+'plot'), and the peak memory of a stage includes the peaks of the stages nested in it. The
+tracemalloc peak is shared by the whole process, so it cannot be split between stages that run
+at the same time on different threads (e.g. Prefetcher workers or a DimmingSweep thread pool):
+such stages are flagged as concurrent, and their peak memory is not recorded.
+
+The classes are:
+
+    * Profiler - Records timing and memory statistics for pipeline stages
+    * ProfileStats - The statistics recorded by a Profiler
+    * StageRecord - A single timed pipeline stage
+
+The functions are:
+
+    * profile_stage - Returns a context manager timing a stage, or a no-op if profiler is None
+"""
+
+import os
+import json
+import time
+import threading
+import tracemalloc
+from collections import namedtuple
+from . import kernels
+
+
+StageRecord = namedtuple('StageRecord', ['file', 'stage', 'start', 'wall', 'cpu', 'peak_memory', 'thread',
+                                         'concurrent'], defaults=(False,))
+StageRecord.__doc__ = """A single timed pipeline stage
+
+Times are in seconds; start is relative to the creation of the Profiler, and cpu is the CPU
+time of the thread that ran the stage. peak_memory is in bytes, or None if memory tracking is
+disabled or the stage was concurrent, i.e. overlapped a stage running on another thread."""
+
+
+class _NullStage:
+    """A reusable context manager that does nothing, used when profiling is disabled"""
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NULL_STAGE = _NullStage()
+
+
+def _reset_peak():
+    if hasattr(tracemalloc, 'reset_peak'):
+        tracemalloc.reset_peak()
+
+
+class _Stage:
+    """A context manager that times one stage and records it in a Profiler"""
+
+    def __init__(self, profiler, stage:str, file:str):
+        self.profiler = profiler
+        self.stage = stage
+        self.file = file
+        self.concurrent = False
+
+    def __enter__(self):
+        self.thread = threading.get_ident()
+        self.profiler._enter(self)
+
+        if self.profiler.memory:
+            traced = tracemalloc.get_traced_memory()
+            # Fold the peak so far into the enclosing stage before resetting it for this one
+            stack = self.profiler._stack()
+            self.parent = stack[-2] if len(stack) > 1 else None
+            if self.parent is not None:
+                self.parent.peak = max(self.parent.peak, traced[1] - self.parent.mem_start)
+            self.mem_start = traced[0]
+            self.peak = 0
+            _reset_peak()
+        self.cpu_start = time.thread_time()
+        self.wall_start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        wall = time.perf_counter() - self.wall_start
+        cpu = time.thread_time() - self.cpu_start
+        peak_memory = None
+        if self.profiler.memory:
+            peak = max(self.peak, tracemalloc.get_traced_memory()[1] - self.mem_start, 0)
+            if self.parent is not None:
+                # The enclosing stage resumes measuring from here
+                self.parent.peak = max(self.parent.peak, peak + self.mem_start - self.parent.mem_start)
+                _reset_peak()
+            peak_memory = peak
+
+        self.profiler._exit(self)
+        if self.concurrent:
+            peak_memory = None
+
+        self.profiler.records.append(StageRecord(
+            self.file, self.stage, self.wall_start - self.profiler.t_0, wall, cpu, peak_memory,
+            self.thread, self.concurrent))
+        return False
+
+
+class Profiler:
+    """Records timing and memory statistics for pipeline stages
+
+    Attributes
+    ----------
+    memory : bool
+        Whether peak allocated memory is tracked (using tracemalloc)
+    records : list
+        The StageRecord of every stage timed so far
+    backend : str
+        The kernel backend active when this Profiler was created (see kernels.get_backend)
+
+    Methods
+    -------
+    stage(stage, file=None)
+        Returns a context manager that times the enclosed block
+    get_stats()
+        Returns the statistics recorded so far
+    stop()
+        Stops memory tracking, if this Profiler started it
+    """
+
+    def __init__(self, memory:bool=True):
+        """Initializes this Profiler
+
+        Parameters
+        ----------
+        memory : bool
+            If True (default), peak allocated memory is tracked using tracemalloc.
+            This slows down allocation-heavy code, so disable it for pure timing runs
+        """
+
+        self.memory = memory
+        self.backend = kernels.get_backend()
+        self.records = []
+        self.t_0 = time.perf_counter()
+        self._started_tracemalloc = False
+        self._lock = threading.Lock()
+        self._active = []
+        self._local = threading.local()
+
+        if memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self._started_tracemalloc = True
+
+
+    def stage(self, stage:str, file:str=None):
+        """Returns a context manager that times the enclosed block
+
+        Parameters
+        ----------
+        stage : str
+            The name of the stage, e.g. 'denoise'
+        file : str or None
+            The file being processed
+
+        Returns
+        -------
+        context manager
+            Records a StageRecord on exit
+        """
+
+        return _Stage(self, stage, file)
+
+
+    def _stack(self) -> list:
+        """The stages open on the calling thread, outermost first"""
+
+        if not hasattr(self._local, 'stack'):
+            self._local.stack = []
+        return self._local.stack
+
+
+    def _enter(self, stage:_Stage):
+        """Opens a stage, flagging it and the stages open on other threads as concurrent"""
+
+        self._stack().append(stage)
+        with self._lock:
+            others = [s for s in self._active if s.thread != stage.thread]
+            if others:
+                stage.concurrent = True
+                for s in others:
+                    s.concurrent = True
+            self._active.append(stage)
+
+
+    def _exit(self, stage:_Stage):
+        """Closes a stage"""
+
+        self._stack().remove(stage)
+        with self._lock:
+            self._active.remove(stage)
+
+
+    def get_stats(self):
+        """Returns the statistics recorded so far
+
+        Returns
+        -------
+        ProfileStats
+            The recorded statistics
+        """
+
+        return ProfileStats(list(self.records), self.backend)
+
+
+    def stop(self):
+        """Stops memory tracking, if this Profiler started it"""
+
+        if self._started_tracemalloc:
+            tracemalloc.stop()
+            self._started_tracemalloc = False
+
+
+class ProfileStats:
+    """The statistics recorded by a Profiler
+
+    Attributes
+    ----------
+    records : list
+        The StageRecord of every timed stage
+    backend : str or None
+        The kernel backend the stages ran with
+
+    Methods
+    -------
+    by_stage()
+        Aggregates the records by stage
+    by_file()
+        Aggregates the records by file
+    summary()
+        Returns a text table of the time and memory spent in each stage
+    to_chrome_trace(filename=None)
+        Exports the records in the Chrome trace event format
+    """
+
+    def __init__(self, records:list, backend:str=None):
+        """Initializes this ProfileStats
+
+        Parameters
+        ----------
+        records : list
+            A list of StageRecord
+        backend : str or None
+            The kernel backend the stages ran with
+        """
+
+        self.records = records
+        self.backend = backend
+
+
+    def _aggregate(self, key:str) -> dict:
+        out = {}
+        for r in self.records:
+            k = getattr(r, key)
+            if k not in out:
+                out[k] = {'count': 0, 'wall': 0.0, 'cpu': 0.0, 'peak_memory': None, 'concurrent': 0}
+            agg = out[k]
+            agg['count'] += 1
+            agg['concurrent'] += r.concurrent
+            agg['wall'] += r.wall
+            agg['cpu'] += r.cpu
+            if r.peak_memory is not None:
+                agg['peak_memory'] = max(agg['peak_memory'] or 0, r.peak_memory)
+        return out
+
+
+    def by_stage(self) -> dict:
+        """Aggregates the records by stage
+
+        Returns
+        -------
+        dict
+            {stage: {'count', 'wall', 'cpu', 'peak_memory', 'concurrent'}}, where wall and cpu
+            are totals in seconds, peak_memory is the largest peak of any single call, in bytes,
+            and concurrent is the number of calls whose peak memory could not be recorded
+        """
+
+        return self._aggregate('stage')
+
+
+    def by_file(self) -> dict:
+        """Aggregates the records by file
+
+        Returns
+        -------
+        dict
+            {file: {'count', 'wall', 'cpu', 'peak_memory', 'concurrent'}}, where wall and cpu
+            are totals in seconds, peak_memory is the largest peak of any single stage, in bytes,
+            and concurrent is the number of stages whose peak memory could not be recorded
+        """
+
+        return self._aggregate('file')
+
+
+    def summary(self) -> str:
+        """Returns a text table of the time and memory spent in each stage
+
+        Returns
+        -------
+        str
+            The kernel backend, then one line per stage, in the order the stages were first run
+        """
+
+        stages = self.by_stage()
+        total = sum(s['wall'] for s in stages.values()) or 1.0
+
+        out = 'Kernel backend: ' + str(self.backend) + '\n'
+        out += '{:<16}{:>8}{:>12}{:>12}{:>8}{:>14}'.format('Stage', 'Calls', 'Wall (s)', 'CPU (s)', 'Wall %', 'Peak (MB)')
+        for name, s in stages.items():
+            peak = '-' if s['peak_memory'] is None else '{:.2f}'.format(s['peak_memory'] / 1e6)
+            out += '\n{:<16}{:>8}{:>12.4f}{:>12.4f}{:>8.1f}{:>14}'.format(
+                str(name), s['count'], s['wall'], s['cpu'], s['wall'] / total * 100, peak)
+
+        concurrent = sum(r.concurrent for r in self.records)
+        if concurrent:
+            out += '\n' + str(concurrent) + ' stage calls ran concurrently with stages on other ' + \
+                   'threads; their peak memory is not recorded'
+
+        return out
+
+
+    def to_chrome_trace(self, filename:str=None) -> dict:
+        """Exports the records in the Chrome trace event format
+
+        The output can be opened in chrome://tracing or https://ui.perfetto.dev
+
+        Parameters
+        ----------
+        filename : str or None
+            If specified, the trace will be saved as JSON to this file
+
+        Returns
+        -------
+        dict
+            The trace, as a dict of trace events
+        """
+
+        pid = os.getpid()
+        events = []
+        for r in self.records:
+            events.append({
+                'name': r.stage,
+                'cat': 'waveform',
+                'ph': 'X',
+                'ts': r.start * 1e6,
+                'dur': r.wall * 1e6,
+                'pid': pid,
+                'tid': r.thread,
+                'args': {'file': r.file, 'cpu': r.cpu, 'peak_memory': r.peak_memory,
+                         'concurrent': r.concurrent},
+            })
+
+        trace = {'traceEvents': events, 'displayTimeUnit': 'ms', 'metadata': {'kernel backend': self.backend}}
+
+        if filename:
+            with open(filename, 'w') as f:
+                json.dump(trace, f)
+
+        return trace
+
+
+def profile_stage(profiler, stage:str, file:str=None):
+    """Returns a context manager timing a stage, or a no-op if profiler is None
+
+    Parameters
+    ----------
+    profiler : Profiler or None
+        The Profiler recording the stage. If None, profiling is disabled
+    stage : str
+        The name of the stage, e.g. 'denoise'
+    file : str or None
+        The file being processed
+
+    Returns
+    -------
+    context manager
+        A timing context manager, or a shared no-op context manager
+    """
+
+    if profiler is None:
+        return _NULL_STAGE
+    return profiler.stage(stage, file)
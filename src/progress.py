@@ -0,0 +1,361 @@
+"""Progress and Throughput Reporting
+
+Importing or plotting a large tree of captures can take minutes without any output, so a slow
+run cannot be told from a hung one. A ProgressTracker follows a batch run file by file and
+sends an event to each of its callbacks when the run starts, when each file starts and ends,
+and when the run ends. Every event carries the progress so far: files done and failed, bytes
+read, samples processed, files per second, the estimated time remaining, and the utilization
+of the analysis thread and of the Prefetcher workers, if any.
+
+A callback is any function taking the event dict. Two are provided: ConsoleReporter prints a
+progress line that is rewritten in place, and JSONLinesSink appends every event to a file as
+one JSON object per line, for monitoring tools to tail.
+
+See waveform.batch_import and WaveformCollection.plot_all, which report to a ProgressTracker.
+
+The classes are:
+
+    * ProgressTracker - Follows a batch run file by file and reports events to callbacks
+    * ConsoleReporter - A callback printing a progress line to the console
+    * JSONLinesSink - A callback writing every event to a JSON lines file
+"""
+
+import os
+import sys
+import json
+import time
+
+
+class ProgressTracker:
+    """Follows a batch run file by file and reports events to callbacks
+
+    Each event is a dict with 'event' ('start', 'file_start', 'file_end' or 'end'), 'task'
+    (e.g. 'import' or 'plot'), 'time' (seconds since the epoch) and the counters of
+    get_counters(). File events also have 'path', and file_end events have 'ok', 'error',
+    'file_bytes' and 'file_samples' for that file ('bytes' and 'samples' are the run totals).
+
+    Attributes
+    ----------
+    callbacks : list
+        The functions called with every event
+    task : str or None
+        The name of the current run, e.g. 'import'
+    total : int or None
+        The number of files in the current run, if known
+
+    Methods
+    -------
+    add_callback(callback)
+        Adds a function called with every event
+    start(total=None, task='import', prefetcher=None)
+        Starts a run
+    file_started(path)
+        Records that a file has started
+    file_finished(path, error=None, samples=0)
+        Records that a file has ended
+    finish()
+        Ends the run
+    get_counters()
+        Returns the progress and throughput of the current run
+    """
+
+    def __init__(self, callbacks:list=None):
+        """Initializes this ProgressTracker
+
+        Parameters
+        ----------
+        callbacks : list or function or None
+            The functions called with every event, e.g. [ConsoleReporter()]
+        """
+
+        if callbacks is None:
+            callbacks = []
+        elif callable(callbacks):
+            callbacks = [callbacks]
+        self.callbacks = list(callbacks)
+        self.task = None
+        self.total = None
+        self._reset()
+
+
+    def _reset(self):
+        self._t_0 = time.perf_counter()
+        self._t_end = None
+        self._file_t_0 = None
+        self._busy = 0.0
+        self._prefetcher = None
+        self._load_time_0 = 0.0
+        self._counts = {'files': 0, 'failed': 0, 'bytes': 0, 'samples': 0}
+
+
+    def add_callback(self, callback):
+        """Adds a function called with every event
+
+        Parameters
+        ----------
+        callback : function
+            Called with the event dict
+        """
+
+        self.callbacks.append(callback)
+
+
+    def start(self, total:int=None, task:str='import', prefetcher=None):
+        """Starts a run, resetting the counters
+
+        Parameters
+        ----------
+        total : int or None
+            The number of files in the run, for the ETA
+        task : str
+            The name of the run, e.g. 'import' or 'plot'
+        prefetcher : Prefetcher or None
+            The Prefetcher loading the files, whose workers are included in the utilization
+        """
+
+        self._reset()
+        self.task = task
+        self.total = total
+        self._prefetcher = prefetcher
+        if prefetcher is not None:
+            self._load_time_0 = prefetcher.get_counters()['load_time']
+        self._emit('start')
+
+
+    def file_started(self, path:str):
+        """Records that a file has started
+
+        Parameters
+        ----------
+        path : str
+            The path of the file
+        """
+
+        self._file_t_0 = time.perf_counter()
+        self._emit('file_start', path=path)
+
+
+    def file_finished(self, path:str, error:Exception=None, samples:int=0):
+        """Records that a file has ended
+
+        Parameters
+        ----------
+        path : str
+            The path of the file
+        error : Exception or None
+            The error if the file failed
+        samples : int
+            The number of samples processed
+        """
+
+        if self._file_t_0 is not None:
+            self._busy += time.perf_counter() - self._file_t_0
+            self._file_t_0 = None
+
+        try:
+            size = os.path.getsize(path)
+        except (OSError, TypeError):
+            size = 0
+
+        self._counts['files'] += 1
+        self._counts['failed'] += error is not None
+        self._counts['bytes'] += size
+        self._counts['samples'] += int(samples or 0)
+        self._emit('file_end', path=path, ok=error is None, error=None if error is None else str(error),
+                   file_bytes=size, file_samples=int(samples or 0))
+
+
+    def finish(self):
+        """Ends the run"""
+
+        self._t_end = time.perf_counter()
+        self._emit('end')
+
+
+    def get_counters(self) -> dict:
+        """Returns the progress and throughput of the current run
+
+        Returns
+        -------
+        dict
+            'files' done (including 'failed'), 'total', 'bytes' read, 'samples' processed,
+            'elapsed' seconds, 'files_per_second', 'bytes_per_second', 'samples_per_second',
+            'eta' (seconds remaining, None if the total is unknown or nothing is done yet),
+            'utilization' (the fraction of the elapsed time the analysis thread was busy) and
+            'prefetch_utilization' (the fraction of the Prefetcher worker time spent loading,
+            None without a Prefetcher)
+        """
+
+        end = self._t_end if self._t_end is not None else time.perf_counter()
+        elapsed = max(end - self._t_0, 1e-9)
+        busy = self._busy
+        if self._file_t_0 is not None:
+            busy += end - self._file_t_0
+
+        out = dict(self._counts)
+        out['total'] = self.total
+        out['elapsed'] = elapsed
+        out['files_per_second'] = out['files'] / elapsed
+        out['bytes_per_second'] = out['bytes'] / elapsed
+        out['samples_per_second'] = out['samples'] / elapsed
+        out['eta'] = None
+        if self.total is not None and out['files']:
+            out['eta'] = max(self.total - out['files'], 0) / out['files_per_second']
+        out['utilization'] = min(busy / elapsed, 1.0)
+        out['prefetch_utilization'] = None
+        if self._prefetcher is not None:
+            load_time = self._prefetcher.get_counters()['load_time'] - self._load_time_0
+            out['prefetch_utilization'] = min(load_time / (elapsed * self._prefetcher.workers), 1.0)
+
+        return out
+
+
+    def _emit(self, event:str, **fields):
+        """Sends an event to every callback. Callbacks that fail to write are skipped"""
+
+        out = {'event': event, 'task': self.task, 'time': time.time()}
+        out.update(fields)
+        out.update(self.get_counters())
+        for callback in self.callbacks:
+            try:
+                callback(out)
+            except OSError:
+                pass
+
+
+class ConsoleReporter:
+    """A callback printing a progress line to the console
+
+    The line is rewritten in place at most every interval seconds, and ended with a newline
+    at the end of the run. Failed files are printed on their own line
+
+    Attributes
+    ----------
+    stream : file
+        The stream printed to
+    interval : float
+        The minimum number of seconds between updates
+    """
+
+    def __init__(self, stream=None, interval:float=0.5):
+        """Initializes this ConsoleReporter
+
+        Parameters
+        ----------
+        stream : file or None
+            The stream to print to. If None, sys.stderr
+        interval : float
+            The minimum number of seconds between updates
+        """
+
+        self.stream = stream
+        self.interval = interval
+        self._last = None
+
+
+    def __call__(self, event:dict):
+        stream = self.stream if self.stream is not None else sys.stderr
+
+        if event['event'] == 'file_end' and not event['ok']:
+            stream.write('\r' + 'Failed: ' + str(event['path']) + ': ' + str(event['error']) + '\n')
+
+        now = time.perf_counter()
+        if event['event'] == 'file_start' or \
+                (event['event'] == 'file_end' and self._last is not None and now - self._last < self.interval):
+            return
+        self._last = now
+
+        stream.write('\r' + self.format(event) + ('\n' if event['event'] == 'end' else ''))
+        stream.flush()
+
+
+    @staticmethod
+    def format(event:dict) -> str:
+        """Formats the progress of an event as one line
+
+        Parameters
+        ----------
+        event : dict
+            An event from a ProgressTracker
+
+        Returns
+        -------
+        str
+            e.g. 'import: 120/500 files (2 failed), 35.2 MB, 4.1 files/s, ETA 1m32s, 97% busy'
+        """
+
+        done = str(event['files']) + ('/' + str(event['total']) if event['total'] is not None else '')
+        out = str(event['task']) + ': ' + done + ' files'
+        if event['failed']:
+            out += ' (' + str(event['failed']) + ' failed)'
+        out += ', {:.1f} MB, {:.1f} files/s'.format(event['bytes'] / 1e6, event['files_per_second'])
+        if event['event'] == 'end':
+            out += ', done in ' + _duration(event['elapsed'])
+        elif event['eta'] is not None:
+            out += ', ETA ' + _duration(event['eta'])
+        out += ', {:.0%} busy'.format(event['utilization'])
+        if event['prefetch_utilization'] is not None:
+            out += ', prefetch {:.0%}'.format(event['prefetch_utilization'])
+        return out
+
+
+def _duration(seconds:float) -> str:
+    """Formats a duration, e.g. '1m32s'"""
+
+    seconds = int(round(seconds))
+    if seconds < 60:
+        return str(seconds) + 's'
+    if seconds < 3600:
+        return str(seconds // 60) + 'm' + '{:02d}'.format(seconds % 60) + 's'
+    return str(seconds // 3600) + 'h' + '{:02d}'.format(seconds % 3600 // 60) + 'm'
+
+
+class JSONLinesSink:
+    """A callback writing every event to a JSON lines file
+
+    Each event is written as one JSON object per line and flushed, so the file can be tailed
+    by a monitoring tool while the run is in progress
+
+    Attributes
+    ----------
+    filename : str
+        The file the events are appended to
+
+    Methods
+    -------
+    close()
+        Closes the file
+    """
+
+    def __init__(self, filename:str):
+        """Initializes this JSONLinesSink, opening the file for appending
+
+        Parameters
+        ----------
+        filename : str
+            The file to append the events to
+        """
+
+        self.filename = filename
+        self._file = open(filename, 'a')
+
+
+    def __call__(self, event:dict):
+        self._file.write(json.dumps(event, default=str) + '\n')
+        self._file.flush()
+
+
+    def __enter__(self):
+        return self
+
+
+    def __exit__(self, *exc):
+        self.close()
+        return False
+
+
+    def close(self):
+        """Closes the file"""
+
+        if not self._file.closed:
+            self._file.close()
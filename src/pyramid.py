@@ -0,0 +1,296 @@
+"""Min/Max Envelope Pyramids
+
+Plotting or measuring a long capture touches every sample. An EnvelopePyramid summarizes the
+voltages of a waveform at every resolution: level 0 holds the minimum, maximum and sum of each
+block of base samples, and each level above it combines pairs of blocks of the level below.
+The pyramid is built in one pass over the data and is about 3 / base of its size.
+
+Any range of samples is covered by O(log n) blocks, so the minimum, maximum and mean of a range
+(and the percent flicker within it) are found without reading the samples, and a plot at any
+zoom level draws the envelope of the level whose blocks are about a pixel wide. Ranges are
+rounded outward to whole blocks of base samples.
+
+The classes are:
+
+    * EnvelopePyramid - A multi-resolution min/max/mean summary of a waveform
+
+The functions are:
+
+    * build_pyramid - Builds the envelope pyramid of waveform data
+"""
+
+import numpy as np
+
+
+# The number of samples in each block of level 0
+BASE_BLOCK = 64
+
+# The number of samples read at once while building a pyramid (a multiple of BASE_BLOCK)
+CHUNK_SIZE = 1 << 20
+
+
+class EnvelopePyramid:
+    """A multi-resolution min/max/mean summary of a waveform
+
+    Attributes
+    ----------
+    framerate : int
+        The number of samples per second
+    length : int
+        The number of samples summarized
+    base : int
+        The number of samples in each block of level 0
+    t_0 : float
+        The time of the first sample, in seconds
+    levels : list
+        (minimums, maximums, sums) of the blocks of each level. Block j of level k covers the
+        samples [j * base * 2**k, (j + 1) * base * 2**k)
+    nbytes : int
+        The bytes of memory held by the pyramid
+
+    Methods
+    -------
+    range_stats(start, stop)
+        Gets the minimum, maximum and mean voltage of a range of samples
+    time_stats(t_start, t_stop)
+        Gets the voltage statistics and percent flicker of a time range
+    envelope(start=0, stop=None, width=2000)
+        Gets the envelope of a range of samples at about width blocks
+    envelope_data(start=0, stop=None, width=2000)
+        Gets the envelope of a range of samples as [time, volts] points for plotting
+    """
+
+    def __init__(self, levels:list, length:int, framerate:int, base:int=BASE_BLOCK, t_0:float=0.0):
+        """Initializes this EnvelopePyramid. Use build_pyramid() to build one from data
+
+        Parameters
+        ----------
+        levels : list
+            (minimums, maximums, sums) of the blocks of each level
+        length : int
+            The number of samples summarized
+        framerate : int
+            The number of samples per second
+        base : int
+            The number of samples in each block of level 0
+        t_0 : float
+            The time of the first sample, in seconds
+        """
+
+        self.levels = levels
+        self.length = length
+        self.framerate = framerate
+        self.base = base
+        self.t_0 = t_0
+
+
+    def __repr__(self):
+        return 'EnvelopePyramid(length={}, base={}, levels={})'.format(self.length, self.base, len(self.levels))
+
+
+    @property
+    def nbytes(self) -> int:
+        """The bytes of memory held by the pyramid"""
+
+        return sum(a.nbytes for level in self.levels for a in level)
+
+
+    def _blocks(self, start:int, stop:int) -> tuple:
+        """Gets the level 0 blocks covering a range of samples, rounded outward"""
+
+        (start, stop, _) = slice(start, stop).indices(self.length)
+        if stop <= start:
+            raise ValueError('The range of samples is empty')
+        return (start // self.base, -(-stop // self.base))
+
+
+    def range_stats(self, start:int, stop:int) -> tuple:
+        """Gets the minimum, maximum and mean voltage of a range of samples
+
+        The range is covered by at most two blocks per level, so no samples are read
+
+        Parameters
+        ----------
+        start, stop : int
+            The range of samples, as in a slice. Rounded outward to whole blocks
+
+        Returns
+        -------
+        tuple
+            (v_min, v_max, v_mean)
+        """
+
+        (b0, b1) = self._blocks(start, stop)
+        count = min(b1 * self.base, self.length) - b0 * self.base
+
+        (v_min, v_max, total) = (np.inf, -np.inf, 0.0)
+        k = 0
+        while b0 < b1:
+            (mins, maxs, sums) = self.levels[k]
+            take = []
+            if b0 & 1:
+                take.append(b0)
+                b0 += 1
+            if b1 & 1:
+                b1 -= 1
+                take.append(b1)
+            for j in take:
+                v_min = min(v_min, mins[j])
+                v_max = max(v_max, maxs[j])
+                total += sums[j]
+            b0 >>= 1
+            b1 >>= 1
+            k += 1
+
+        return (float(v_min), float(v_max), float(total / count))
+
+
+    def time_stats(self, t_start:float, t_stop:float) -> tuple:
+        """Gets the voltage statistics and percent flicker of a time range
+
+        Parameters
+        ----------
+        t_start, t_stop : float
+            The time range in seconds, from the time of the first sample
+
+        Returns
+        -------
+        tuple
+            (v_min, v_max, v_mean, percent flicker), where the percent flicker is
+            (v_max - v_min) / v_max * 100 as in percent_flicker()
+        """
+
+        start = int(np.floor((t_start - self.t_0) * self.framerate))
+        stop = int(np.ceil((t_stop - self.t_0) * self.framerate)) + 1
+        (v_min, v_max, v_mean) = self.range_stats(max(start, 0), max(min(stop, self.length), 1))
+
+        return (v_min, v_max, v_mean, (v_max - v_min) / v_max * 100)
+
+
+    def envelope(self, start:int=0, stop:int=None, width:int=2000) -> tuple:
+        """Gets the envelope of a range of samples at about width blocks
+
+        The coarsest level with at least width blocks in the range is used (or level 0 for
+        short ranges), so the work is proportional to width rather than to the range
+
+        Parameters
+        ----------
+        start, stop : int or None
+            The range of samples, as in a slice. Rounded outward to whole blocks
+        width : int
+            The minimum number of blocks returned, e.g. the width of the plot in pixels
+
+        Returns
+        -------
+        tuple
+            (the times of the first sample of each block in seconds,
+             the minimum of each block,
+             the maximum of each block,
+             the mean of each block)
+        """
+
+        (b0, b1) = self._blocks(start, stop)
+        k = int(np.floor(np.log2(max((b1 - b0) / max(width, 1), 1))))
+        k = min(k, len(self.levels) - 1)
+
+        size = self.base << k
+        (j0, j1) = (b0 >> k, -(-b1 >> k))
+        (mins, maxs, sums) = self.levels[k]
+
+        first = np.arange(j0, j1) * size
+        counts = np.minimum(first + size, self.length) - first
+
+        return (self.t_0 + first / self.framerate, mins[j0:j1], maxs[j0:j1], sums[j0:j1] / counts)
+
+
+    def envelope_data(self, start:int=0, stop:int=None, width:int=2000) -> np.ndarray:
+        """Gets the envelope of a range of samples as [time, volts] points for plotting
+
+        Each block gives two points, its minimum and its maximum, so a line through the points
+        fills the envelope of the waveform, as a line through every sample would
+
+        Parameters
+        ----------
+        start, stop : int or None
+            The range of samples, as in a slice
+        width : int
+            The minimum number of blocks, e.g. the width of the plot in pixels
+
+        Returns
+        -------
+        ndarray
+            A 2D array in the format [time(seconds), volts], with 2 points per block
+        """
+
+        (times, mins, maxs, _) = self.envelope(start, stop, width)
+        step = (times[1] - times[0]) / 2 if len(times) > 1 else 0.0
+
+        out = np.empty((2 * len(times), 2))
+        out[0::2,0] = times
+        out[1::2,0] = times + step
+        out[0::2,1] = mins
+        out[1::2,1] = maxs
+        return out
+
+
+def _pairs(values:np.ndarray, func) -> np.ndarray:
+    """Combines pairs of adjacent blocks; an odd last block is combined with itself"""
+
+    if len(values) % 2:
+        values = np.append(values, values[-1])
+    return func(values.reshape(-1, 2), axis=1)
+
+
+def build_pyramid(data, framerate:int=None, base:int=BASE_BLOCK) -> EnvelopePyramid:
+    """Builds the envelope pyramid of waveform data
+
+    The data is read CHUNK_SIZE samples at a time, so lazily-read data (e.g. a ScopeCapture or
+    WaveformArchive) is never converted as a whole
+
+    Parameters
+    ----------
+    data : ndarray
+        The waveform data as a 2D array in the format [time(seconds), volts], or an object
+        indexed like one
+    framerate : int or None
+        The frame rate (samples per second). If None, it is computed from the time axis
+    base : int
+        The number of samples in each block of level 0
+
+    Returns
+    -------
+    EnvelopePyramid
+        The pyramid
+    """
+
+    length = len(data)
+    if length < 2:
+        raise ValueError('At least 2 samples are needed to build a pyramid')
+    if framerate is None:
+        framerate = int(round(1/(data[1,0]-data[0,0])))
+
+    chunk_size = max(CHUNK_SIZE // base, 1) * base
+    (mins, maxs, sums) = ([], [], [])
+    for start in range(0, length, chunk_size):
+        volts = np.asarray(data[start:start + chunk_size, 1], dtype=np.float64)
+        n = len(volts) // base * base
+        blocks = volts[:n].reshape(-1, base)
+        mins.append(blocks.min(axis=1))
+        maxs.append(blocks.max(axis=1))
+        sums.append(blocks.sum(axis=1))
+
+        # Only the last chunk can end with a partial block
+        if n < len(volts):
+            tail = volts[n:]
+            mins.append(tail.min(keepdims=True))
+            maxs.append(tail.max(keepdims=True))
+            sums.append(tail.sum(keepdims=True))
+
+    levels = [(np.concatenate(mins), np.concatenate(maxs), np.concatenate(sums))]
+    while len(levels[-1][0]) > 1:
+        (lo, hi, total) = levels[-1]
+        if len(total) % 2:
+            total = np.append(total, 0.0)
+        levels.append((_pairs(lo, np.min), _pairs(hi, np.max), total.reshape(-1, 2).sum(axis=1)))
+
+    return EnvelopePyramid(levels, length, framerate, base, float(data[0,0]))
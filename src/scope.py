@@ -0,0 +1,458 @@
+"""Oscilloscope Export Handling
+
+These functions read the header information written by oscilloscopes at the top of their
+exports, as in CSVs/info.csv:
+
+    Channel:Channel1,
+    Sample Rate:500MSa/s,
+    ...
+    ch1_time(s),ch1_value(V)
+
+Binary exports hold the same header lines, terminated by a 'Data:' line, followed by the raw
+ADC samples (int8 or int16, little-endian). The header may instead be in a separate file,
+e.g. CSVs/info.csv. The samples are memory-mapped and converted to volts only where they are
+accessed, as volts = code * sensitivity / codes per division - offset.
+
+The classes are:
+
+    * ScopeCapture - A memory-mapped binary capture, accessed like a [time, volts] array
+
+The functions are:
+
+    * read_scope_header - Reads the header lines at the top of an oscilloscope export
+    * parse_si - Parses a header value with an SI prefix and unit, e.g. '500MSa/s'
+    * read_scope_binary - Memory-maps a binary oscilloscope export
+    * denoise_capture - Applies the Savitzky-Golay Filter to a capture, in code units
+    * capture_v_stats - Gets the voltage statistics of a capture from its ADC codes
+    * capture_crossings - Finds the samples after which a capture crosses a voltage
+"""
+
+import re
+import numpy as np
+from scipy.signal import savgol_filter
+from . import kernels
+
+
+SI_PREFIXES = {'p': 1e-12, 'n': 1e-9, 'u': 1e-6, '\u00b5': 1e-6, 'm': 1e-3, '': 1.0,
+               'k': 1e3, 'K': 1e3, 'M': 1e6, 'G': 1e9}
+
+# ADC codes per vertical division, if the header does not specify 'Codes Per Div'
+CODES_PER_DIV = {'int8': 25, 'int16': 25 * 256}
+
+# The number of samples processed at once by the chunked functions
+CHUNK_SIZE = 1 << 20
+
+
+def _is_numeric_row(line:str) -> bool:
+    """Whether a line of text is a row of comma-separated numbers"""
+
+    cells = [c for c in line.strip().split(',') if c.strip()]
+    if not cells:
+        return False
+    try:
+        for c in cells:
+            float(c)
+    except ValueError:
+        return False
+    return True
+
+
+def read_scope_header(filename:str) -> tuple:
+    """Reads the header lines at the top of an oscilloscope export
+
+    Header lines have the format 'Key:Value,'. The last non-numeric line before the data,
+    if it has no colon-separated key, is taken to be the column names.
+
+    Parameters
+    ----------
+    filename : str
+        The name of the export file
+
+    Returns
+    -------
+    tuple
+        (header as a dict of {key: value} strings,
+         column names as a list (empty if the file has none),
+         the number of lines before the first row of data)
+    """
+
+    header = {}
+    columns = []
+    skiprows = 0
+
+    with open(filename, 'r', encoding='utf-8-sig') as f:
+        for line in f:
+            if _is_numeric_row(line):
+                break
+
+            skiprows += 1
+            line = line.strip()
+            key, sep, value = line.partition(':')
+            if sep and '(' not in key:
+                header[key.strip()] = value.rstrip(',').strip()
+            elif line:
+                columns = [c.strip() for c in line.split(',') if c.strip()]
+
+    return (header, columns, skiprows)
+
+
+def parse_si(value:str) -> float:
+    """Parses a header value with an SI prefix and unit, e.g. '500MSa/s'
+
+    Parameters
+    ----------
+    value : str
+        The value, e.g. '500MSa/s', '200mV/div', '-1.36V' or '2ns'
+
+    Returns
+    -------
+    float
+        The value in base units, e.g. 5e8, 0.2, -1.36 or 2e-9
+    """
+
+    # A prefix is only a prefix if a unit follows it, e.g. the 'm' of 'mV' but not the 'm' of 'm/s'
+    m = re.match(r'\s*([-+]?(?:\d+\.?\d*|\.\d+)(?:[eE][-+]?\d+)?)\s*(?:([pnu\u00b5mkKMG])(?=[A-Za-z]))?', value)
+    if m is None:
+        raise ValueError('Could not parse ' + repr(value) + ' as a number')
+
+    (number, prefix) = m.groups()
+
+    return float(number) * SI_PREFIXES[prefix or '']
+
+
+class ScopeCapture:
+    """A memory-mapped binary capture, accessed like a [time, volts] array
+
+    Indexing returns float64 arrays, e.g. capture[:,1] or capture[1000:2000,:], but only the
+    requested rows are converted from ADC codes; the time axis is generated from the frame
+    rate. np.asarray(capture) converts the whole capture.
+
+    Attributes
+    ----------
+    codes : ndarray
+        The ADC codes, usually a read-only np.memmap of the file
+    header : dict
+        The header information of the export, e.g. {'Sample Rate': '500MSa/s'}
+    framerate : int
+        The number of samples per second
+    scale : float
+        The volts per ADC code
+    offset : float
+        The volts subtracted after scaling
+    shape : tuple
+        (number of samples, 2)
+    nbytes : int
+        The bytes of memory held by the codes (0 if they are memory-mapped)
+
+    Methods
+    -------
+    to_volts(codes)
+        Converts ADC codes to volts
+    to_codes(volts)
+        Converts volts to (fractional) ADC codes
+    volts(start=None, stop=None)
+        Gets the voltages of a range of samples
+    with_codes(codes)
+        Returns a capture with the same header and scaling but different codes
+    """
+
+    ndim = 2
+    dtype = np.dtype(np.float64)
+
+    def __init__(self, codes:np.ndarray, header:dict, framerate:int, scale:float, offset:float):
+        """Initializes this ScopeCapture
+
+        Parameters
+        ----------
+        codes : ndarray
+            The ADC codes as a 1D array
+        header : dict
+            The header information of the export
+        framerate : int
+            The number of samples per second
+        scale : float
+            The volts per ADC code
+        offset : float
+            The volts subtracted after scaling
+        """
+
+        self.codes = codes
+        self.header = header
+        self.framerate = framerate
+        self.scale = scale
+        self.offset = offset
+        self.shape = (len(codes), 2)
+
+
+    def __len__(self) -> int:
+        return len(self.codes)
+
+
+    @property
+    def nbytes(self) -> int:
+        """The bytes of memory held by the codes (0 if they are memory-mapped)"""
+
+        return 0 if isinstance(self.codes, np.memmap) else self.codes.nbytes
+
+
+    def __array__(self, dtype=None, copy=None):
+        out = self[:,:]
+        return out if dtype is None else out.astype(dtype)
+
+
+    def __getitem__(self, key):
+        if isinstance(key, tuple):
+            (rows, cols) = key
+        else:
+            (rows, cols) = (key, slice(None))
+
+        scalar_row = isinstance(rows, (int, np.integer))
+        if scalar_row:
+            i = range(len(self))[rows]
+            rows = slice(i, i + 1)
+
+        if isinstance(rows, slice):
+            idx = np.arange(*rows.indices(len(self)))
+        else:
+            idx = np.arange(len(self))[rows]
+            rows = idx
+
+        want = range(2)[cols]
+        if isinstance(want, int):
+            want = [want]
+        out = np.empty((len(idx), len(want)))
+
+        for (j, col) in enumerate(want):
+            if col == 0:
+                out[:,j] = idx / self.framerate
+            else:
+                out[:,j] = self.to_volts(np.asarray(self.codes[rows], dtype=np.float64))
+
+        if isinstance(cols, (int, np.integer)):
+            out = out[:,0]
+        if scalar_row:
+            out = out[0]
+        return out
+
+
+    def to_volts(self, codes):
+        """Converts ADC codes to volts
+
+        Parameters
+        ----------
+        codes : ndarray or float
+            The ADC codes
+
+        Returns
+        -------
+        ndarray or float
+            The voltages
+        """
+
+        return codes * self.scale - self.offset
+
+
+    def to_codes(self, volts):
+        """Converts volts to (fractional) ADC codes
+
+        Parameters
+        ----------
+        volts : ndarray or float
+            The voltages
+
+        Returns
+        -------
+        ndarray or float
+            The ADC codes
+        """
+
+        return (volts + self.offset) / self.scale
+
+
+    def volts(self, start:int=None, stop:int=None) -> np.ndarray:
+        """Gets the voltages of a range of samples
+
+        Parameters
+        ----------
+        start, stop : int or None
+            The range of samples, as in a slice
+
+        Returns
+        -------
+        ndarray
+            The voltages as a 1D float64 array
+        """
+
+        return self.to_volts(np.asarray(self.codes[start:stop], dtype=np.float64))
+
+
+    def with_codes(self, codes:np.ndarray):
+        """Returns a capture with the same header and scaling but different codes
+
+        Parameters
+        ----------
+        codes : ndarray
+            The new ADC codes, e.g. after filtering
+
+        Returns
+        -------
+        ScopeCapture
+            The new capture
+        """
+
+        return ScopeCapture(codes, self.header, self.framerate, self.scale, self.offset)
+
+
+def read_scope_binary(filename:str, header=None, dtype:str=None) -> ScopeCapture:
+    """Memory-maps a binary oscilloscope export
+
+    The header needs 'Sample Rate', 'Vertical Sensitivity' and 'Vertical Offset', and may give
+    'Data Type' (int8 or int16, default int8) and 'Codes Per Div' (default 25 for int8 and
+    6400 for int16).
+
+    Parameters
+    ----------
+    filename : str
+        The name of the binary file. If header is None, it starts with the header lines,
+        terminated by a 'Data:' line, followed by the samples. Otherwise it holds only samples
+    header : str or dict or None
+        The header, or the name of a file holding it (e.g. CSVs/info.csv), for exports whose
+        header is not in the binary file
+    dtype : str or None
+        The sample type, 'int8' or 'int16'. Overrides 'Data Type' in the header
+
+    Returns
+    -------
+    ScopeCapture
+        The capture. No samples are read until they are accessed
+    """
+
+    data_offset = 0
+    if header is None:
+        header = {}
+        with open(filename, 'rb') as f:
+            for line in f:
+                data_offset += len(line)
+                text = line.decode('utf-8-sig').strip()
+                key, sep, value = text.partition(':')
+                if key.strip() == 'Data':
+                    break
+                if sep:
+                    header[key.strip()] = value.rstrip(',').strip()
+            else:
+                raise ValueError('No Data: line ends the header of ' + filename)
+    elif isinstance(header, str):
+        header = read_scope_header(header)[0]
+
+    if dtype is None:
+        dtype = header.get('Data Type', 'int8')
+    dtype = np.dtype(dtype).newbyteorder('<')
+    codes_per_div = float(header.get('Codes Per Div', CODES_PER_DIV[dtype.name]))
+
+    codes = np.memmap(filename, dtype=dtype, mode='r', offset=data_offset)
+    framerate = int(round(parse_si(header['Sample Rate'])))
+    scale = parse_si(header['Vertical Sensitivity']) / codes_per_div
+    offset = parse_si(header['Vertical Offset'])
+
+    return ScopeCapture(codes, header, framerate, scale, offset)
+
+
+def denoise_capture(capture:ScopeCapture, window_length:int=901, chunk_size:int=CHUNK_SIZE) -> ScopeCapture:
+    """Applies the Savitzky-Golay Filter to a capture, in code units
+
+    The filter is linear, so filtering the codes and then scaling is the same as scaling and
+    then filtering. The filtered codes are float32, a quarter of the size of a [time, volts]
+    float64 copy. The codes are filtered in chunks of chunk_size samples, each read with
+    window_length // 2 samples either side so the result is the same as filtering the whole
+    capture at once, and only one chunk is converted from the ADC codes at a time.
+
+    Parameters
+    ----------
+    capture : ScopeCapture
+        The capture
+    window_length : int
+        The window length for the filter. Higher equals more smoothing
+    chunk_size : int
+        The number of samples filtered at once
+
+    Returns
+    -------
+    ScopeCapture
+        The capture with noise removed
+    """
+
+    filter_order = 3
+    n = len(capture)
+    if n < window_length:
+        raise ValueError('The capture has ' + str(n) + ' samples, fewer than the window length ' +
+                         str(window_length))
+
+    codes = np.empty(n, dtype=np.float32)
+    half = window_length // 2
+    for start in range(0, n, chunk_size):
+        stop = min(start + chunk_size, n)
+
+        # Read enough samples either side that every sample is filtered with the same window
+        # as when filtering the whole capture
+        lo = max(start - half, 0)
+        hi = min(stop + half, n)
+        if hi - lo < window_length:
+            lo = max(min(lo, n - window_length), 0)
+            hi = min(lo + window_length, n)
+
+        chunk = np.asarray(capture.codes[lo:hi], dtype=np.float32)
+        codes[start:stop] = savgol_filter(chunk, window_length, filter_order)[start - lo:stop - lo]
+
+    return capture.with_codes(codes)
+
+
+def capture_v_stats(capture:ScopeCapture) -> tuple:
+    """Gets the voltage statistics of a capture from its ADC codes
+
+    Parameters
+    ----------
+    capture : ScopeCapture
+        The capture
+
+    Returns
+    -------
+    tuple
+        (v_max, v_min, v_pp, v_avg), where v_avg is the mean of v_max and v_min
+    """
+
+    (v_min, v_max) = sorted(capture.to_volts(float(c)) for c in (capture.codes.min(), capture.codes.max()))
+    v_pp = v_max - v_min
+    v_avg = (v_max + v_min) / 2
+
+    return (v_max, v_min, v_pp, v_avg)
+
+
+def capture_crossings(capture:ScopeCapture, v_avg:float, chunk_size:int=CHUNK_SIZE) -> np.ndarray:
+    """Finds the samples after which a capture crosses a voltage
+
+    The comparison is done on the codes, in chunks of chunk_size samples
+
+    Parameters
+    ----------
+    capture : ScopeCapture
+        The capture
+    v_avg : float
+        The voltage, e.g. the average voltage
+    chunk_size : int
+        The number of samples compared at once
+
+    Returns
+    -------
+    ndarray
+        The indices i at which the sign of (volts - v_avg) differs between i and i+1
+    """
+
+    level = capture.to_codes(v_avg)
+    sign = -1 if capture.scale < 0 else 1
+    out = []
+    for start in range(0, len(capture) - 1, chunk_size):
+        # Overlap the chunks by one sample, to catch crossings between chunks
+        chunk = np.asarray(capture.codes[start:start + chunk_size + 1], dtype=np.float64)
+        out.append(kernels.crossings(sign * chunk, sign * level) + start)
+
+    return np.concatenate(out) if out else np.empty(0, dtype=np.int64)
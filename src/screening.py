@@ -0,0 +1,121 @@
+"""Fast Flicker Screening
+
+Most light sources flicker at twice the mains frequency (100 or 120 Hz) or at a low multiple of
+it. To triage many captures, these functions measure the modulation at a small set of candidate
+frequencies with a bank of single-bin DFTs (the Goertzel bins), computed in one vectorized pass,
+instead of denoising the capture and searching it for crossings and periods.
+
+The screened frequency is the candidate with the largest modulation, and the provisional percent
+flicker assumes a sinusoidal modulation of that amplitude around the mean,
+2A / (mean + A) * 100, which matches percent_flicker() for a sine. Results are provisional: the
+resolution between candidates is about 2 / (capture duration) with the Hann window, and
+non-sinusoidal waveforms (e.g. PWM) differ from the full analysis. Use the full pipeline for
+certification.
+
+The functions are:
+
+    * decimate - Averages blocks of samples to reduce the sample count
+    * modulation_spectrum - Measures the modulation amplitude at each candidate frequency
+    * screen - Estimates the dominant frequency and percent flicker of a waveform
+"""
+
+import numpy as np
+
+
+# Twice the 50 and 60 Hz mains frequencies, and their low multiples
+CANDIDATE_FREQUENCIES = (100, 120, 200, 240, 300, 360, 400, 480)
+
+# The number of samples analyzed; longer captures are decimated
+MAX_SAMPLES = 65536
+
+
+def decimate(volts:np.ndarray, framerate:int, max_samples:int=MAX_SAMPLES) -> tuple:
+    """Averages blocks of samples to reduce the sample count
+
+    Averaging each block of q samples acts as a simple low-pass filter, so flicker frequencies
+    well below the new frame rate are kept.
+
+    Parameters
+    ----------
+    volts : ndarray
+        The voltages as a 1D array
+    framerate : int
+        The frame rate (samples per second)
+    max_samples : int
+        The maximum number of samples to keep
+
+    Returns
+    -------
+    tuple
+        (the decimated voltages, the new frame rate)
+    """
+
+    q = -(-len(volts) // max_samples)
+    if q <= 1:
+        return (volts, framerate)
+
+    n = len(volts) // q * q
+    return (volts[:n].reshape(-1, q).mean(axis=1), framerate / q)
+
+
+def modulation_spectrum(volts:np.ndarray, framerate:int, frequencies=CANDIDATE_FREQUENCIES) -> np.ndarray:
+    """Measures the modulation amplitude at each candidate frequency
+
+    The mean is removed and a Hann window applied, then a single DFT bin is evaluated at every
+    candidate frequency with one matrix product.
+
+    Parameters
+    ----------
+    volts : ndarray
+        The voltages as a 1D array
+    framerate : int
+        The frame rate (samples per second)
+    frequencies : tuple
+        The candidate frequencies, in Hertz
+
+    Returns
+    -------
+    ndarray
+        The amplitude (volts, peak) of the sinusoidal component at each frequency
+    """
+
+    n = len(volts)
+    window = np.hanning(n)
+    x = (volts - volts.mean()) * window
+
+    t = np.arange(n) / framerate
+    bins = np.exp(-2j * np.pi * np.outer(t, np.asarray(frequencies, dtype=np.float64)))
+
+    return 2 * np.abs(x @ bins) / window.sum()
+
+
+def screen(data:np.ndarray, framerate:int, frequencies=CANDIDATE_FREQUENCIES,
+           max_samples:int=MAX_SAMPLES) -> tuple:
+    """Estimates the dominant frequency and percent flicker of a waveform
+
+    Parameters
+    ----------
+    data : ndarray
+        The waveform data as a 2D array
+    framerate : int
+        The frame rate (samples per second)
+    frequencies : tuple
+        The candidate frequencies, in Hertz
+    max_samples : int
+        Captures with more samples are decimated to this many (see decimate())
+
+    Returns
+    -------
+    tuple
+        (the candidate frequency with the largest modulation in Hertz,
+         the provisional percent flicker)
+    """
+
+    (volts, rate) = decimate(np.asarray(data[:,1], dtype=np.float64), framerate, max_samples)
+
+    amplitudes = modulation_spectrum(volts, rate, frequencies)
+    i = int(np.argmax(amplitudes))
+    a = amplitudes[i]
+    mean = volts.mean()
+
+    return (float(frequencies[i]), 2 * a / (mean + a) * 100)
@@ -0,0 +1,509 @@
+"""Shared-Memory Transport for Parallel Imports
+
+A process pool lets several captures be parsed and analyzed at once, but returning each
+capture's data from a worker pickles and copies the whole array through a pipe, which costs
+about as much as the analysis saves. Here the sample arrays travel through named blocks of
+multiprocessing.shared_memory instead:
+
+    * The parent assigns a unique block name to each file and remembers it
+    * The worker parses the file, copies the parsed array into a block of that name, runs the
+      pipeline on a view of the block, and writes the denoised data back into it, so no array
+      is pickled. Only the metrics and other small outputs are returned through the pipe
+    * The parent attaches to the block and unlinks its name at once. The Waveform's data is a
+      view of the block, which stays mapped until the last view of it is dropped (e.g. when
+      the Waveform is deleted or its arrays are evicted by a MemoryBudget), so the data is
+      copied once, in the worker, and never in the parent
+
+The parent owns every name it hands out, so when a worker crashes or the import is stopped,
+each remaining block is unlinked in a finally clause rather than left to the OS. Data that
+is not a NumPy array (e.g. a memory-mapped ScopeCapture) is returned through the pipe.
+
+See waveform.batch_import(workers=...), which uses these functions.
+
+The classes are:
+
+    * SharedArray - A NumPy array in a named block of shared memory
+    * SharedBlocks - The shared memory blocks handed to workers, unlinked deterministically
+
+The functions are:
+
+    * analyze_shared - Imports and analyzes one file in a worker process
+    * analyze_in_processes - Analyzes files on a process pool, passing their data through shared memory
+"""
+
+import os
+import uuid
+import signal
+import multiprocessing
+import numpy as np
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, TimeoutError as FutureTimeout
+from multiprocessing import shared_memory, resource_tracker
+from . import kernels
+from .pipeline import StageError
+from .batch import ImportTimeout
+
+
+class SharedArray:
+    """A NumPy array in a named block of shared memory
+
+    Use as a context manager, or call close(), before dropping it: the array must not be used
+    after close()
+
+    Attributes
+    ----------
+    name : str
+        The name of the block
+    array : ndarray
+        The array, a view of the block
+
+    Methods
+    -------
+    create(name, shape, dtype, track=True)
+        Creates a block holding an array
+    attach(name, shape, dtype)
+        Attaches to an existing block
+    close()
+        Closes this process's view of the block
+    unlink()
+        Removes the block; it is freed once every process has closed it
+    """
+
+    def __init__(self, shm, shape:tuple, dtype):
+        """Initializes this SharedArray. Use create() or attach()"""
+
+        self._shm = shm
+        self.name = shm.name
+        self.array = np.ndarray(shape, dtype=dtype, buffer=shm.buf)
+
+
+    @classmethod
+    def create(cls, name:str, shape:tuple, dtype, track:bool=True):
+        """Creates a block holding an array
+
+        Parameters
+        ----------
+        name : str
+            The name of the new block
+        shape : tuple
+            The shape of the array
+        dtype : dtype
+            The data type of the array
+        track : bool
+            If False, the block is not registered with this process's resource tracker, so
+            it is not unlinked (with a leak warning) when the process exits. Use when another
+            process owns the block and unlinks it
+
+        Returns
+        -------
+        SharedArray
+            The array, uninitialized
+        """
+
+        size = max(int(np.prod(shape)) * np.dtype(dtype).itemsize, 1)
+        shm = shared_memory.SharedMemory(name=name, create=True, size=size)
+        if not track and os.name == 'posix':
+            resource_tracker.unregister(shm._name, 'shared_memory')
+        return cls(shm, shape, dtype)
+
+
+    @classmethod
+    def attach(cls, name:str, shape:tuple, dtype):
+        """Attaches to an existing block
+
+        Parameters
+        ----------
+        name : str
+            The name of the block
+        shape : tuple
+            The shape of the array
+        dtype : dtype
+            The data type of the array
+
+        Returns
+        -------
+        SharedArray
+            The array
+        """
+
+        return cls(shared_memory.SharedMemory(name=name), shape, dtype)
+
+
+    def __enter__(self):
+        return self
+
+
+    def __exit__(self, *exc):
+        self.close()
+        return False
+
+
+    def close(self):
+        """Closes this process's view of the block"""
+
+        self.array = None
+        self._shm.close()
+
+
+    def unlink(self):
+        """Removes the block; it is freed once every process has closed it"""
+
+        self._shm.unlink()
+
+
+class _MappedBlock:
+    """Keeps a block mapped for as long as an array made from it (with np.asarray) is used
+
+    NumPy keeps the object an array was made from as its base, so the block is closed when the
+    last view of the array is dropped"""
+
+    def __init__(self, shm, shape:tuple, dtype):
+        self._shm = shm
+        self._array = np.ndarray(shape, dtype=dtype, buffer=shm.buf)
+        self.__array_interface__ = self._array.__array_interface__
+
+
+    def __del__(self):
+        # The view must be dropped before the block can be closed
+        self._array = None
+        self._shm.close()
+
+
+class SharedBlocks:
+    """The shared memory blocks handed to workers, unlinked deterministically
+
+    Every name given out is remembered until it is released. close() (or leaving the with
+    block) unlinks every block that has not been released, whether or not a worker created it
+
+    Attributes
+    ----------
+    names : set
+        The names given out and not yet released
+
+    Methods
+    -------
+    new_name()
+        Returns a unique block name, owned by this SharedBlocks
+    take(name, shape, dtype)
+        Returns the array in a block, without copying it, and releases the block's name
+    release(name)
+        Unlinks a block, if it exists
+    close()
+        Releases every remaining block
+    """
+
+    def __init__(self):
+        """Initializes this SharedBlocks"""
+
+        self.names = set()
+        self._prefix = 'bfw' + str(os.getpid()) + '_'
+
+
+    def __enter__(self):
+        return self
+
+
+    def __exit__(self, *exc):
+        self.close()
+        return False
+
+
+    def new_name(self) -> str:
+        """Returns a unique block name, owned by this SharedBlocks
+
+        Returns
+        -------
+        str
+            The name (short enough for every platform's limit)
+        """
+
+        name = self._prefix + uuid.uuid4().hex[:12]
+        self.names.add(name)
+        return name
+
+
+    def take(self, name:str, shape:tuple, dtype) -> np.ndarray:
+        """Returns the array in a block, without copying it, and releases the block's name
+
+        The block is unlinked at once, so it is not leaked if this process crashes, but its
+        memory stays mapped until the returned array and every view of it are dropped
+
+        Parameters
+        ----------
+        name : str
+            The name of the block
+        shape : tuple
+            The shape of the array
+        dtype : dtype
+            The data type of the array
+
+        Returns
+        -------
+        ndarray
+            The array, a view of the block
+        """
+
+        try:
+            shm = shared_memory.SharedMemory(name=name)
+        finally:
+            self.names.discard(name)
+        try:
+            shm.unlink()
+        except FileNotFoundError:
+            pass
+        return np.asarray(_MappedBlock(shm, shape, dtype))
+
+
+    def release(self, name:str):
+        """Unlinks a block, if it exists
+
+        Parameters
+        ----------
+        name : str
+            The name of the block
+        """
+
+        self.names.discard(name)
+        try:
+            shm = shared_memory.SharedMemory(name=name)
+        except FileNotFoundError:
+            return
+        shm.close()
+        shm.unlink()
+
+
+    def close(self):
+        """Releases every remaining block"""
+
+        for name in list(self.names):
+            try:
+                self.release(name)
+            except OSError:
+                pass
+
+
+def analyze_shared(filename:str, pipeline, block:str) -> tuple:
+    """Imports and analyzes one file in a worker process
+
+    The imported data is copied into a new shared memory block named block, the pipeline runs
+    on a view of the block, and the final data is written back into it
+
+    Parameters
+    ----------
+    filename : str
+        The file to import
+    pipeline : Pipeline
+        The analysis pipeline, which must have an import stage
+    block : str
+        The name of the shared memory block to create for the data
+
+    Returns
+    -------
+    tuple
+        (the (shape, dtype) of the data in the block, or None if there is no block,
+         the final value of every output of the pipeline except the data in the block,
+         the name of the stage that failed, or None,
+         the error raised by that stage, or None)
+    """
+
+    values = {'filename': filename}
+    try:
+        data = pipeline.get_stage('import').run(values)['data']
+    except Exception as e:
+        return (None, None, 'import', e)
+
+    # Data that is not an array is returned through the pipe
+    if not isinstance(data, np.ndarray):
+        try:
+            return (None, pipeline.run(values, cache=_imported(pipeline, values, data)), None, None)
+        except StageError as e:
+            return (None, None, e.stage, e.error)
+
+    # The parent owns the block and unlinks it
+    shared = SharedArray.create(block, data.shape, data.dtype, track=False)
+    try:
+        shared.array[...] = data
+        del data
+        try:
+            out = pipeline.run(values, cache=_imported(pipeline, values, shared.array))
+        except StageError as e:
+            return (None, None, e.stage, e.error.with_traceback(None))
+
+        # Write the final data (e.g. denoised) back into the block
+        final = out.pop('data')
+        layout = (shared.array.shape, shared.array.dtype.str)
+        if final is not shared.array:
+            if final.shape != shared.array.shape or final.dtype != shared.array.dtype:
+                out['data'] = final
+                layout = None
+            else:
+                shared.array[...] = final
+        del final
+
+        # Outputs that are views of the block (e.g. one period) are copied, as the block is
+        # closed before they are sent
+        return (layout, _detach(out, shared.array), None, None)
+    finally:
+        shared.close()
+
+
+def _detach(value, base:np.ndarray):
+    """Copies the arrays in a value (or in a dict, list or tuple of values) that share memory with base"""
+
+    if isinstance(value, np.ndarray):
+        return value.copy() if np.may_share_memory(value, base) else value
+    if isinstance(value, dict):
+        return {k: _detach(v, base) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return type(value)(_detach(v, base) for v in value)
+    return value
+
+
+def _imported(pipeline, values:dict, data) -> dict:
+    """Returns a pipeline cache in which the import stage has already run"""
+
+    cache = {}
+    pipeline.preload(cache, values, 'import', {'data': data})
+    return cache
+
+
+def _final_stages(pipeline, values:dict) -> dict:
+    """Groups the final values of a pipeline by the stage that produced them"""
+
+    producers = {}
+    for s in pipeline:
+        for o in s.outputs:
+            producers[o] = s.name
+
+    stages = {}
+    for s in pipeline:
+        if s.outputs and all(producers[o] == s.name and o in values for o in s.outputs):
+            stages[s.name] = {o: values[o] for o in s.outputs}
+    return stages
+
+
+def _register_worker(pids):
+    """Reports the process ID of a new pool worker to the parent, so it can be terminated, and
+    loads the kernels before the worker's first capture (see kernels.warm_up)"""
+
+    pids.put(os.getpid())
+    kernels.warm_up()
+
+
+def _new_pool(workers:int) -> tuple:
+    """Starts a process pool whose workers report their process IDs
+
+    Returns
+    -------
+    tuple
+        (the ProcessPoolExecutor, the queue of the process IDs of its workers)
+    """
+
+    pids = multiprocessing.SimpleQueue()
+    executor = ProcessPoolExecutor(max_workers=workers, initializer=_register_worker, initargs=(pids,))
+    return (executor, pids)
+
+
+def _terminate(executor:ProcessPoolExecutor, pids):
+    """Kills the worker processes of a pool and shuts it down
+
+    ProcessPoolExecutor cannot stop a running task, and multiprocessing.Pool, which can, never
+    completes the tasks of a worker that crashed. So the workers report their process IDs when
+    they start (see _new_pool), and are killed by ID
+    """
+
+    while not pids.empty():
+        try:
+            os.kill(pids.get(), signal.SIGTERM)
+        except OSError:
+            pass
+    executor.shutdown(wait=True, cancel_futures=True)
+    pids.close()
+
+
+def analyze_in_processes(paths, pipeline, workers:int=None, depth:int=None, timeout:float=None):
+    """Analyzes files on a process pool, passing their data through shared memory
+
+    Parameters
+    ----------
+    paths : iterable
+        The file paths
+    pipeline : Pipeline
+        The analysis pipeline, which must have an import stage. Its stage functions must be
+        importable by the workers (module-level functions)
+    workers : int or None
+        The number of worker processes. If None, the number of CPUs
+    depth : int or None
+        The maximum number of files submitted ahead of the consumer. If None, 2 * workers
+    timeout : float or None
+        If specified, a file whose result is not ready this many seconds after the previous
+        file's result is given up on. Its worker cannot be stopped on its own, so the worker
+        processes are terminated, and the other files in progress are resubmitted to a new pool
+
+    Yields
+    ------
+    tuple
+        (path, {stage name: outputs}, error) for each file, in order, as for
+        stacked.stacked_outputs: the outputs of every stage that produced a final value, or
+        a StageError. The stage of the error is 'timeout' if the file was given up on, and
+        'worker' if the worker process failed, e.g. crashed, in which case the files it had
+        not finished fail too
+    """
+
+    if 'import' not in pipeline:
+        raise ValueError('Parallel imports need a pipeline with an import stage')
+    workers = workers or os.cpu_count() or 1
+    depth = depth or 2 * workers
+    paths = iter(paths)
+    retry = deque()
+    pending = deque()
+    (executor, pids) = _new_pool(workers)
+
+    def fill():
+        while len(pending) < depth:
+            p = retry.popleft() if retry else next(paths, None)
+            if p is None:
+                return
+            block = blocks.new_name()
+            try:
+                future = executor.submit(analyze_shared, p, pipeline, block)
+            except Exception as e:
+                future = e
+            pending.append((p, block, future))
+
+    with SharedBlocks() as blocks:
+        try:
+            fill()
+            while pending:
+                (p, block, future) = pending.popleft()
+                try:
+                    if isinstance(future, Exception):
+                        raise future
+                    (layout, out, stage, error) = future.result(timeout)
+                    if layout is not None:
+                        out['data'] = blocks.take(block, *layout)
+                except FutureTimeout:
+                    (out, stage, error) = (None, 'timeout', ImportTimeout('Timed out after ' + str(timeout) + ' s'))
+                    # Stop the stuck worker, and start the files in progress again on a new pool
+                    _terminate(executor, pids)
+                    for (q, q_block, _) in pending:
+                        blocks.release(q_block)
+                        retry.append(q)
+                    pending.clear()
+                    (executor, pids) = _new_pool(workers)
+                except Exception as e:
+                    (out, stage, error) = (None, 'worker', e)
+                finally:
+                    blocks.release(block)
+
+                fill()
+                if error is not None:
+                    yield (p, None, StageError(stage, p, error))
+                else:
+                    yield (p, _final_stages(pipeline, dict(out, filename=p)), None)
+        finally:
+            for (_, _, future) in pending:
+                if not isinstance(future, Exception):
+                    future.cancel()
+            executor.shutdown(wait=True, cancel_futures=True)
+            pids.close()
@@ -0,0 +1,140 @@
+"""Waveform Shape Similarity
+
+Lamps with the same driver have the same period shape, whatever their brightness. A shape
+fingerprint summarizes one period as the low harmonics of its Fourier series, normalized so
+that waveforms with the same shape have the same fingerprint:
+
+    * Offset and amplitude: the mean is dropped and the harmonics are scaled to unit norm
+    * Phase: the harmonics are rotated so the fundamental has zero phase, so the fingerprint
+      does not depend on where in the cycle the period starts
+    * Length: the period is resampled to RESAMPLE_LENGTH points, so the fingerprint does not
+      depend on the frame rate or frequency
+
+The distance between two fingerprints is the RMS difference between the normalized shapes,
+band-limited to HARMONICS harmonics (by Parseval's theorem), from 0 for identical shapes to 2.
+The fingerprints are short (2 * HARMONICS - 1 values), so a KD-tree finds the nearest
+neighbours among hundreds of thousands of waveforms in milliseconds.
+
+The classes are:
+
+    * FingerprintIndex - A nearest-neighbour index of shape fingerprints
+
+The functions are:
+
+    * shape_fingerprint - Computes the shape fingerprint of one period of a waveform
+"""
+
+import numpy as np
+from scipy.spatial import cKDTree
+
+
+# The number of harmonics in a fingerprint
+HARMONICS = 8
+
+# The number of points each period is resampled to
+RESAMPLE_LENGTH = 256
+
+
+def shape_fingerprint(one_period:np.ndarray, harmonics:int=HARMONICS) -> np.ndarray:
+    """Computes the shape fingerprint of one period of a waveform
+
+    Parameters
+    ----------
+    one_period : ndarray
+        One period of the waveform as a 2D array in the format [time(seconds), volts]
+    harmonics : int
+        The number of harmonics kept
+
+    Returns
+    -------
+    ndarray
+        The real parts of harmonics 1 to harmonics, then the imaginary parts of harmonics 2 to
+        harmonics (the fundamental is real after phase alignment). All zeros if the period is
+        flat
+    """
+
+    volts = np.asarray(one_period[:,1], dtype=np.float64)
+    n = len(volts)
+    if n < 2:
+        raise ValueError('At least 2 samples are needed for a fingerprint')
+
+    # Resample the period to a fixed length
+    length = max(RESAMPLE_LENGTH, 2 * harmonics + 2)
+    resampled = np.interp(np.arange(length) * n / length, np.arange(n), volts)
+    coeffs = np.fft.rfft(resampled)[1:harmonics + 1]
+
+    norm = np.linalg.norm(coeffs)
+    if norm == 0:
+        return np.zeros(2 * harmonics - 1)
+
+    # Rotate harmonic h by h times the phase of the fundamental, then normalize the amplitude
+    h = np.arange(1, harmonics + 1)
+    coeffs = coeffs * np.exp(-1j * h * np.angle(coeffs[0])) / norm
+
+    return np.concatenate([coeffs.real, coeffs[1:].imag])
+
+
+class FingerprintIndex:
+    """A nearest-neighbour index of shape fingerprints
+
+    Attributes
+    ----------
+    names : list
+        The name of each fingerprint
+    fingerprints : ndarray
+        The fingerprints, one per row
+
+    Methods
+    -------
+    query(fingerprint, k=5, exclude=None)
+        Finds the names of the k fingerprints nearest to a fingerprint
+    """
+
+    def __init__(self, names:list, fingerprints):
+        """Initializes this FingerprintIndex, building its KD-tree
+
+        Parameters
+        ----------
+        names : list
+            The name of each fingerprint
+        fingerprints : list or ndarray
+            The fingerprints (see shape_fingerprint), in the same order as names
+        """
+
+        self.names = list(names)
+        self.fingerprints = np.asarray(fingerprints, dtype=np.float64).reshape(len(self.names), -1) \
+            if len(self.names) else np.empty((0, 2 * HARMONICS - 1))
+        self._tree = cKDTree(self.fingerprints) if len(self.names) else None
+
+
+    def __len__(self) -> int:
+        return len(self.names)
+
+
+    def query(self, fingerprint:np.ndarray, k:int=5, exclude:str=None) -> list:
+        """Finds the names of the k fingerprints nearest to a fingerprint
+
+        Parameters
+        ----------
+        fingerprint : ndarray
+            The fingerprint to search for
+        k : int
+            The number of neighbours
+        exclude : str or None
+            A name left out of the results, e.g. the name of the waveform searched for
+
+        Returns
+        -------
+        list
+            (name, distance) of the nearest fingerprints, nearest first
+        """
+
+        if self._tree is None or k <= 0:
+            return []
+
+        n = min(k + (exclude is not None), len(self.names))
+        (distances, idx) = self._tree.query(np.asarray(fingerprint, dtype=np.float64), k=n)
+        (distances, idx) = (np.atleast_1d(distances), np.atleast_1d(idx))
+
+        out = [(self.names[i], float(d)) for (d, i) in zip(distances, idx) if self.names[i] != exclude]
+        return out[:k]
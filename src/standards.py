@@ -7,8 +7,16 @@ The functions are:
     * ieee_1789_2015 - Tests for compliance with IEEE 1789-2015
     * california_ja8_2019 - Tests for compliance with California JA8 2019
     * well_building_standard_v2 - Tests for compliance with the WELL Building Standard flicker requirement
+    * evaluate_standards - Tests for compliance with all of the above standards
+    * verdicts_constant - Whether every standard gives the same result over a range of parameters
 """
 
+import numpy as np
+
+
+# The frequencies (in Hertz) at which the rules of the standards change
+FREQUENCY_BREAKPOINTS = (90, 200, 1250, 3000)
+
 def ieee_1789_2015(frequency:float, percent_flicker:float) -> str:
     """Tests for compliance with IEEE 1789-2015
 
@@ -116,3 +124,61 @@ def well_building_standard_v2(frequency:float, percent_flicker:float) -> bool:
     else:
         # Fails
         return False
+
+
+def evaluate_standards(frequency:float, percent_flicker:float) -> tuple:
+    """Tests for compliance with all of the above standards
+
+    Parameters
+    ----------
+    frequency : float
+        The flicker frequency in Hertz
+    percent_flicker : float
+        The flicker percentage
+
+    Returns
+    -------
+    tuple
+        (IEEE 1789-2015 result, WELL v2 result, California JA8 2019 result)
+    """
+
+    return (ieee_1789_2015(frequency, percent_flicker),
+            well_building_standard_v2(frequency, percent_flicker),
+            california_ja8_2019(frequency, percent_flicker))
+
+
+def verdicts_constant(frequency_range:tuple, percent_flicker_range:tuple) -> bool:
+    """Whether every standard gives the same result over a range of parameters
+
+    From 90 Hz up, between the frequency breakpoints, every threshold is of the form
+    percent_flicker < c * frequency (or a constant), so the results are monotonic in both
+    parameters and only need to be evaluated at the corners of each segment of the range, on and
+    either side of each breakpoint. Below 90 Hz, IEEE 1789-2015 is not monotonic in percent
+    flicker (No Risk, Low Risk, No Risk again from 2.5% to 3.33% per 100 Hz, then Low Risk), so a
+    verdict can change inside the range where no corner shows it. A range that includes
+    frequencies below 90 Hz is never considered constant.
+
+    Parameters
+    ----------
+    frequency_range : tuple
+        The (lowest, highest) possible flicker frequency in Hertz
+    percent_flicker_range : tuple
+        The (lowest, highest) possible flicker percentage
+
+    Returns
+    -------
+    bool
+        True if evaluate_standards() gives the same results everywhere in the range
+    """
+
+    (f_lo, f_hi) = frequency_range
+    if f_lo < FREQUENCY_BREAKPOINTS[0]:
+        return False
+
+    frequencies = [f_lo, f_hi]
+    for b in FREQUENCY_BREAKPOINTS:
+        if f_lo <= b <= f_hi:
+            frequencies += [f for f in (np.nextafter(b, -np.inf), b, np.nextafter(b, np.inf)) if f_lo <= f <= f_hi]
+
+    results = set(evaluate_standards(f, pf) for f in frequencies for pf in percent_flicker_range)
+    return len(results) == 1
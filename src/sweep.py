@@ -0,0 +1,341 @@
+"""Dimming Sweeps
+
+The WELL Building Standard flicker requirement applies at all 10% light output intervals from
+10% to 100%. The DimmingSweep class analyzes the captures of one product at each dim level
+in parallel, on worker processes if requested, and reports the results per level along with
+an aggregate verdict.
+
+The classes are:
+
+    * DimmingSweep - A class used to analyze one product across dim levels
+
+The functions are:
+
+    * parse_level - Gets the dim level (in percent) from a filename
+"""
+
+import re
+from os import path as os_path
+from concurrent.futures import ThreadPoolExecutor
+from .waveform import Waveform, FULL_PIPELINE, get_files_in_directory
+from .shared import analyze_in_processes
+from .batch import run_with_timeout
+from .utils import bool_to_pass_fail
+
+
+SWEEP_LEVELS = tuple(range(10, 101, 10))
+
+IEEE_1789_ORDER = ("No Risk", "Low Risk", "High Risk")
+
+# A dim level in a filename: a number followed by a percent sign or 'pct' / 'percent'
+LEVEL_PATTERN = re.compile(r'(?<!\d)(\d+)\s*(?:%|pct|percent)', flags=re.IGNORECASE)
+
+
+def parse_level(filename:str) -> int:
+    """Gets the dim level (in percent) from a filename
+
+    The level is a number followed by '%', 'pct' or 'percent', e.g. 'Lamp_50pct.csv',
+    'Lamp 50%.csv' or 'lamp2_50pct_run3.csv', or the whole name if it is a number, e.g. '50.csv'.
+    Other numbers in the name are ignored
+
+    Parameters
+    ----------
+    filename : str
+        The filename or path
+
+    Returns
+    -------
+    int
+        The dim level
+
+    Raises
+    ------
+    ValueError
+        If the name has no level, or several different levels
+    """
+
+    name = os_path.splitext(os_path.basename(filename))[0]
+    if name.strip().isdigit():
+        return int(name)
+
+    levels = set(int(n) for n in LEVEL_PATTERN.findall(name))
+    if len(levels) != 1:
+        raise ValueError(('No dim level' if not levels else 'Several dim levels') + ' in ' +
+                         repr(filename) + ', e.g. name it Lamp_50pct.csv')
+    return levels.pop()
+
+
+class DimmingSweep:
+    """A class used to analyze one product across dim levels
+
+    Attributes
+    ----------
+    name : str
+        The name of the product
+    waveforms : dict
+        The Waveform of each dim level that was analyzed successfully, as {level: Waveform}
+    errors : dict
+        The error raised by each dim level that could not be analyzed, as {level: Exception}
+
+    Methods
+    -------
+    get_levels()
+        Returns the dim levels in this sweep, in ascending order
+    get_missing_levels()
+        Returns the required 10% intervals that have no capture
+    get(level)
+        Returns the Waveform of a dim level
+    table(rounded=True)
+        Returns the results of every dim level
+    aggregate()
+        Returns the aggregate results across the sweep
+    summary()
+        Returns a text summary of the sweep
+    """
+
+    def __init__(self, captures:dict, name:str, remove_noise:bool=True, pipeline=None,
+                 profiler=None, workers:int=None, timeout:float=None):
+        """Initializes this DimmingSweep and analyzes every dim level in parallel
+
+        Parameters
+        ----------
+        captures : dict
+            The CSV file of each dim level, as {level (percent): filename}.
+            A file used for several levels is only parsed and analyzed once
+        name : str
+            The name of the product
+        remove_noise : bool
+            If True (default), data will be automatically denoised
+        pipeline : Pipeline or None
+            The analysis pipeline to run on each capture. If None, FULL_PIPELINE is used
+        profiler : Profiler or None
+            If specified, the time and memory used by each step will be recorded by this Profiler
+        workers : int or None
+            If specified, the number of worker processes analyzing captures at once, which pass
+            the data back through shared memory (see shared.analyze_in_processes). The stage
+            functions of the pipeline must then be module-level functions, and the profiler
+            does not record the stages run by the workers. If None, the captures are analyzed
+            on a thread pool in this process: the analysis is mostly Python and NumPy code
+            holding the GIL, so the threads overlap reading the files but little else
+        timeout : float or None
+            If specified, captures that take longer than this many seconds to analyze are
+            recorded in errors. With workers, their worker process is terminated; otherwise
+            the thread is abandoned (see batch.run_with_timeout)
+        """
+
+        self.name = name
+        self.waveforms = {}
+        self.errors = {}
+
+        if pipeline is None:
+            pipeline = FULL_PIPELINE
+        if not remove_noise:
+            pipeline = pipeline.without('denoise')
+
+        # Analyze each distinct file once, named after its lowest level
+        names = {}
+        for level, filename in sorted(captures.items()):
+            names.setdefault(filename, name + ' ' + str(level) + '%')
+
+        results = {}
+        if workers is not None and 'import' in pipeline:
+            for (p, preloaded, error) in analyze_in_processes(list(names), pipeline, workers, timeout=timeout):
+                try:
+                    if error is not None:
+                        raise error
+                    cache = {}
+                    for (stage, outputs) in preloaded.items():
+                        pipeline.preload(cache, {'filename': p}, stage, outputs)
+                    results[p] = Waveform.from_inputs({'filename': p}, names[p], filename=p,
+                                                      profiler=profiler, pipeline=pipeline, cache=cache)
+                except Exception as e:
+                    results[p] = e
+        else:
+            def analyze(filename):
+                return run_with_timeout(Waveform.from_inputs, timeout, {'filename': filename}, names[filename],
+                                        filename=filename, profiler=profiler, pipeline=pipeline)
+
+            with ThreadPoolExecutor(max_workers=workers) as executor:
+                futures = {f: executor.submit(analyze, f) for f in names}
+            for (f, future) in futures.items():
+                try:
+                    results[f] = future.result()
+                except Exception as e:
+                    results[f] = e
+
+        for level, filename in sorted(captures.items()):
+            if isinstance(results[filename], Exception):
+                self.errors[level] = results[filename]
+            else:
+                self.waveforms[level] = results[filename]
+
+
+    @classmethod
+    def from_directory(cls, dir:str, name:str=None, **kwargs):
+        """Creates a DimmingSweep from a directory with one capture per dim level
+
+        The level of each file is parsed from its name with parse_level(), so every file in
+        the directory must be named after its level
+
+        Parameters
+        ----------
+        dir : str
+            The path to the directory
+        name : str or None
+            The name of the product. If None, the name of the directory is used
+        **kwargs
+            Passed to the DimmingSweep constructor
+
+        Returns
+        -------
+        DimmingSweep
+            The analyzed sweep
+
+        Raises
+        ------
+        ValueError
+            If a file name has no dim level, or two files have the same level
+        """
+
+        (_, paths) = get_files_in_directory(dir)
+        captures = {}
+        for p in paths:
+            level = parse_level(p)
+            if level in captures:
+                raise ValueError('Both ' + repr(captures[level]) + ' and ' + repr(p) + ' are at ' +
+                                 str(level) + '%')
+            captures[level] = p
+
+        if name is None:
+            name = os_path.basename(os_path.normpath(dir))
+
+        return cls(captures, name, **kwargs)
+
+
+    def get_levels(self) -> list:
+        """Returns the dim levels in this sweep, in ascending order
+
+        Returns
+        -------
+        list
+            The dim levels (in percent), including levels that could not be analyzed
+        """
+
+        return sorted(set(self.waveforms) | set(self.errors))
+
+
+    def get_missing_levels(self) -> list:
+        """Returns the required 10% intervals that have no capture
+
+        Returns
+        -------
+        list
+            The levels from 10% to 100% in 10% steps that are not in this sweep
+        """
+
+        return [l for l in SWEEP_LEVELS if l not in self.get_levels()]
+
+
+    def get(self, level:int) -> Waveform:
+        """Returns the Waveform of a dim level
+
+        Parameters
+        ----------
+        level : int
+            The dim level (in percent)
+
+        Returns
+        -------
+        Waveform
+            The Waveform object
+        """
+
+        return self.waveforms[level]
+
+
+    def table(self, rounded:bool=True) -> list:
+        """Returns the results of every dim level
+
+        Parameters
+        ----------
+        rounded : bool
+            If True (default), will round the output values
+
+        Returns
+        -------
+        list
+            One dict per dim level, in ascending order, with the level and the verbose
+            summary of the waveform (see Waveform.summary). Levels that could not be
+            analyzed have an 'error' entry instead
+        """
+
+        out = []
+        for level in self.get_levels():
+            if level in self.waveforms:
+                row = {'level': level}
+                row.update(self.waveforms[level].summary(verbose=True, format='Dict', rounded=rounded))
+            else:
+                row = {'level': level, 'name': self.name, 'error': str(self.errors[level])}
+            out.append(row)
+
+        return out
+
+
+    def aggregate(self) -> dict:
+        """Returns the aggregate results across the sweep
+
+        A sweep passes a standard only if every dim level passes it. For IEEE 1789-2015 the
+        worst risk level of any dim level is reported. The WELL requirement also needs a
+        capture at every 10% interval from 10% to 100%.
+
+        Returns
+        -------
+        dict
+            The name, number of levels, missing levels, failed analyses and aggregate verdicts
+        """
+
+        waveforms = self.waveforms.values()
+        ok = len(self.errors) == 0 and len(self.waveforms) > 0
+
+        out = {}
+        out['name'] = self.name
+        out['levels'] = len(self.get_levels())
+        out['missing levels'] = self.get_missing_levels()
+        out['failed levels'] = sorted(self.errors)
+
+        if ok:
+            out['IEEE 1789-2015'] = max((w.get_ieee_1789_2015() for w in waveforms), key=IEEE_1789_ORDER.index)
+        else:
+            out['IEEE 1789-2015'] = "High Risk"
+        out['WELL v2 L7'] = ok and not out['missing levels'] and all(w.get_well_standard_v2() for w in waveforms)
+        out['California JA8 2019'] = ok and all(w.get_california_ja8_2019() for w in waveforms)
+
+        return out
+
+
+    def summary(self) -> str:
+        """Returns a text summary of the sweep
+
+        Returns
+        -------
+        str
+            One line per dim level, followed by the aggregate verdicts
+        """
+
+        out = self.name
+        for row in self.table():
+            if 'error' in row:
+                out += "\n{:>4}%: ERROR {}".format(row['level'], row['error'])
+            else:
+                out += "\n{:>4}%: {} Hz, {}% flicker, IEEE {}, WELL {}, JA8 {}".format(
+                    row['level'], row['frequency'], row['percent flicker'], row['IEEE 1789-2015'],
+                    bool_to_pass_fail(row['WELL v2 L7']), bool_to_pass_fail(row['California JA8 2019']))
+
+        agg = self.aggregate()
+        if agg['missing levels']:
+            out += "\nMissing levels: " + ', '.join(str(l) + '%' for l in agg['missing levels'])
+        out += "\nIEEE 1789-2015: " + agg['IEEE 1789-2015'] + \
+            "\nWELL v2 L7: " + bool_to_pass_fail(agg['WELL v2 L7']) + \
+            "\nCalifornia JA8 2019: " + bool_to_pass_fail(agg['California JA8 2019'])
+
+        return out
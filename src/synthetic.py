@@ -0,0 +1,362 @@
+"""Synthetic Flicker Waveforms
+
+These functions generate flicker waveforms with a known ground truth, for load and accuracy
+testing. Captures can be generated in memory, or written to disk in chunks so that captures
+much larger than the available memory can be produced.
+
+All generated data is in the format [time(seconds), volts], the same format returned by
+waveform.import_waveform_csv(). CSV files are written without header information, so they
+can be imported directly with the Waveform class.
+
+The shapes are:
+
+    * sine - A sinusoidal ripple around an average level
+    * rectified - A full-wave rectified mains waveform
+    * pwm - A pulse-width modulated square wave
+    * harmonics - A fundamental plus any number of harmonics
+
+The functions are:
+
+    * sine_ripple - Generates a sinusoidal ripple
+    * rectified_mains - Generates a full-wave rectified mains waveform
+    * pwm - Generates a pulse-width modulated square wave
+    * harmonics - Generates a fundamental frequency plus harmonics
+    * generate - Generates a synthetic waveform in memory
+    * generate_chunks - Generates a synthetic waveform as a sequence of chunks
+    * write_csv - Writes a synthetic waveform to a CSV file, one chunk at a time
+    * write_npy - Writes a synthetic waveform to a binary .npy file, one chunk at a time
+    * ground_truth - Computes the exact flicker parameters of a noiseless synthetic waveform
+"""
+
+import inspect
+import numpy as np
+
+
+def sine_ripple(t:np.ndarray, frequency:float=120.0, v_avg:float=1.0, modulation:float=0.1,
+                phase:float=0.0) -> np.ndarray:
+    """Generates a sinusoidal ripple
+
+    Parameters
+    ----------
+    t : ndarray
+        The sample times, in seconds
+    frequency : float
+        The ripple frequency in Hertz
+    v_avg : float
+        The average voltage
+    modulation : float
+        The ripple amplitude as a fraction of v_avg, e.g. 0.1 for +/- 10%
+    phase : float
+        The phase offset, in radians
+
+    Returns
+    -------
+    ndarray
+        The voltage at each sample time
+    """
+
+    return v_avg * (1 + modulation * np.sin(2 * np.pi * frequency * t + phase))
+
+
+def rectified_mains(t:np.ndarray, frequency:float=120.0, v_max:float=1.0, v_min:float=0.0) -> np.ndarray:
+    """Generates a full-wave rectified mains waveform
+
+    Parameters
+    ----------
+    t : ndarray
+        The sample times, in seconds
+    frequency : float
+        The flicker frequency in Hertz (twice the mains frequency, e.g. 120 for 60 Hz mains)
+    v_max : float
+        The maximum voltage
+    v_min : float
+        The minimum voltage
+
+    Returns
+    -------
+    ndarray
+        The voltage at each sample time
+    """
+
+    return v_min + (v_max - v_min) * np.abs(np.sin(np.pi * frequency * t))
+
+
+def pwm(t:np.ndarray, frequency:float=1000.0, duty_cycle:float=0.5, v_max:float=1.0,
+        v_min:float=0.0) -> np.ndarray:
+    """Generates a pulse-width modulated square wave
+
+    Parameters
+    ----------
+    t : ndarray
+        The sample times, in seconds
+    frequency : float
+        The PWM frequency in Hertz
+    duty_cycle : float
+        The fraction of each period spent at v_max, from 0 to 1
+    v_max : float
+        The voltage during the on portion of the period
+    v_min : float
+        The voltage during the off portion of the period
+
+    Returns
+    -------
+    ndarray
+        The voltage at each sample time
+    """
+
+    phase = np.mod(t * frequency, 1.0)
+    return np.where(phase < duty_cycle, v_max, v_min)
+
+
+def harmonics(t:np.ndarray, frequency:float=120.0, v_avg:float=1.0, amplitudes:tuple=(0.1, 0.05),
+              phases:tuple=None) -> np.ndarray:
+    """Generates a fundamental frequency plus harmonics
+
+    Parameters
+    ----------
+    t : ndarray
+        The sample times, in seconds
+    frequency : float
+        The fundamental frequency in Hertz
+    v_avg : float
+        The DC level of the waveform
+    amplitudes : tuple
+        The amplitude (in volts) of the fundamental, 2nd harmonic, 3rd harmonic, etc.
+    phases : tuple or None
+        The phase (in radians) of each harmonic. If None, all phases are zero
+
+    Returns
+    -------
+    ndarray
+        The voltage at each sample time
+    """
+
+    if phases is None:
+        phases = (0.0,) * len(amplitudes)
+
+    out = np.full(np.shape(t), v_avg, dtype=float)
+    for k, (a, p) in enumerate(zip(amplitudes, phases), start=1):
+        out += a * np.sin(2 * np.pi * k * frequency * t + p)
+
+    return out
+
+
+SHAPES = {
+    'sine': sine_ripple,
+    'rectified': rectified_mains,
+    'pwm': pwm,
+    'harmonics': harmonics,
+}
+
+
+def generate(shape:str='sine', framerate:int=500000, duration:float=0.1, noise:float=0.0,
+             seed:int=None, **params) -> np.ndarray:
+    """Generates a synthetic waveform in memory
+
+    Parameters
+    ----------
+    shape : str
+        The waveform shape, one of 'sine', 'rectified', 'pwm', 'harmonics'
+    framerate : int
+        The number of samples per second
+    duration : float
+        The length of the capture, in seconds
+    noise : float
+        The standard deviation of the Gaussian noise added to the waveform, in volts
+    seed : int or None
+        The random seed for the noise, for reproducible captures
+    **params
+        Parameters passed to the shape function, e.g. frequency=100, duty_cycle=0.2
+
+    Returns
+    -------
+    ndarray
+        A 2D numpy array in the format [time(seconds), volts]
+    """
+
+    num_samples = int(round(duration * framerate))
+    return next(generate_chunks(shape, framerate, duration, chunk_size=max(num_samples, 1),
+                                noise=noise, seed=seed, **params), np.empty((0, 2)))
+
+
+def generate_chunks(shape:str='sine', framerate:int=500000, duration:float=0.1,
+                    chunk_size:int=1000000, noise:float=0.0, seed:int=None, **params):
+    """Generates a synthetic waveform as a sequence of chunks
+
+    Only one chunk is held in memory at a time. Concatenating the chunks gives the same
+    capture as generate() with the same parameters.
+
+    Parameters
+    ----------
+    shape : str
+        The waveform shape, one of 'sine', 'rectified', 'pwm', 'harmonics'
+    framerate : int
+        The number of samples per second
+    duration : float
+        The length of the capture, in seconds
+    chunk_size : int
+        The number of samples in each chunk
+    noise : float
+        The standard deviation of the Gaussian noise added to the waveform, in volts
+    seed : int or None
+        The random seed for the noise, for reproducible captures
+    **params
+        Parameters passed to the shape function, e.g. frequency=100, duty_cycle=0.2
+
+    Yields
+    ------
+    ndarray
+        2D numpy arrays in the format [time(seconds), volts]
+    """
+
+    if shape not in SHAPES:
+        raise ValueError('Unknown waveform shape: ' + str(shape))
+
+    func = SHAPES[shape]
+    rng = np.random.default_rng(seed)
+    num_samples = int(round(duration * framerate))
+
+    for start in range(0, num_samples, chunk_size):
+        stop = min(start + chunk_size, num_samples)
+
+        chunk = np.empty((stop - start, 2))
+        chunk[:,0] = np.arange(start, stop) / framerate
+        chunk[:,1] = func(chunk[:,0], **params)
+        if noise:
+            chunk[:,1] += rng.normal(0.0, noise, stop - start)
+
+        yield chunk
+
+
+def write_csv(filename:str, shape:str='sine', framerate:int=500000, duration:float=0.1,
+              chunk_size:int=1000000, noise:float=0.0, seed:int=None, **params) -> int:
+    """Writes a synthetic waveform to a CSV file, one chunk at a time
+
+    The file has no header and can be imported directly by waveform.import_waveform_csv()
+
+    Parameters
+    ----------
+    filename : str
+        The name of the CSV file to write
+    shape : str
+        The waveform shape, one of 'sine', 'rectified', 'pwm', 'harmonics'
+    framerate : int
+        The number of samples per second
+    duration : float
+        The length of the capture, in seconds
+    chunk_size : int
+        The number of samples generated and written at a time
+    noise : float
+        The standard deviation of the Gaussian noise added to the waveform, in volts
+    seed : int or None
+        The random seed for the noise, for reproducible captures
+    **params
+        Parameters passed to the shape function, e.g. frequency=100, duty_cycle=0.2
+
+    Returns
+    -------
+    int
+        The number of samples written
+    """
+
+    written = 0
+    with open(filename, 'w') as f:
+        for chunk in generate_chunks(shape, framerate, duration, chunk_size, noise, seed, **params):
+            np.savetxt(f, chunk, fmt=('%.12g', '%.8g'), delimiter=',')
+            written += len(chunk)
+
+    return written
+
+
+def write_npy(filename:str, shape:str='sine', framerate:int=500000, duration:float=0.1,
+              chunk_size:int=1000000, noise:float=0.0, seed:int=None, **params) -> int:
+    """Writes a synthetic waveform to a binary .npy file, one chunk at a time
+
+    The file holds a float64 array in the format [time(seconds), volts]. It can be read back
+    with np.load(filename, mmap_mode='r') without loading the whole capture into memory.
+
+    Parameters
+    ----------
+    filename : str
+        The name of the .npy file to write
+    shape : str
+        The waveform shape, one of 'sine', 'rectified', 'pwm', 'harmonics'
+    framerate : int
+        The number of samples per second
+    duration : float
+        The length of the capture, in seconds
+    chunk_size : int
+        The number of samples generated and written at a time
+    noise : float
+        The standard deviation of the Gaussian noise added to the waveform, in volts
+    seed : int or None
+        The random seed for the noise, for reproducible captures
+    **params
+        Parameters passed to the shape function, e.g. frequency=100, duty_cycle=0.2
+
+    Returns
+    -------
+    int
+        The number of samples written
+    """
+
+    num_samples = int(round(duration * framerate))
+    out = np.lib.format.open_memmap(filename, mode='w+', dtype=np.float64, shape=(num_samples, 2))
+
+    start = 0
+    for chunk in generate_chunks(shape, framerate, duration, chunk_size, noise, seed, **params):
+        out[start:start+len(chunk)] = chunk
+        start += len(chunk)
+
+    out.flush()
+    del out
+
+    return num_samples
+
+
+def ground_truth(shape:str='sine', resolution:int=100000, **params) -> dict:
+    """Computes the exact flicker parameters of a noiseless synthetic waveform
+
+    The values are computed on one period sampled at a high resolution, using the same
+    definitions as the Waveform class (e.g. v_avg is the mean of v_max and v_min).
+
+    Parameters
+    ----------
+    shape : str
+        The waveform shape, one of 'sine', 'rectified', 'pwm', 'harmonics'
+    resolution : int
+        The number of samples used to evaluate one period
+    **params
+        Parameters passed to the shape function, e.g. frequency=100, duty_cycle=0.2
+
+    Returns
+    -------
+    dict
+        The frequency, period, v_max, v_min, v_pp, v_avg, percent flicker and flicker index
+    """
+
+    if shape not in SHAPES:
+        raise ValueError('Unknown waveform shape: ' + str(shape))
+
+    func = SHAPES[shape]
+    freq = params.get('frequency', inspect.signature(func).parameters['frequency'].default)
+
+    t = np.arange(resolution) / (resolution * freq)
+    v = func(t, **params)
+
+    v_max = v.max()
+    v_min = v.min()
+    v_pp = v_max - v_min
+    v_avg = np.mean([v_max, v_min])
+
+    out = {}
+    out['frequency'] = freq
+    out['period'] = 1 / freq
+    out['v_max'] = v_max
+    out['v_min'] = v_min
+    out['v_pp'] = v_pp
+    out['v_avg'] = v_avg
+    out['percent flicker'] = v_pp / v_max * 100
+    out['flicker index'] = np.clip(v - v_avg, 0, None).sum() / v.sum()
+
+    return out
@@ -28,11 +28,15 @@ def round_output(value:float, toround:bool=True, digits:int=2):
 
     Returns
     -------
-    float or int
+    float or int or None
         If toround=True: The input value, rounded to an int or float
         If toround=False: The input value, not rounded
+        If the value is None (e.g. it was not computed), None
     """
 
+    if value is None:
+        return None
+
     if toround:
         if digits is not None or digits is not 0:
             return round(value, digits)
@@ -0,0 +1,127 @@
+"""Vectorized Flicker Metrics
+
+These functions compute the flicker metrics of many equal-length waveforms at once, stored as
+the columns (axis=0) or rows (axis=1) of a 2D array of voltages. Each metric is computed in a
+single NumPy call over the whole array, giving the same results as the per-waveform functions
+in waveform.py.
+
+The functions are:
+
+    * denoise - Applies the Savitzky-Golay Filter to every waveform
+    * v_stats - Gets the voltage statistics of every waveform
+    * frequency - Calculates the dominant frequency of every waveform
+    * percent_flicker - Computes the flicker percentage of every waveform
+"""
+
+import numpy as np
+from scipy.signal import savgol_filter
+
+
+def denoise(volts:np.ndarray, axis:int=0, window_length:int=901) -> np.ndarray:
+    """Applies the Savitzky-Golay Filter to every waveform
+
+    Parameters
+    ----------
+    volts : ndarray
+        The voltages as a 2D array, one waveform per column (axis=0) or row (axis=1)
+    axis : int
+        The axis along which time runs
+    window_length : int
+        The window length for the filter. Higher equals more smoothing
+
+    Returns
+    -------
+    ndarray
+        The voltages with noise removed
+    """
+
+    filter_order = 3
+    return savgol_filter(volts, window_length, filter_order, axis=axis)
+
+
+def v_stats(volts:np.ndarray, axis:int=0) -> tuple:
+    """Gets the voltage statistics of every waveform
+
+    Parameters
+    ----------
+    volts : ndarray
+        The voltages as a 2D array, one waveform per column (axis=0) or row (axis=1)
+    axis : int
+        The axis along which time runs
+
+    Returns
+    -------
+    tuple
+        (v_max, v_min, v_pp, v_avg) as 1D arrays with one value per waveform
+    """
+
+    v_max = volts.max(axis=axis)
+    v_min = volts.min(axis=axis)
+    v_pp = v_max - v_min
+    v_avg = (v_max + v_min) / 2
+
+    return (v_max, v_min, v_pp, v_avg)
+
+
+def frequency(volts:np.ndarray, framerate:int, v_avg:np.ndarray, axis:int=0) -> np.ndarray:
+    """Calculates the dominant frequency of every waveform
+
+    Uses the same zero-crossing method as waveform.frequency(). The mean spacing between the
+    crossings of each waveform is (last crossing - first crossing) / (number of crossings - 1),
+    so only the count and the first and last crossing are needed.
+
+    Parameters
+    ----------
+    volts : ndarray
+        The voltages as a 2D array, one waveform per column (axis=0) or row (axis=1)
+    framerate : int
+        The frame rate (samples per second)
+    v_avg : ndarray
+        The average voltage of each waveform
+    axis : int
+        The axis along which time runs
+
+    Returns
+    -------
+    ndarray
+        The frequency of each waveform in Hertz. NaN if a waveform has fewer than two crossings
+    """
+
+    # Center each waveform vertically on zero
+    zdata = volts - np.expand_dims(v_avg, axis)
+
+    # Find the zero crossings
+    crossings = np.diff(np.sign(zdata), axis=axis) != 0
+    n = crossings.shape[axis]
+    count = crossings.sum(axis=axis)
+    first = crossings.argmax(axis=axis)
+    last = n - 1 - np.flip(crossings, axis=axis).argmax(axis=axis)
+
+    # Estimate the frequency
+    with np.errstate(divide='ignore', invalid='ignore'):
+        mean_spacing = np.where(count > 1, (last - first) / (count - 1), np.nan)
+        est_freq = np.round(framerate / mean_spacing / 2)
+
+    # For now, round everything in the range 115-130 Hz to 120 Hz
+    est_freq[(est_freq >= 115) & (est_freq <= 130)] = 120.0
+
+    return est_freq
+
+
+def percent_flicker(v_max:np.ndarray, v_pp:np.ndarray) -> np.ndarray:
+    """Computes the flicker percentage of every waveform
+
+    Parameters
+    ----------
+    v_max : ndarray
+        The max voltage of each waveform
+    v_pp : ndarray
+        The peak-to-peak voltage of each waveform
+
+    Returns
+    -------
+    ndarray
+        The flicker percentage of each waveform
+    """
+
+    return v_pp / v_max * 100
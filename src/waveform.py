@@ -2,7 +2,8 @@
 
 The classes and methods contained herein allow you to generate flicker waveforms and 
 perform relevant calculations, including flicker index, frequency, and percent. 
-Plots can also be generated directly from the waveform.
+Plots can also be generated directly from the waveform. Plotting is only imported on first
+use, so the metrics can be computed without matplotlib installed.
 
 For single waveforms: It is recommended to simply create instances of the Waveform class, 
 as opposed to using methods outside the class, as this will automatically perform all necessary
@@ -20,26 +21,79 @@ The classes are:
 The functions are:
 
     * import_waveform_csv - Imports a waveform from a CSV file, typically produced by an oscilloscope
+    * import_multichannel_csv - Imports a multi-channel waveform from a CSV file in a single pass
+    * as_waveform_data - Converts an in-memory array to the [time(seconds), volts] waveform format
     * import_directory - Imports all valid waveforms from the CSV files in the directory (and subdirectories)
+    * batch_import - Imports many waveforms, keeping going when files fail
+    * adaptive_import - Imports many waveforms, running the full pipeline only near compliance thresholds
+    * stacked_stages - Gets the stages of a pipeline that can be computed for a stack of files at once
     * get_files_in_directory - Gets the paths and filenames of all files in the directory (and subdirectories)
+    * get_waveform_name - Formats the name of a file as the name of its waveform
     * get_names_in_waveform_list - Gets the names of all Waveform objects in a list of Waveforms
     * denoise - Applies the Savitzky-Golay Filter to remove noise
     * framerate - Gets the frame rate (samples per second) of the data
+    * v_stats - Gets the voltage statistics of the data
     * find_nearest_idx - Finds the index of the nearest value in an array
     * find_nearest_idx_rising - Finds the closest rising-edge value in a 1D array
     * frequency - Calculates the dominant frequency of the waveform
+    * frequency_from_crossings - Estimates the dominant frequency from the crossings of v_avg
+    * capture_frequency - Calculates the dominant frequency of a binary ScopeCapture
+    * archive_frequency - Calculates the dominant frequency of a WaveformArchive
+    * period - Gets the period of the waveform
     * percent_flicker - Computes the flicker percentage of the waveform
     * flicker_index - Gets the flicker index of the waveform
     * n_periods - Truncates a waveform to n periods
+    * capture_n_periods - Gets n periods from the start of a binary ScopeCapture
+
+The pipelines are:
+
+    * FULL_PIPELINE - import, denoise, framerate, v stats, frequency, period, one period,
+      flicker index, percent flicker, standards
+    * FAST_PIPELINE - FULL_PIPELINE without denoising and the flicker index
+    * PERIOD_STATS_PIPELINE - FULL_PIPELINE plus the metrics of every period (see periods.py)
+      and the shape fingerprint (see similarity.py). Waveforms analyzed with another pipeline
+      compute these on first use instead (see Waveform.get_period_stats and get_fingerprint)
+    * SCREENING_PIPELINE - import, framerate, v stats, then a provisional frequency and percent
+      flicker from single-bin DFTs at the expected mains harmonics (see screening.py), standards
+    * ESTIMATE_PIPELINE - import, framerate, v stats, then the frequency and percent flicker
+      with bounds from a decimated copy (see adaptive.py), period, standards
+    * SCOPE_BINARY_PIPELINE - FULL_PIPELINE for memory-mapped binary scope exports, computed
+      on the ADC codes
+    * ARCHIVE_PIPELINE - FULL_PIPELINE for compressed waveform archives (see archive.py),
+      computed one chunk at a time
+    * EVENTS_PIPELINE - PERIOD_STATS_PIPELINE plus the detection of transient events in the
+      per-period metrics (see events.py)
 """
 
+import uuid
 import numpy as np
-from os import walk
+from os import walk, remove, makedirs
+from os import path as os_path
 from scipy.signal import savgol_filter, butter, filtfilt
-from scipy.integrate import simps
+try:
+    from scipy.integrate import simpson
+except ImportError:
+    # SciPy before 1.6 only has the old name
+    from scipy.integrate import simps as simpson
 from .utils import round_output, bool_to_pass_fail
-from .plot import waveform_graph
-from .standards import well_building_standard_v2, california_ja8_2019, ieee_1789_2015
+from .standards import well_building_standard_v2, california_ja8_2019, ieee_1789_2015, evaluate_standards, \
+    verdicts_constant
+from .profiling import profile_stage
+from .pipeline import Stage, Pipeline, StageError
+from .scope import read_scope_header, read_scope_binary, denoise_capture, capture_v_stats, capture_crossings
+from .periods import period_stats
+from .events import detect_events
+from .screening import screen
+from .adaptive import estimate
+from .budget import MemoryBudget
+from .pyramid import EnvelopePyramid, build_pyramid
+from .similarity import shape_fingerprint, FingerprintIndex
+from .metrics import WaveformMetrics
+from .batch import ImportFailure, ImportTimeout, run_with_timeout, find_duplicates, should_quarantine
+from .archive import read_archive, denoise_archive, archive_v_stats, archive_crossings
+from .stacked import STACKED_STAGES, stacked_outputs
+from .shared import analyze_in_processes
+from . import kernels
 
 
 class Waveform:
@@ -53,8 +107,17 @@ class Waveform:
     ----------
     name : str
         The name of the waveform. Use this to keep track of multiple waveforms and for plotting
-    data : ndarray
-        The 2D array holding waveform data. Format is [time(seconds):float, voltage:float]
+    filename : str
+        The name of the CSV file the waveform was imported from
+    pipeline : Pipeline
+        The analysis pipeline used to compute the values of this waveform. 
+        Values of stages that are not in the pipeline are None
+    data : ndarray or ScopeCapture
+        The 2D array holding waveform data. Format is [time(seconds):float, voltage:float].
+        For binary scope exports, a ScopeCapture that converts samples as they are accessed.
+        None while evicted by a MemoryBudget; use get_data() to reload it
+    num_samples : int
+        The number of samples in data, kept while data is evicted
     denoised : bool
         Whether or not the waveform has been filtered to remove noise
     framerate : int
@@ -73,9 +136,24 @@ class Waveform:
         The period (1 / frequency), in seconds
     one_period : ndarray
         A 2D array containing just one period of the waveform. 
-        Format is [time(seconds):float, voltage:float]
+        Format is [time(seconds):float, voltage:float].
+        None while evicted by a MemoryBudget; use get_one_period() to reload it
     flicker_index : float
         The flicker index of the waveform
+    period_starts : ndarray
+        The index of the first sample of every period in data
+    period_metrics : dict
+        The period, v_max, v_min, v_mean, percent flicker and flicker index of every period
+    period_stats : dict
+        The distribution (mean, std, min, max, percentiles) of the period, percent flicker
+        and flicker index across every period. The three period attributes are None until
+        get_period_stats() is called, unless the pipeline has a period_stats stage
+    events : list or None
+        The transient events found in the per-period metrics (see events.py). Only computed
+        by pipelines with an events stage, such as EVENTS_PIPELINE
+    fingerprint : ndarray
+        The shape fingerprint of one period (see similarity.py). None until get_fingerprint()
+        is called, unless the pipeline has a fingerprint stage
     percent_flicker : float
         The percent flicker of the waveform
     ieee_1789_2015 : str
@@ -84,11 +162,40 @@ class Waveform:
         Whether this waveform complies with WELL v2 L7
     california_ja8_2019 : bool
         Whether this waveform complies with California JA8 2019
+    profiler : Profiler or None
+        The Profiler recording the time and memory used by each step, if any
+    error : Exception or None
+        The error raised while analyzing the file, if the constructor failed. The values
+        of the pipeline are then None. Use batch_import to skip failed files instead
+    aliases : dict
+        {path: name} of the files with the same contents as this waveform's file, which
+        batch_import(dedupe=True) did not analyze again
+    escalated : bool
+        Whether adaptive_import reanalyzed this waveform with the full pipeline because its
+        estimate was too close to a compliance threshold. False for other imports
 
     Methods
     -------
+    from_inputs(inputs, name, filename=None, profiler=None, pipeline=None)
+        Creates a Waveform by running a pipeline on named input values
+    from_array(array, name, framerate=None, remove_noise=True, profiler=None, pipeline=None)
+        Creates a Waveform from data that is already in memory
+    from_buffer(buffer, name, framerate=None, dtype='float64', interleaved=False, **kwargs)
+        Creates a Waveform from any object supporting the buffer protocol
+    from_scope_binary(filename, name, header=None, dtype=None, remove_noise=True, profiler=None, pipeline=None)
+        Creates a Waveform from a memory-mapped binary oscilloscope export
+    from_archive(filename, name, remove_noise=True, profiler=None, pipeline=None)
+        Creates a Waveform from a compressed waveform archive
     rename(new_name)
         Renames the Waveform
+    reanalyze(pipeline)
+        Recomputes this Waveform with a different pipeline
+    get_resident_bytes()
+        Returns the number of bytes held by the raw arrays (data and one period) of this waveform
+    can_evict(spill_dir=None)
+        Whether evicting the raw arrays of this waveform would free memory
+    evict(spill_dir=None)
+        Frees the raw arrays (data and one period) of this waveform, keeping its metrics
     get_name()
         Gets the name of this waveform instance
     get_data()
@@ -117,8 +224,20 @@ class Waveform:
         Gets the percent flicker of this instance of the waveform
     get_flicker_index(rounded=True, digits=1)
         Gets the flicker index of this instance of the waveform
+    get_period_stats(metric=None)
+        Gets the distribution of the per-period metrics of this waveform instance
+    get_events()
+        Gets the transient flicker events found in this waveform instance
+    get_fingerprint()
+        Gets the shape fingerprint of one period of this waveform instance
+    get_pyramid()
+        Gets the min/max envelope pyramid of the waveform data
+    get_range_stats(t_start, t_stop)
+        Gets the voltage statistics and percent flicker of a time range of the waveform
     plot(num_periods=None, filename=None, showstats=True, fullheight=False, figsize=(8,4))
         Plots the time-series waveform graphic
+    explore(figsize=(10,4), show_periods=True, show_metrics=True)
+        Shows an interactive plot that redraws only the visible window on each pan or zoom
     summary(verbose=False, format='String', rounded=True)
         Returns a summary of the parameters of this waveform instance
     get_ieee_1789_2015()
@@ -129,7 +248,7 @@ class Waveform:
         Whether this waveform complies with the California JA8 2019 flicker requirements
     """
 
-    def __init__(self, filename:str, name:str, remove_noise:bool=True):
+    def __init__(self, filename:str, name:str, remove_noise:bool=True, profiler=None, pipeline=None):
         """Initializes this Waveform instance and automatically computes all values
 
         Parameters
@@ -141,33 +260,390 @@ class Waveform:
         remove_noise : bool
             If True (default), data will be automatically denoised
             If False, data will not be denoised
+        profiler : Profiler or None
+            If specified, the time and memory used by each step will be recorded by this Profiler
+        pipeline : Pipeline or None
+            The analysis pipeline to run. If None, FULL_PIPELINE is used.
+            e.g. FAST_PIPELINE skips denoising and the flicker index
         """
 
+        if pipeline is None:
+            pipeline = FULL_PIPELINE
+        if not remove_noise:
+            pipeline = pipeline.without('denoise')
+
+        self._setup(name, filename, {'filename': filename}, profiler, pipeline)
+
         try: 
-            self.name = name
-            self.data = import_waveform_csv(filename)
-            if remove_noise:
-                self.data = denoise(self.data)
-                self.denoised = True
-            else:
-                self.denoised = False
-            self.framerate = framerate(self.data)
-            self.v_max = self.data[:,1].max()
-            self.v_min = self.data[:,1].min()
-            self.v_pp = self.v_max - self.v_min
-            self.v_avg = np.mean([self.v_max, self.v_min])  
-            self.frequency = frequency(self.data, self.framerate, self.v_avg)
-            self.period = 1 / self.frequency
-            self.one_period = n_periods(self.data, self.v_avg, self.period, num_periods=1)
-            self.flicker_index = flicker_index(self.one_period, self.v_avg)
-            self.percent_flicker = percent_flicker(self.v_max, self.v_pp)
-            self.ieee_1789_2015 = ieee_1789_2015(self.frequency, self.percent_flicker)
-            self.well_standard_v2 = well_building_standard_v2(self.frequency, self.percent_flicker)
-            self.california_ja8_2019 = california_ja8_2019(self.frequency, self.percent_flicker)
+            self._analyze()
         except Exception as e:
             print('WARNING: Could not import waveform at file location ' + filename)
             print(e)
-            self = None
+            for attr in PIPELINE_ATTRIBUTES:
+                setattr(self, attr, None)
+            self.error = e
+
+
+    @classmethod
+    def from_inputs(cls, inputs:dict, name:str, filename:str=None, profiler=None, pipeline=None,
+                    cache:dict=None):
+        """Creates a Waveform by running a pipeline on named input values
+
+        Stages whose outputs are all given in inputs are skipped, so the pipeline can start
+        from values that were computed elsewhere, e.g. {'data': data} skips the import and
+        denoise stages. Unlike the constructor, errors are raised rather than printed.
+
+        Parameters
+        ----------
+        inputs : dict
+            The input values of the pipeline, by name
+        name : str
+            The name of the waveform. Use this to keep track of multiple waveforms and for plotting
+        filename : str or None
+            The file the values came from, if any
+        profiler : Profiler or None
+            If specified, the time and memory used by each step will be recorded by this Profiler
+        pipeline : Pipeline or None
+            The analysis pipeline to run. If None, FULL_PIPELINE is used
+        cache : dict or None
+            The cache of stage outputs to start from, e.g. with outputs preloaded by
+            Pipeline.preload(). If None, every stage is run
+
+        Returns
+        -------
+        Waveform
+            The new Waveform
+        """
+
+        if pipeline is None:
+            pipeline = FULL_PIPELINE
+
+        w = cls.__new__(cls)
+        w._setup(name, filename, dict(inputs), profiler, pipeline, cache)
+        w._analyze()
+        return w
+
+
+    @classmethod
+    def from_array(cls, array, name:str, framerate:int=None, remove_noise:bool=True, profiler=None,
+                   pipeline=None):
+        """Creates a Waveform from data that is already in memory
+
+        A 2D float64 array in the format [time(seconds), volts] is used as is, without a copy.
+        For a 1D array of volts, framerate is required and the time axis is generated, which
+        needs one copy into the [time, volts] format.
+
+        Parameters
+        ----------
+        array : ndarray or array-like
+            Either a 2D array in the format [time(seconds), volts], or a 1D array of volts
+        name : str
+            The name of the waveform. Use this to keep track of multiple waveforms and for plotting
+        framerate : int or None
+            The number of samples per second. Required for 1D arrays.
+            If None, it is computed from the time axis
+        remove_noise : bool
+            If True (default), data will be automatically denoised
+            If False, data will not be denoised
+        profiler : Profiler or None
+            If specified, the time and memory used by each step will be recorded by this Profiler
+        pipeline : Pipeline or None
+            The analysis pipeline to run. If None, FULL_PIPELINE is used.
+            Its import stage is replaced by one that reads the array
+
+        Returns
+        -------
+        Waveform
+            The new Waveform
+        """
+
+        if pipeline is None:
+            pipeline = FULL_PIPELINE
+        if not remove_noise:
+            pipeline = pipeline.without('denoise')
+
+        import_stage = Stage('import', as_waveform_data, ('array',), ('data',), params={'framerate': framerate})
+        if 'import' in pipeline:
+            pipeline = pipeline.replace('import', import_stage)
+        else:
+            pipeline = Pipeline([import_stage] + pipeline.stages, pipeline.name)
+
+        inputs = {'array': array}
+        if framerate is not None:
+            inputs['framerate'] = framerate
+
+        return cls.from_inputs(inputs, name, profiler=profiler, pipeline=pipeline)
+
+
+    @classmethod
+    def from_buffer(cls, buffer, name:str, framerate:int=None, dtype='float64', interleaved:bool=False,
+                    **kwargs):
+        """Creates a Waveform from any object supporting the buffer protocol
+
+        e.g. bytes, a DAQ driver buffer, or multiprocessing.shared_memory.SharedMemory.buf.
+        The buffer is wrapped with np.frombuffer, without a copy.
+
+        Parameters
+        ----------
+        buffer : buffer-like
+            The samples
+        name : str
+            The name of the waveform. Use this to keep track of multiple waveforms and for plotting
+        framerate : int or None
+            The number of samples per second. Required unless interleaved is True
+        dtype : str or dtype
+            The data type of the samples. Types other than float64 are converted (one copy)
+        interleaved : bool
+            If False (default), the buffer holds volts only.
+            If True, the buffer holds [time, volts] pairs
+        **kwargs
+            Passed to Waveform.from_array, e.g. remove_noise, profiler, pipeline
+
+        Returns
+        -------
+        Waveform
+            The new Waveform
+        """
+
+        array = np.frombuffer(buffer, dtype=dtype)
+        if interleaved:
+            array = array.reshape(-1, 2)
+
+        return cls.from_array(array, name, framerate=framerate, **kwargs)
+
+
+    @classmethod
+    def from_scope_binary(cls, filename:str, name:str, header=None, dtype:str=None, remove_noise:bool=True,
+                          profiler=None, pipeline=None):
+        """Creates a Waveform from a memory-mapped binary oscilloscope export
+
+        The samples are never converted to a float64 copy of the whole capture: the voltage
+        statistics and frequency are computed on the ADC codes, and only the first few
+        periods are converted to volts. data is a ScopeCapture, see scope.read_scope_binary
+
+        Parameters
+        ----------
+        filename : str
+            The name of the binary file
+        name : str
+            The name of the waveform. Use this to keep track of multiple waveforms and for plotting
+        header : str or dict or None
+            The header, or the name of a file holding it (e.g. CSVs/info.csv).
+            If None, the header is read from the top of the binary file
+        dtype : str or None
+            The sample type, 'int8' or 'int16'. If None, it is read from the header
+        remove_noise : bool
+            If True (default), data will be automatically denoised (in float32 code units)
+            If False, data will not be denoised
+        profiler : Profiler or None
+            If specified, the time and memory used by each step will be recorded by this Profiler
+        pipeline : Pipeline or None
+            The analysis pipeline to run. If None, SCOPE_BINARY_PIPELINE is used.
+            Its import stage is replaced by one that reads the binary file
+
+        Returns
+        -------
+        Waveform
+            The new Waveform
+        """
+
+        if pipeline is None:
+            pipeline = SCOPE_BINARY_PIPELINE
+        if not remove_noise:
+            pipeline = pipeline.without('denoise')
+
+        import_stage = Stage('import', read_scope_binary, ('filename',), ('data',),
+                             params={'header': header, 'dtype': dtype})
+        pipeline = pipeline.replace('import', import_stage)
+
+        return cls.from_inputs({'filename': filename}, name, filename=filename, profiler=profiler,
+                               pipeline=pipeline)
+
+
+    @classmethod
+    def from_archive(cls, filename:str, name:str, remove_noise:bool=True, profiler=None, pipeline=None):
+        """Creates a Waveform from a compressed waveform archive
+
+        The archive is read one chunk at a time, so the whole capture is never decompressed at
+        once. data is a WaveformArchive (see archive.read_archive), so get_n_periods() and
+        plot(num_periods=...) only decompress the chunks holding the first periods
+
+        Parameters
+        ----------
+        filename : str
+            The name of the archive file, e.g. written by archive.convert_directory
+        name : str
+            The name of the waveform. Use this to keep track of multiple waveforms and for plotting
+        remove_noise : bool
+            If True (default), data will be automatically denoised as it is read
+            If False, data will not be denoised
+        profiler : Profiler or None
+            If specified, the time and memory used by each step will be recorded by this Profiler
+        pipeline : Pipeline or None
+            The analysis pipeline to run. If None, ARCHIVE_PIPELINE is used
+
+        Returns
+        -------
+        Waveform
+            The new Waveform
+        """
+
+        if pipeline is None:
+            pipeline = ARCHIVE_PIPELINE
+        if not remove_noise:
+            pipeline = pipeline.without('denoise')
+
+        return cls.from_inputs({'filename': filename}, name, filename=filename, profiler=profiler,
+                               pipeline=pipeline)
+
+
+    def _setup(self, name:str, filename:str, inputs:dict, profiler, pipeline, cache:dict=None):
+        """Sets the attributes needed to run the pipeline"""
+
+        self.name = name
+        self.filename = filename
+        self.profiler = profiler
+        self.pipeline = pipeline
+        self._inputs = inputs
+        self._cache = {} if cache is None else cache
+        self.error = None
+        self._budget = None
+        self._evicted = ()
+        self._spilled = {}
+        self._pyramid = None
+        self.num_samples = 0
+        self.aliases = {}
+        self.escalated = False
+
+
+    def _analyze(self, previous=None):
+        """Runs the pipeline and sets the attributes of this Waveform from its outputs
+
+        The values of the previous pipeline, if any, are cleared, including those of custom
+        stages that are not in PIPELINE_ATTRIBUTES
+        """
+
+        values = self.pipeline.run(self._inputs, cache=self._cache, profiler=self.profiler, file=self.filename)
+
+        stale = [o for stage in previous for o in stage.outputs] if previous is not None else []
+        for attr in PIPELINE_ATTRIBUTES + tuple(stale):
+            setattr(self, attr, None)
+        for attr, value in values.items():
+            setattr(self, attr, value)
+        self.num_samples = len(self.data) if self.data is not None else 0
+        self.denoised = values.get('denoised', 'denoise' in self.pipeline)
+        self._pyramid = None
+
+        self._discard_spill()
+        self._evicted = ()
+        if self._budget is not None:
+            self._budget.touch(self)
+
+
+    def get_resident_bytes(self) -> int:
+        """Returns the number of bytes held by the raw arrays (data and one period) of this waveform
+
+        Returns
+        -------
+        int
+            The size of the arrays, or 0 if they have been evicted
+        """
+
+        return sum(getattr(getattr(self, attr, None), 'nbytes', 0) for attr in RESIDENT_ATTRIBUTES)
+
+
+    def can_evict(self, spill_dir:str=None) -> bool:
+        """Whether evicting the raw arrays of this waveform would free memory
+
+        Parameters
+        ----------
+        spill_dir : str or None
+            The directory evicted arrays would be saved to
+
+        Returns
+        -------
+        bool
+            True if there is a spill directory, or if the arrays can be recomputed from the
+            pipeline inputs without keeping an array in memory (e.g. from a filename)
+        """
+
+        return spill_dir is not None or \
+            all(v is None or isinstance(v, (str, bytes, int, float, bool)) for v in self._inputs.values())
+
+
+    def evict(self, spill_dir:str=None):
+        """Frees the raw arrays (data and one period) of this waveform, keeping its metrics
+
+        The arrays are reloaded automatically by get_data(), get_one_period(), get_n_periods()
+        and the plots. Usually called by a MemoryBudget
+
+        Parameters
+        ----------
+        spill_dir : str or None
+            If specified, the arrays are saved to this directory and reloaded from it.
+            If None, they are recomputed by rerunning the pipeline
+        """
+
+        evicted = []
+        for attr in RESIDENT_ATTRIBUTES:
+            value = getattr(self, attr, None)
+            if value is None:
+                continue
+            if spill_dir is not None and isinstance(value, np.ndarray) and attr not in self._spilled:
+                path = os_path.join(spill_dir, uuid.uuid4().hex + '_' + attr + '.npy')
+                np.save(path, value)
+                self._spilled[attr] = path
+            setattr(self, attr, None)
+            evicted.append(attr)
+
+        self._evicted = tuple(self._evicted) + tuple(evicted)
+        self._cache = {}
+
+
+    def _ensure_resident(self):
+        """Reloads the raw arrays of this waveform if they have been evicted, and marks it as used"""
+
+        reloaded = bool(self._evicted)
+        if reloaded:
+            if all(attr in self._spilled for attr in self._evicted):
+                for attr in self._evicted:
+                    setattr(self, attr, np.load(self._spilled[attr]))
+            else:
+                values = self.pipeline.run(self._inputs, cache=self._cache, profiler=self.profiler, file=self.filename)
+                for attr in self._evicted:
+                    setattr(self, attr, values.get(attr))
+            self._evicted = ()
+
+        if self._budget is not None:
+            self._budget.touch(self, reloaded)
+
+
+    def _discard_spill(self):
+        """Deletes the spilled copies of the raw arrays, which are stale after reanalysis"""
+
+        for path in self._spilled.values():
+            try:
+                remove(path)
+            except OSError:
+                pass
+        self._spilled = {}
+
+
+    def reanalyze(self, pipeline):
+        """Recomputes this Waveform with a different pipeline
+
+        Stages that are unchanged from the previous pipeline (and everything upstream of them)
+        are not recomputed.
+
+        Parameters
+        ----------
+        pipeline : Pipeline
+            The analysis pipeline to run
+        """
+
+        previous = self.pipeline
+        self.pipeline = pipeline
+        self._analyze(previous)
 
 
     # Setters:
@@ -206,6 +682,7 @@ class Waveform:
             The 2D array holding waveform data. Format is [time(seconds):float, voltage:float]
         """
 
+        self._ensure_resident()
         return self.data
 
 
@@ -359,6 +836,7 @@ class Waveform:
             Format is [time(seconds):float, voltage:float]
         """
 
+        self._ensure_resident()
         return self.one_period
 
 
@@ -379,9 +857,10 @@ class Waveform:
         """
 
         if num_periods == 1:
-            return self.one_period
-        else:
-            return n_periods(self.data, self.v_avg, self.period, num_periods)
+            return self.get_one_period()
+
+        func = self.pipeline.get_stage('one_period').func if 'one_period' in self.pipeline else n_periods
+        return func(self.get_data(), self.v_avg, self.period, num_periods)
 
 
     def get_percent_flicker(self, rounded:bool=True, digits:int=1) -> float:
@@ -424,6 +903,112 @@ class Waveform:
         return round_output(self.flicker_index, rounded, digits)
 
 
+    def get_period_stats(self, metric:str=None) -> dict:
+        """Gets the distribution of the per-period metrics of this waveform instance
+
+        Every period in the capture is measured, so these show how much the metrics vary
+        from period to period, unlike get_flicker_index() which uses the first period only.
+        They are computed on first use, unless the pipeline has a period_stats stage
+        (e.g. PERIOD_STATS_PIPELINE).
+
+        Parameters
+        ----------
+        metric : str or None
+            One of 'period', 'percent flicker', 'flicker index'. If None, returns all three
+
+        Returns
+        -------
+        dict
+            The count, mean, std, min, max, p5, p50 and p95 of the metric, or a dict of these
+            for each metric if metric is None
+        """
+
+        if self.period_stats is None:
+            with profile_stage(self.profiler, 'period_stats', self.name):
+                (self.period_starts, self.period_metrics, self.period_stats) = \
+                    period_stats(self.get_data(), self.v_avg, self.v_pp, self.framerate)
+
+        if metric is None:
+            return self.period_stats
+        return self.period_stats[metric]
+
+
+    def get_events(self) -> list:
+        """Gets the transient flicker events found in this waveform instance
+
+        Events are runs of periods whose length, amplitude or mean level differs from the
+        periods around them, e.g. dropouts, dimmer glitches or bursts (see events.py).
+        Use EVENTS_PIPELINE, or insert an events stage in another pipeline, to find them
+
+        Returns
+        -------
+        list or None
+            A dict for each event with its 'start' and 'stop' times in seconds, its 'periods',
+            the 'metrics' that were anomalous and its highest 'score'. None if the pipeline
+            has no events stage
+        """
+
+        return self.events
+
+
+    def get_fingerprint(self) -> np.ndarray:
+        """Gets the shape fingerprint of one period of this waveform instance
+
+        Waveforms with the same period shape, whatever their amplitude, offset, frequency and
+        phase, have nearby fingerprints (see similarity.py). The fingerprint is computed on
+        first use, unless the pipeline has a fingerprint stage (e.g. PERIOD_STATS_PIPELINE)
+
+        Returns
+        -------
+        ndarray
+            The fingerprint
+        """
+
+        if self.fingerprint is None:
+            with profile_stage(self.profiler, 'fingerprint', self.name):
+                self.fingerprint = shape_fingerprint(self.get_one_period())
+        return self.fingerprint
+
+
+    def get_pyramid(self) -> EnvelopePyramid:
+        """Gets the min/max envelope pyramid of the waveform data
+
+        The pyramid is built on first use and kept, like the metrics, when the raw arrays
+        are evicted, so overview plots and range statistics do not reload the data
+
+        Returns
+        -------
+        EnvelopePyramid
+            The pyramid (see pyramid.py)
+        """
+
+        if self._pyramid is None:
+            with profile_stage(self.profiler, 'pyramid', self.name):
+                self._pyramid = build_pyramid(self.get_data(), self.framerate)
+        return self._pyramid
+
+
+    def get_range_stats(self, t_start:float, t_stop:float) -> dict:
+        """Gets the voltage statistics and percent flicker of a time range of the waveform
+
+        The statistics come from the envelope pyramid, in O(log n) time, with the range
+        rounded outward to whole blocks of samples (see EnvelopePyramid.range_stats)
+
+        Parameters
+        ----------
+        t_start, t_stop : float
+            The time range in seconds, from the start of the waveform
+
+        Returns
+        -------
+        dict
+            The 'v_min', 'v_max', 'v_mean' and 'percent flicker' of the range
+        """
+
+        (v_min, v_max, v_mean, pf) = self.get_pyramid().time_stats(t_start, t_stop)
+        return {'v_min': v_min, 'v_max': v_max, 'v_mean': v_mean, 'percent flicker': pf}
+
+
     def get_ieee_1789_2015(self) -> str:
         """Whether this waveform complies with the IEEE 1789-2015 flicker requirements
 
@@ -462,10 +1047,13 @@ class Waveform:
     
     def plot_extrapolated(self, time_ms:int=None, filename:str=None, showstats:bool=True, figsize:tuple=(8,4)):
 
-        (ext_data, _) = extrapolate(self.one_period, self.v_pp, self.framerate, time_ms=time_ms)
+        from .plot import waveform_graph
 
-        waveform_graph(waveform=self, data=ext_data, filename=filename, \
-                       showstats=showstats, fullheight=True, figsize=figsize)
+        with profile_stage(self.profiler, 'plot_extrapolated', self.name):
+            (ext_data, _) = extrapolate(self.get_one_period(), self.v_pp, self.framerate, time_ms=time_ms)
+
+            waveform_graph(waveform=self, data=ext_data, filename=filename, \
+                           showstats=showstats, fullheight=True, figsize=figsize)
 
 
     def plot(self, num_periods:int=None, filename:str=None, showstats:bool=True, 
@@ -490,8 +1078,39 @@ class Waveform:
             The (x,y) size of the figure
         """
 
-        waveform_graph(waveform=self, num_periods=num_periods, filename=filename, showstats=showstats, \
-                       fullheight=fullheight, figsize=figsize)
+        from .plot import waveform_graph
+
+        with profile_stage(self.profiler, 'plot', self.name):
+            waveform_graph(waveform=self, num_periods=num_periods, filename=filename, showstats=showstats, \
+                           fullheight=fullheight, figsize=figsize)
+
+
+    def explore(self, figsize:tuple=(10,4), show_periods:bool=True, show_metrics:bool=True):
+        """Shows an interactive plot that redraws only the visible window on each pan or zoom
+
+        Use an interactive backend (e.g. %matplotlib widget) to pan and zoom with the mouse
+
+        Parameters
+        ----------
+        figsize : tuple
+            The (x,y) size of the figure
+        show_periods : bool
+            If True, period boundaries are drawn (computing the period stats if needed,
+            see get_period_stats)
+        show_metrics : bool
+            If True, the percent flicker and flicker index of each visible period are labeled
+
+        Returns
+        -------
+        WaveformExplorer
+            The explorer, e.g. explorer.set_range(0.010, 0.020) zooms to 10-20 ms
+        """
+
+        from .explorer import WaveformExplorer
+
+        if show_periods:
+            self.get_period_stats()
+        return WaveformExplorer(self, figsize=figsize, show_periods=show_periods, show_metrics=show_metrics)
 
 
     def summary(self, verbose:bool=False, format:str='String', rounded:bool=True):
@@ -505,16 +1124,19 @@ class Waveform:
             If True, will display all of the above, plus:
                 Period, Frame Rate, V_min, V_max, V_avg, V_pp, IEEE 1789-2015, WELL v2 L7, California JA 2019
         format : str
-            The format of the output, either 'String' or 'Dict'
+            The format of the output, either 'String', 'Dict' or 'Metrics'
         rounded : bool
             If True (default), will round the output values
             If False, will not round the output values
+            Metrics are never rounded
 
         Returns
         -------
-        str or dict
+        str or dict or WaveformMetrics
             If format = 'String': A String summarizing the waveform
             If format = 'Dict': A dict summarizing the waveform
+            If format = 'Metrics': A compact, picklable record of every metric, without
+            the data (see metrics.py). verbose is ignored
         """
 
         if format == 'String':
@@ -551,6 +1173,9 @@ class Waveform:
                 out['WELL v2 L7'] = self.well_standard_v2
                 out['California JA8 2019'] = self.california_ja8_2019
 
+        elif format == 'Metrics':
+            out = WaveformMetrics.from_waveform(self)
+
         else:
             out = 'Unidentified data format'
 
@@ -570,28 +1195,117 @@ class WaveformCollection():
         A list of Waveform objects
     names : list
         The names of all the Waveform objects in the collection
+    profiler : Profiler or None
+        The Profiler recording the time and memory used by each import step, if any
+    budget : MemoryBudget or None
+        The budget limiting the memory held by the raw arrays of the waveforms, if any
+    failures : list
+        An ImportFailure for every file that could not be imported (see batch_import)
+    escalated : int or None
+        With adaptive=True, the number of waveforms escalated to the full pipeline
+    prefetcher : Prefetcher or None
+        The Prefetcher that read the files ahead of the analysis, if any
+    aliases : dict
+        {name: name of the waveform} of the files that were not analyzed because a waveform
+        in the collection has the same contents (with dedupe=True). get() accepts these names
+    progress : ProgressTracker or None
+        The ProgressTracker the import was reported to, also used by plot_all(), if any
 
     Methods
     -------
+    reanalyze(pipeline)
+        Recomputes every Waveform in the collection with a different pipeline
+    get_stats()
+        Returns the profiling statistics of all the imports in the collection
     get_names()
         Returns a list of the names of this waveforms in the collection
     get_waveforms()
         Returns a list of the Waveform objects in the collection
     get(name)
         Returns a Waveform based on its name
+    explore(**kwargs)
+        Displays an interactive explorer of the waveforms in a notebook
+    get_similarity_index()
+        Returns the nearest-neighbour index of the shape fingerprints of the waveforms
+    similar(waveform, k=5)
+        Finds the waveforms whose period shape is most similar to a waveform
+    get_metrics()
+        Returns the metrics of every waveform in the collection, without their data
+    plot_all(directory, num_periods=None, showstats=True, fullheight=False, figsize=(8,4), extension='png')
+        Saves the plot of every waveform in the collection to a directory
     """
 
-    def __init__(self, path):
+    def __init__(self, path, memory_budget=None, spill_dir:str=None, adaptive:bool=False, **kwargs):
         """Initializes this WaveformCollection
 
         Parameters
         ----------
         path : str
             The path to the directory where the waveform CSVs are located
+        memory_budget : int or str or None
+            If specified, the maximum bytes held by the data and one period of the waveforms,
+            e.g. '2GB'. The least recently used arrays are evicted, and reloaded when needed.
+            The metrics are always kept. If None, every array stays in memory
+        spill_dir : str or None
+            If specified with memory_budget, evicted arrays are saved to this directory and
+            reloaded from it. If None, they are recomputed from the CSV files
+        adaptive : bool
+            If True, waveforms are estimated from decimated data, and only analyzed with the
+            pipeline when the estimate is too close to a compliance threshold (see adaptive_import)
+        **kwargs
+            The options of the import, passed to batch_import (or adaptive_import): profiler,
+            pipeline, timeout, quarantine, prefetcher, dedupe, stacked, progress and workers.
+            e.g. WaveformCollection(path, pipeline=FAST_PIPELINE, workers=4)
         """
 
-        self.waveforms = import_directory(path)
+        self.profiler = kwargs.get('profiler')
+        self.budget = None if memory_budget is None else MemoryBudget(memory_budget, spill_dir)
+        self.escalated = None
+        self.prefetcher = kwargs.get('prefetcher')
+        self.progress = kwargs.get('progress')
+        if adaptive:
+            (self.waveforms, self.failures, self.escalated) = adaptive_import(path, budget=self.budget, **kwargs)
+        else:
+            (self.waveforms, self.failures) = batch_import(path, budget=self.budget, **kwargs)
+        _print_failures(self.failures)
         self.names = get_names_in_waveform_list(self.waveforms)
+        self.aliases = {a: w.get_name() for w in self.waveforms for a in w.aliases.values()}
+        self._similarity = None
+
+
+    def reanalyze(self, pipeline):
+        """Recomputes every Waveform in the collection with a different pipeline
+
+        Stages that are unchanged from the previous pipeline (and everything upstream of them)
+        are not recomputed.
+
+        Parameters
+        ----------
+        pipeline : Pipeline
+            The analysis pipeline to run
+        """
+
+        for w in self.waveforms:
+            try:
+                w.reanalyze(pipeline)
+            except Exception as e:
+                print('WARNING: Could not reanalyze waveform ' + w.get_name())
+                print(e)
+        self._similarity = None
+
+
+    def get_stats(self):
+        """Returns the profiling statistics of all the imports in the collection
+
+        Returns
+        -------
+        ProfileStats or None
+            The statistics per stage and per file, or None if no Profiler was specified
+        """
+
+        if self.profiler is None:
+            return None
+        return self.profiler.get_stats()
 
 
     def get_names(self) -> list:
@@ -624,7 +1338,7 @@ class WaveformCollection():
         Parameters
         ----------
         name : str
-            The name of the Waveform
+            The name of the Waveform, or of a file with the same contents (see aliases)
 
         Returns
         -------
@@ -632,46 +1346,280 @@ class WaveformCollection():
             The Waveform object
         """
 
+        name = self.aliases.get(name, name)
         for w in self.waveforms:
             if w.get_name() == name:
                 return w
 
 
-def import_waveform_csv(filename:str) -> np.ndarray:
-    """Imports a waveform from a CSV file, typically produced by an oscilloscope
+    def explore(self, **kwargs):
+        """Displays an interactive explorer of the waveforms in a notebook
 
-    NOTE: Format should be [time(seconds), volts] and header info should be removed
+        Requires ipywidgets. See explorer.explore for the keyword arguments
 
-    Parameters
-    ----------
-    filename : str
-        The name of the CSV file
+        Returns
+        -------
+        WaveformExplorer
+            The explorer
+        """
 
-    Returns
-    -------
-    ndarray
-        A 2D numpy array in the format [time(seconds), volts]    
-    """
+        from .explorer import explore
 
-    # Import from the file
-    data = np.genfromtxt(filename, delimiter=',', dtype=None)
+        return explore(self, **kwargs)
 
-    # Set the time axis to 0
-    t_0 = data[0,0]
-    data[:,0] -= t_0 
 
-    return data
+    def get_similarity_index(self) -> FingerprintIndex:
+        """Returns the nearest-neighbour index of the shape fingerprints of the waveforms
 
+        The index is built on first use, from the fingerprints of the waveforms that were
+        analyzed (see Waveform.get_fingerprint)
 
-def import_directory(dir:str) -> list:
-    """Imports all valid waveforms from the CSV files in the directory (and subdirectories)
+        Returns
+        -------
+        FingerprintIndex
+            The index, by waveform name
+        """
 
-    NOTE: For each file, format should be [time(seconds), volts] and header info should be removed
+        if self._similarity is None:
+            found = [w for w in self.waveforms if w.period is not None]
+            self._similarity = FingerprintIndex([w.get_name() for w in found], [w.get_fingerprint() for w in found])
+        return self._similarity
 
-    Parameters
-    ----------
-    dir : str
+
+    def similar(self, waveform, k:int=5) -> list:
+        """Finds the waveforms whose period shape is most similar to a waveform
+
+        Parameters
+        ----------
+        waveform : str or Waveform
+            The name of a waveform in the collection, or any analyzed Waveform
+        k : int
+            The number of waveforms to return
+
+        Returns
+        -------
+        list
+            (name, distance) of the k most similar waveforms, most similar first. The distance
+            is the RMS difference between the normalized period shapes, from 0 to 2. The
+            waveform itself is left out
+        """
+
+        if isinstance(waveform, str):
+            w = self.get(waveform)
+            if w is None:
+                raise ValueError('No waveform named ' + repr(waveform) + ' in the collection')
+            waveform = w
+        if waveform.period is None:
+            raise ValueError('Waveform ' + repr(waveform.get_name()) + ' has no shape fingerprint')
+
+        return self.get_similarity_index().query(waveform.get_fingerprint(), k=k, exclude=waveform.get_name())
+
+
+    def get_metrics(self) -> list:
+        """Returns the metrics of every waveform in the collection, without their data
+
+        Returns
+        -------
+        list
+            A WaveformMetrics for each waveform. Use metrics.to_columns to get one array
+            per metric
+        """
+
+        return [WaveformMetrics.from_waveform(w) for w in self.waveforms]
+
+
+    def plot_all(self, directory:str, num_periods:int=None, showstats:bool=True, fullheight:bool=False,
+                 figsize:tuple=(8,4), extension:str='png', progress=None) -> list:
+        """Saves the plot of every waveform in the collection to a directory
+
+        The plots are not shown. Waveforms that cannot be plotted are skipped with a warning
+
+        Parameters
+        ----------
+        directory : str
+            The directory to save the plots in, as '<name>.<extension>'. Created if needed
+        num_periods : int or None
+            The number of periods to plot. If None, will show the whole waveform
+        showstats : bool
+            If True, will show the flicker frequency, percent, and index on the plots
+        fullheight : bool
+            If True, will set the Y axis limits from 0 to 1
+        figsize : tuple
+            The (x,y) size of the figures
+        extension : str
+            The image format, e.g. 'png' or 'pdf'
+        progress : ProgressTracker or None
+            If specified, every plot is reported to this ProgressTracker as a 'plot' run. If
+            None, the ProgressTracker of the collection is used, if any
+
+        Returns
+        -------
+        list
+            The files saved
+        """
+
+        import matplotlib.pyplot as plt
+        from .plot import waveform_graph
+
+        if progress is None:
+            progress = self.progress
+        makedirs(directory, exist_ok=True)
+
+        saved = []
+        if progress is not None:
+            progress.start(len(self.waveforms), 'plot')
+        for w in self.waveforms:
+            filename = os_path.join(directory, w.get_name() + '.' + extension)
+            if progress is not None:
+                progress.file_started(filename)
+            try:
+                with profile_stage(self.profiler, 'plot', w.get_name()):
+                    waveform_graph(waveform=w, num_periods=num_periods, filename=filename, showstats=showstats,
+                                   fullheight=fullheight, figsize=figsize, suppress=True)
+            except Exception as e:
+                print('WARNING: Could not plot waveform ' + w.get_name())
+                print(e)
+                error = e
+            else:
+                saved.append(filename)
+                error = None
+            finally:
+                plt.close()
+            if progress is not None:
+                progress.file_finished(filename, error=error, samples=0 if error else w.num_samples)
+        if progress is not None:
+            progress.finish()
+
+        return saved
+
+
+def import_waveform_csv(filename:str) -> np.ndarray:
+    """Imports a waveform from a CSV file, typically produced by an oscilloscope
+
+    NOTE: Format should be [time(seconds), volts] and header info should be removed
+
+    Parameters
+    ----------
+    filename : str
+        The name of the CSV file
+
+    Returns
+    -------
+    ndarray
+        A 2D numpy array in the format [time(seconds), volts]    
+    """
+
+    # Import from the file
+    data = np.genfromtxt(filename, delimiter=',', dtype=None)
+
+    # Set the time axis to 0
+    t_0 = data[0,0]
+    data[:,0] -= t_0 
+
+    return data
+
+
+def as_waveform_data(array, framerate:int=None) -> np.ndarray:
+    """Converts an in-memory array to the [time(seconds), volts] waveform format
+
+    Parameters
+    ----------
+    array : ndarray or array-like
+        Either a 2D array in the format [time(seconds), volts], or a 1D array of volts
+    framerate : int or None
+        The number of samples per second, used to generate the time axis of 1D arrays
+
+    Returns
+    -------
+    ndarray
+        A 2D numpy array in the format [time(seconds), volts]. A 2D float64 input is returned
+        as is, without a copy
+    """
+
+    array = np.asarray(array, dtype=np.float64)
+
+    if array.ndim == 2 and array.shape[1] == 2:
+        return array
+
+    if array.ndim != 1:
+        raise ValueError('Expected a 1D array of volts or a 2D [time, volts] array, got shape ' + str(array.shape))
+    if framerate is None:
+        raise ValueError('framerate is required for a 1D array of volts')
+
+    data = np.empty((len(array), 2))
+    data[:,0] = np.arange(len(array)) / framerate
+    data[:,1] = array
+    return data
+
+
+def import_multichannel_csv(filename:str) -> tuple:
+    """Imports a multi-channel waveform from a CSV file in a single pass
+
+    Header lines in the 'Key:Value,' format of oscilloscope exports (see CSVs/info.csv) and a
+    row of column names are allowed. Columns whose names contain 'time' are time columns; the
+    channels of a capture share a time base, so only the first one is kept. Without column
+    names, the first column is time and every other column is a channel.
+
+    Parameters
+    ----------
+    filename : str
+        The name of the CSV file
+
+    Returns
+    -------
+    tuple
+        (A 2D numpy array in the format [time(seconds), channel 1 volts, channel 2 volts, ...],
+         the channel names as a list,
+         the header as a dict)
+    """
+
+    (header, columns, skiprows) = read_scope_header(filename)
+
+    if columns:
+        time_cols = [i for i, c in enumerate(columns) if 'time' in c.lower()]
+        time_col = time_cols[0] if time_cols else 0
+        channel_cols = [i for i in range(len(columns)) if i not in time_cols and i != time_col]
+        names = [columns[i].split('(')[0].replace('_value', '') for i in channel_cols]
+    else:
+        with open(filename, 'r', encoding='utf-8-sig') as f:
+            for _ in range(skiprows):
+                next(f)
+            num_cols = len(next(f).strip().rstrip(',').split(','))
+        time_col = 0
+        channel_cols = list(range(1, num_cols))
+        names = ['ch' + str(i) for i in channel_cols]
+
+    # Parse only the time column and the channel columns, straight into one array
+    data = np.loadtxt(filename, delimiter=',', skiprows=skiprows, usecols=[time_col] + channel_cols,
+                      encoding='utf-8-sig', ndmin=2)
+
+    # Set the time axis to 0
+    data[:,0] -= data[0,0]
+
+    return (data, names, header)
+
+
+def import_directory(dir:str, profiler=None, pipeline=None, budget=None, workers:int=None) -> list:
+    """Imports all valid waveforms from the CSV files in the directory (and subdirectories)
+
+    NOTE: For each file, format should be [time(seconds), volts] and header info should be removed.
+    A warning is printed for every file that cannot be imported; see batch_import to get
+    the failures instead
+
+    Parameters
+    ----------
+    dir : str
         The path to the directory
+    profiler : Profiler or None
+        If specified, the time and memory used by each step will be recorded by this Profiler
+    pipeline : Pipeline or None
+        The analysis pipeline to run on each waveform. If None, FULL_PIPELINE is used
+    budget : MemoryBudget or None
+        If specified, each waveform is added to this budget as it is imported, so the arrays
+        of earlier waveforms are evicted as needed during the import
+    workers : int or None
+        If specified, files are imported and analyzed by this many worker processes, which
+        pass the data back through shared memory (see batch_import)
 
     Returns
     -------
@@ -679,19 +1627,334 @@ def import_directory(dir:str) -> list:
         A list of the Waveform objects imported    
     """
 
-    # Get all the files in this directory (including subdirectories)
-    (filenames, paths) = get_files_in_directory(dir)
+    (waveforms, failures) = batch_import(dir, profiler=profiler, pipeline=pipeline, budget=budget,
+                                         workers=workers)
+    _print_failures(failures)
+
+    return waveforms
+
+
+def batch_import(paths, profiler=None, pipeline=None, budget=None, timeout:float=None,
+                 quarantine=None, prefetcher=None, dedupe:bool=False, stacked:bool=False,
+                 progress=None, workers:int=None) -> tuple:
+    """Imports many waveforms, keeping going when files fail
+
+    With a prefetcher, the import stage of upcoming files runs on its thread pool while the
+    current file is analyzed, so reading and parsing overlap with the analysis.
+
+    With dedupe, files with identical contents are analyzed once (see batch.find_duplicates):
+    only the first of them is imported, and the others are recorded in its aliases.
+
+    With stacked, files are imported stacked.STACK_SIZE at a time, and the denoise, framerate, v_stats,
+    frequency and percent_flicker stages of files with the same length and frame rate run on
+    one 2D array (see stacked.py). Only stages that are the same as in FULL_PIPELINE are
+    stacked; the other stages run per file.
+
+    With workers, files are imported and analyzed on a pool of worker processes. The data of
+    each file is passed back through shared memory rather than pickled (see shared.py).
+
+    Parameters
+    ----------
+    paths : str or list
+        The path to a directory (including subdirectories), or a list of file paths.
+        Each waveform is named after its file (see get_waveform_name)
+    profiler : Profiler or None
+        If specified, the time and memory used by each step will be recorded by this Profiler
+    pipeline : Pipeline or None
+        The analysis pipeline to run on each waveform. If None, FULL_PIPELINE is used
+    budget : MemoryBudget or None
+        If specified, each waveform is added to this budget as it is imported
+    timeout : float or None
+        If specified, files that take longer than this many seconds to analyze are given up
+        on. With workers, the worker processes are terminated, so the analysis stops (see
+        shared.analyze_in_processes). Otherwise the analysis of the file cannot be stopped:
+        it keeps running in a background thread, holding its memory, while the next files
+        are imported (see batch.run_with_timeout)
+    quarantine : Quarantine or None
+        If specified, files in the quarantine are skipped without being parsed, and files that
+        fail with a parse or analysis error are added to it and saved. Timeouts and transient
+        errors are not quarantined (see batch.should_quarantine)
+    prefetcher : Prefetcher or None
+        If specified, files are imported ahead of the analysis by this Prefetcher (see
+        prefetch.py). The timeout applies to the analysis only. Ignored if the pipeline
+        has no import stage
+    dedupe : bool
+        If True, duplicate files are not analyzed; each is added to the aliases of the
+        waveform of the first file with the same contents. If that file fails, its
+        duplicates are reported as failing too
+    stacked : bool
+        If True, groups of equal-length files are analyzed together. The results match the
+        per-file analysis to floating-point rounding. Ignored if the pipeline has no import stage
+    progress : ProgressTracker or None
+        If specified, the start and end of every analyzed file are reported to this
+        ProgressTracker (see progress.py), as an 'import' run
+    workers : int or None
+        If specified, the number of worker processes analyzing files at once. The profiler
+        does not record the stages run by the workers, and the prefetcher and stacked are
+        ignored. Ignored if the pipeline has no import stage
+
+    Returns
+    -------
+    tuple
+        (a list of the Waveform objects imported,
+         a list of ImportFailure, one per file that failed or was skipped)
+    """
+
+    if pipeline is None:
+        pipeline = FULL_PIPELINE
+
+    if isinstance(paths, str):
+        (filenames, paths) = get_files_in_directory(paths)
+    else:
+        filenames = [get_waveform_name(p) for p in paths]
 
-    # Import the waveforms
     waveforms = []
-    for i, f in enumerate(filenames):
-        w = Waveform(paths[i], f)
-        if w is not None:
+    failures = []
+
+    # Skip quarantined files before anything is read
+    names = {}
+    for (f, p) in zip(filenames, paths):
+        try:
+            entry = quarantine.get(p) if quarantine is not None else None
+        except Exception as e:
+            failures.append(ImportFailure(p, None, e, False))
+            continue
+        if entry is not None:
+            failures.append(ImportFailure(p, entry['stage'], entry['error'], True))
+        else:
+            names[p] = f
+
+    # Analyze each capture once, recording its duplicates as aliases
+    duplicates = find_duplicates(list(names)) if dedupe else {}
+    aliases = {}
+    for (alias, p) in duplicates.items():
+        aliases.setdefault(p, []).append(alias)
+    todo = [p for p in names if p not in duplicates]
+
+    stacked = stacked and 'import' in pipeline
+    if 'import' in pipeline:
+        import_stage = pipeline.get_stage('import')
+        def load(p):
+            try:
+                with profile_stage(profiler, 'import', p):
+                    return import_stage.run({'filename': p})
+            except Exception as e:
+                raise StageError('import', p, e) from e
+        def load_now(p):
+            try:
+                return (p, load(p), None)
+            except StageError as e:
+                return (p, None, e)
+
+    parallel = workers is not None and 'import' in pipeline
+    if parallel:
+        loaded = None
+    elif prefetcher is not None and 'import' in pipeline:
+        loaded = prefetcher.map(todo, load)
+    elif stacked:
+        loaded = (load_now(p) for p in todo)
+    else:
+        loaded = ((p, None, None) for p in todo)
+
+    # Analyze in worker processes, analyze equal-length files in stacks, or preload the
+    # import stage alone
+    if parallel:
+        prefetcher = None
+        loaded = analyze_in_processes(todo, pipeline, workers, timeout=timeout)
+    elif stacked:
+        stages = stacked_stages(pipeline)
+        window_length = pipeline.get_stage('denoise').params.get('window_length', 901) \
+            if 'denoise' in stages else 901
+        loaded = stacked_outputs(loaded, stages, window_length, profiler=profiler)
+    else:
+        loaded = ((p, None if o is None else {'import': o}, e) for (p, o, e) in loaded)
+
+    if progress is not None:
+        progress.start(len(todo), 'import', prefetcher if 'import' in pipeline else None)
+
+    for (p, preloaded, error) in loaded:
+        if progress is not None:
+            progress.file_started(p)
+        try:
+            if error is not None:
+                raise error
+
+            cache = {}
+            for (stage, outputs) in (preloaded or {}).items():
+                pipeline.preload(cache, {'filename': p}, stage, outputs)
+            w = run_with_timeout(Waveform.from_inputs, timeout, {'filename': p}, names[p], filename=p,
+                                 profiler=profiler, pipeline=pipeline, cache=cache)
+        except StageError as e:
+            failure = ImportFailure(p, e.stage, e.error, False)
+        except ImportTimeout as e:
+            failure = ImportFailure(p, 'timeout', e, False)
+        except Exception as e:
+            failure = ImportFailure(p, None, e, False)
+        else:
+            w.aliases = {a: names[a] for a in aliases.get(p, [])}
             waveforms.append(w)
+            if progress is not None:
+                progress.file_finished(p, samples=w.num_samples)
+            if budget is not None:
+                budget.add(w)
+            continue
+
+        _record_failure(failure, aliases.get(p, []), failures, quarantine)
+        if progress is not None:
+            progress.file_finished(p, error=failure.error)
+
+    if quarantine is not None:
+        quarantine.save()
+    if progress is not None:
+        progress.finish()
+
+    return (waveforms, failures)
+
+
+def adaptive_import(paths, profiler=None, pipeline=None, budget=None, timeout:float=None,
+                    quarantine=None, prefetcher=None, dedupe:bool=False, stacked:bool=False,
+                    progress=None, workers:int=None) -> tuple:
+    """Imports many waveforms, running the full pipeline only near compliance thresholds
+
+    Every waveform is first analyzed with ESTIMATE_PIPELINE. If the verdicts of every standard
+    are the same over the bounds of its estimate, the estimate is kept. Short captures (such as
+    the 28 ms sample CSVs) are always escalated, so this is only faster than batch_import for
+    long captures away from the thresholds (see adaptive.py). Otherwise the waveform
+    is escalated: it is reanalyzed with the full pipeline, reusing the imported data.
+    Escalated waveforms have escalated = True. The reanalysis is given the same timeout, and its
+    failures are recorded and quarantined in the same way, as the estimates.
+
+    Parameters
+    ----------
+    paths : str or list
+        The path to a directory (including subdirectories), or a list of file paths
+    profiler : Profiler or None
+        If specified, the time and memory used by each step will be recorded by this Profiler
+    pipeline : Pipeline or None
+        The pipeline escalated waveforms are reanalyzed with. If None, FULL_PIPELINE is used
+    budget : MemoryBudget or None
+        If specified, each waveform is added to this budget as it is imported
+    timeout : float or None
+        If specified, files that take longer than this many seconds to estimate, or to reanalyze
+        when escalated, are given up on
+    quarantine : Quarantine or None
+        If specified, files in the quarantine are skipped, and files whose estimate or
+        reanalysis fails with a deterministic error are added to it
+    prefetcher : Prefetcher or None
+        If specified, files are imported ahead of the estimates by this Prefetcher
+    dedupe : bool
+        If True, files with the same contents are analyzed once (see batch_import)
+    stacked : bool
+        If True, the v_stats of equal-length files are computed together (see batch_import)
+    progress : ProgressTracker or None
+        If specified, the estimates of every file are reported to this ProgressTracker
+    workers : int or None
+        If specified, the number of worker processes estimating files at once. Escalated
+        waveforms are reanalyzed in this process
+
+    Returns
+    -------
+    tuple
+        (a list of the Waveform objects imported,
+         a list of ImportFailure, one per file that failed or was skipped,
+         the number of waveforms that were escalated to the full pipeline)
+    """
+
+    if pipeline is None:
+        pipeline = FULL_PIPELINE
+
+    (estimated, failures) = batch_import(paths, profiler=profiler, pipeline=ESTIMATE_PIPELINE,
+                                         budget=budget, timeout=timeout, quarantine=quarantine,
+                                         prefetcher=prefetcher, dedupe=dedupe, stacked=stacked,
+                                         progress=progress, workers=workers)
+
+    waveforms = []
+    escalated = 0
+    for w in estimated:
+        w.escalated = not verdicts_constant(w.frequency_bounds, w.percent_flicker_bounds)
+        if not w.escalated:
+            waveforms.append(w)
+            continue
+
+        escalated += 1
+        try:
+            run_with_timeout(w.reanalyze, timeout, pipeline)
+        except StageError as e:
+            failure = ImportFailure(w.filename, e.stage, e.error, False)
+        except ImportTimeout as e:
+            failure = ImportFailure(w.filename, 'timeout', e, False)
+        except Exception as e:
+            failure = ImportFailure(w.filename, None, e, False)
+        else:
+            waveforms.append(w)
+            continue
+
+        if budget is not None:
+            budget.remove(w)
+        _record_failure(failure, list(w.aliases), failures, quarantine)
+
+    if quarantine is not None:
+        quarantine.save()
+
+    return (waveforms, failures, escalated)
+
+
+def stacked_stages(pipeline) -> tuple:
+    """Gets the stages of a pipeline that can be computed for a stack of files at once
+
+    A stage is stacked if it is the same as in FULL_PIPELINE (the denoise stage may have a
+    different window length), and its inputs come from the import stage or other stacked
+    stages
+
+    Parameters
+    ----------
+    pipeline : Pipeline
+        The analysis pipeline
+
+    Returns
+    -------
+    tuple
+        The names of the stacked stages (see stacked.analyze_stack)
+    """
+
+    stages = []
+    producers = {}
+    for s in pipeline:
+        if s.name in STACKED_STAGES:
+            ref = FULL_PIPELINE.get_stage(s.name)
+            params = set(s.params) - {'window_length'} if s.name == 'denoise' else set(s.params)
+            if s.func is ref.func and s.inputs == ref.inputs and s.outputs == ref.outputs and \
+                    not params and all(producers.get(i) in stages + ['import'] for i in s.inputs):
+                stages.append(s.name)
+        for o in s.outputs:
+            producers[o] = s.name
+
+    return tuple(stages)
+
+
+def _record_failure(failure, aliases:list, failures:list, quarantine=None):
+    """Records the failure of a file and of its duplicates, quarantining them if the error is deterministic"""
+
+    for f in [failure] + [failure._replace(path=a) for a in aliases]:
+        failures.append(f)
+        if quarantine is not None and should_quarantine(f):
+            try:
+                quarantine.add(f)
+            except OSError:
+                pass
+
+
+def _print_failures(failures:list):
+    """Prints a warning for every failed import, as the Waveform constructor does"""
+
+    for failure in failures:
+        print('WARNING: Could not import waveform at file location ' + failure.path)
+        if failure.quarantined:
+            print('Quarantined: stage ' + str(failure.stage) + ': ' + str(failure.error))
+        else:
+            print(failure.error)
 
-    return waveforms
 
-    
 def get_files_in_directory(dir:str) -> tuple:
     """Gets the paths and filenames of all files in the directory (and subdirectories)
 
@@ -720,15 +1983,31 @@ def get_files_in_directory(dir:str) -> tuple:
             if f[0] is not '.':
                 # Append the file with its path
                 paths.append(dirpath + f)
-
-                # Format the string to remove the format and underscores
-                f = f.split('.')[0]
-                f = f.replace('_', ' ')
-                names.append(f)
+                names.append(get_waveform_name(f))
                 
     return (names, paths)
 
 
+def get_waveform_name(path:str) -> str:
+    """Formats the name of a file as the name of its waveform
+
+    Parameters
+    ----------
+    path : str
+        The path to the file, or its file name
+
+    Returns
+    -------
+    str
+        The file name with its extension removed and underscores replaced by spaces,
+        e.g. 'Soraa Healthy' for 'CSVs/Soraa_Healthy.csv'
+    """
+
+    # Format the string to remove the format and underscores
+    f = os_path.basename(path).split('.')[0]
+    return f.replace('_', ' ')
+
+
 def get_names_in_waveform_list(waveform_list) -> list:
     """Gets the names of all Waveform objects in a list of Waveforms
 
@@ -789,6 +2068,27 @@ def framerate(data:np.ndarray) -> int:
     return int(round(1/(data[1,0]-data[0,0])))
 
 
+def v_stats(data:np.ndarray) -> tuple:
+    """Gets the voltage statistics of the data
+
+    Parameters
+    ----------
+    data : ndarray
+        The waveform data as a 2D array
+
+    Returns
+    -------
+    tuple
+        (v_max, v_min, v_pp, v_avg), where v_avg is the mean of v_max and v_min
+    """
+
+    (v_min, v_max) = kernels.minmax(data[:,1])
+    v_pp = v_max - v_min
+    v_avg = np.mean([v_max, v_min])
+
+    return (v_max, v_min, v_pp, v_avg)
+
+
 def find_nearest_idx(array:np.ndarray, value:float) -> int:
     """Finds the index of the nearest value in an array
 
@@ -812,7 +2112,10 @@ def find_nearest_idx_rising(array:np.ndarray, value:float) -> int:
     """Finds the closest rising-edge value in a 1D array
     
     This function is primarily used to find the start of a period.
-    It recursively calls find_nearest_index()
+    It finds the index nearest to the value and, if it is not on a rising edge, 
+    continues the search in the rest of the array after that index
+
+    NOTE: The index is relative to the start of the last search, not to the start of the array
 
     Parameters
     ----------
@@ -824,20 +2127,21 @@ def find_nearest_idx_rising(array:np.ndarray, value:float) -> int:
     Returns
     -------
     int
-        The first index of the array value that is both closest to the search value and on a rising edge
+        The index of the array value that is both closest to the search value and on a rising edge,
+        relative to the start of the last search
     """
 
-    idx = find_nearest_idx(array, value)
+    # Search the rest of the array until a rising edge is found (iteratively, as recursing
+    # could exceed the recursion limit on long captures)
+    while True:
+        idx = find_nearest_idx(array, value)
 
-    if array[idx] > array[idx-1] and array[idx] < array[idx+1]:
-        # Got a rising edge, return
-        return idx
-    else:
-        # Slice the array so we can find the next index
-        new_array = array[idx+1:]
+        if array[idx] > array[idx-1] and array[idx] < array[idx+1]:
+            # Got a rising edge, return
+            return idx
 
-        # Recursively run this function until a rising edge is found
-        return find_nearest_idx_rising(new_array, value)
+        # Slice the array so we can find the next index
+        array = array[idx+1:]
 
 
 def frequency(data:np.ndarray, framerate:int, v_avg:float) -> float:
@@ -860,11 +2164,27 @@ def frequency(data:np.ndarray, framerate:int, v_avg:float) -> float:
         The frequency in Hertz
     """
 
-    # Center the data vertically on zero
-    zdata = data[:,1] - v_avg
+    # Count the crossings of v_avg (the zero crossings of the vertically centered data)
+    zero_crossings = kernels.crossings(data[:,1], v_avg)
 
-    # Count the zero crossings
-    zero_crossings = np.where(np.diff(np.sign(zdata)))[0]
+    return frequency_from_crossings(zero_crossings, framerate)
+
+
+def frequency_from_crossings(zero_crossings:np.ndarray, framerate:int) -> float:
+    """Estimates the dominant frequency from the crossings of v_avg
+
+    Parameters
+    ----------
+    zero_crossings : ndarray
+        The indices of the samples after which the waveform crosses v_avg
+    framerate : int
+        The frame rate (samples per second)
+
+    Returns
+    -------
+    float
+        The frequency in Hertz
+    """
 
     # Estimate the frequency
     est_freq = round(framerate / np.mean(np.diff(zero_crossings)) / 2)
@@ -876,6 +2196,69 @@ def frequency(data:np.ndarray, framerate:int, v_avg:float) -> float:
     return est_freq
 
 
+def capture_frequency(data, framerate:int, v_avg:float) -> float:
+    """Calculates the dominant frequency of a binary ScopeCapture
+
+    Same as frequency(), but the crossings are found on the ADC codes, in chunks
+
+    Parameters
+    ----------
+    data : ScopeCapture
+        The capture
+    framerate : int
+        The frame rate (samples per second)
+    v_avg : float
+        The average voltage
+
+    Returns
+    -------
+    float
+        The frequency in Hertz
+    """
+
+    return frequency_from_crossings(capture_crossings(data, v_avg), framerate)
+
+
+def archive_frequency(data, framerate:int, v_avg:float) -> float:
+    """Calculates the dominant frequency of a WaveformArchive
+
+    Same as frequency(), but the crossings are found one chunk at a time
+
+    Parameters
+    ----------
+    data : WaveformArchive
+        The archive
+    framerate : int
+        The frame rate (samples per second)
+    v_avg : float
+        The average voltage
+
+    Returns
+    -------
+    float
+        The frequency in Hertz
+    """
+
+    return frequency_from_crossings(archive_crossings(data, v_avg), framerate)
+
+
+def period(frequency:float) -> float:
+    """Gets the period of the waveform
+
+    Parameters
+    ----------
+    frequency : float
+        The frequency in Hertz
+
+    Returns
+    -------
+    float
+        The period in seconds
+    """
+
+    return 1 / frequency
+
+
 def percent_flicker(v_max:float, v_pp:float) -> float:
     """Computes the flicker percentage of the waveform
 
@@ -911,15 +2294,12 @@ def flicker_index(one_period:np.ndarray, v_avg:float) -> float:
         The flicker index
     """
 
-    # Split the curve across the average
-    curve_top = [i if i > v_avg else v_avg for i in one_period[:,1]]
-
-    # Subtract the average from the top curve
-    curve_top = curve_top - v_avg
+    # Split the curve across the average, and subtract the average from the top curve
+    curve_top = kernels.clip_above(one_period[:,1], v_avg)
 
     # Get the area under the curve for the top and all using Simpson's rule
-    area_top = simps(curve_top)
-    area_all = simps(one_period[:,1])
+    area_top = simpson(curve_top)
+    area_all = simpson(one_period[:,1])
 
     # Return the flicker index 
     return area_top / area_all
@@ -928,6 +2308,10 @@ def flicker_index(one_period:np.ndarray, v_avg:float) -> float:
 def n_periods(data:np.ndarray, v_avg:float, period:float, num_periods:int=1) -> np.ndarray:
     """Truncates a waveform to n periods
 
+    The periods start at the first upward crossing of v_avg that leaves room after it for all
+    of the periods, so that the slice is not cut short at the end of the capture. If the
+    capture is too short for that, they start at the first upward crossing.
+
     NOTE: The number of periods must be shorter than the input waveform
 
     Parameters
@@ -947,18 +2331,18 @@ def n_periods(data:np.ndarray, v_avg:float, period:float, num_periods:int=1) ->
         The waveform truncated to the specified number of periods    
     """
 
-    # Slice the array to the first period (so we can find the rising edge average)
-    data = np.copy(data)
+    # Get the number of samples in one period
     t_0 = data[0,0]
     delta = data[1,0] - t_0
     idx_1 = int(period / delta)
-    t_1 = data[idx_1,0]
-    
-    # Find the first instance of the average
-    idx_avg = find_nearest_idx_rising(data[:,1], v_avg)
 
-    # Slice the array to the number of periods
-    out = data[idx_avg:idx_avg+num_periods*idx_1,:]
+    # Find the first rising crossing of the average that leaves room for the periods
+    rising = _rising_crossings(data[:,1], v_avg)
+    room = rising[rising <= len(data) - num_periods*idx_1]
+    idx_avg = room[0] if len(room) else rising[0]
+
+    # Slice the array to the number of periods, copying only the slice
+    out = np.copy(data[idx_avg:idx_avg+num_periods*idx_1,:])
 
     # Make the time series start at 0
     min_val = out[0,0]
@@ -967,6 +2351,56 @@ def n_periods(data:np.ndarray, v_avg:float, period:float, num_periods:int=1) ->
     return out
 
 
+def _rising_crossings(volts:np.ndarray, v_avg:float) -> np.ndarray:
+    """Returns the first sample after every upward crossing of v_avg
+
+    Raises ValueError if the waveform never crosses v_avg upwards
+    """
+
+    crossings = kernels.crossings(volts, v_avg)
+    rising = crossings[volts[crossings + 1] > volts[crossings]] + 1
+    if len(rising) == 0:
+        raise ValueError('No rising edge found near ' + str(v_avg))
+    return rising
+
+
+def capture_n_periods(data, v_avg:float, period:float, num_periods:int=1) -> np.ndarray:
+    """Gets n periods from the start of a binary ScopeCapture
+
+    Like n_periods(), but only the first num_periods + 2 periods are converted to volts, so the
+    periods always start at the first upward crossing of v_avg. Unlike the nearest sample on a
+    strictly rising edge, the crossing also exists in quantized ADC data that has not been
+    denoised
+
+    Parameters
+    ----------
+    data : ScopeCapture
+        The capture
+    v_avg : float
+        The average voltage
+    period : float
+        The period in seconds
+    num_periods : int
+        The number of periods to return
+
+    Returns
+    -------
+    ndarray
+        The waveform truncated to the specified number of periods
+    """
+
+    idx_1 = int(period * data.framerate)
+    window = data[:min(len(data), (num_periods + 2) * idx_1 + 1),:]
+
+    idx_avg = _rising_crossings(window[:,1], v_avg)[0]
+    out = window[idx_avg:idx_avg+num_periods*idx_1,:]
+
+    # Make the time series start at 0
+    out[:,0] -= out[0,0]
+
+    return out
+
+
 def extrapolate(one_period:np.ndarray, v_pp:float, framerate:int, time_ms:int=None) -> tuple:
 
     if time_ms is None:
@@ -992,3 +2426,72 @@ def extrapolate(one_period:np.ndarray, v_pp:float, framerate:int, time_ms:int=No
         out_array = np.vstack((out_array, new_period))  
 
     return (out_array, num_periods)
+
+
+FULL_PIPELINE = Pipeline([
+    Stage('import', import_waveform_csv, ('filename',), ('data',)),
+    Stage('denoise', denoise, ('data',), ('data',)),
+    Stage('framerate', framerate, ('data',), ('framerate',)),
+    Stage('v_stats', v_stats, ('data',), ('v_max', 'v_min', 'v_pp', 'v_avg')),
+    Stage('frequency', frequency, ('data', 'framerate', 'v_avg'), ('frequency',)),
+    Stage('period', period, ('frequency',), ('period',)),
+    Stage('one_period', n_periods, ('data', 'v_avg', 'period'), ('one_period',)),
+    Stage('flicker_index', flicker_index, ('one_period', 'v_avg'), ('flicker_index',)),
+    Stage('percent_flicker', percent_flicker, ('v_max', 'v_pp'), ('percent_flicker',)),
+    Stage('standards', evaluate_standards, ('frequency', 'percent_flicker'),
+          ('ieee_1789_2015', 'well_standard_v2', 'california_ja8_2019')),
+], name='full')
+
+FAST_PIPELINE = FULL_PIPELINE.without('denoise', 'flicker_index', new_name='fast')
+
+PERIOD_STATS_PIPELINE = FULL_PIPELINE \
+    .insert(Stage('fingerprint', shape_fingerprint, ('one_period',), ('fingerprint',)), after='flicker_index') \
+    .insert(Stage('period_stats', period_stats, ('data', 'v_avg', 'v_pp', 'framerate'),
+                  ('period_starts', 'period_metrics', 'period_stats')), after='fingerprint', new_name='period stats')
+
+SCREENING_PIPELINE = Pipeline([
+    Stage('import', import_waveform_csv, ('filename',), ('data',)),
+    Stage('framerate', framerate, ('data',), ('framerate',)),
+    Stage('v_stats', v_stats, ('data',), ('v_max', 'v_min', 'v_pp', 'v_avg')),
+    Stage('screen', screen, ('data', 'framerate'), ('frequency', 'percent_flicker')),
+    Stage('period', period, ('frequency',), ('period',)),
+    Stage('standards', evaluate_standards, ('frequency', 'percent_flicker'),
+          ('ieee_1789_2015', 'well_standard_v2', 'california_ja8_2019')),
+], name='screening')
+
+ESTIMATE_PIPELINE = Pipeline([
+    Stage('import', import_waveform_csv, ('filename',), ('data',)),
+    Stage('framerate', framerate, ('data',), ('framerate',)),
+    Stage('v_stats', v_stats, ('data',), ('v_max', 'v_min', 'v_pp', 'v_avg')),
+    Stage('estimate', estimate, ('data', 'framerate'),
+          ('frequency', 'percent_flicker', 'frequency_bounds', 'percent_flicker_bounds')),
+    Stage('period', period, ('frequency',), ('period',)),
+    Stage('standards', evaluate_standards, ('frequency', 'percent_flicker'),
+          ('ieee_1789_2015', 'well_standard_v2', 'california_ja8_2019')),
+], name='estimate')
+
+SCOPE_BINARY_PIPELINE = Pipeline(FULL_PIPELINE.stages, 'scope binary') \
+    .replace('import', Stage('import', read_scope_binary, ('filename',), ('data',))) \
+    .replace('denoise', Stage('denoise', denoise_capture, ('data',), ('data',))) \
+    .replace('v_stats', Stage('v_stats', capture_v_stats, ('data',), ('v_max', 'v_min', 'v_pp', 'v_avg'))) \
+    .replace('frequency', Stage('frequency', capture_frequency, ('data', 'framerate', 'v_avg'), ('frequency',))) \
+    .replace('one_period', Stage('one_period', capture_n_periods, ('data', 'v_avg', 'period'), ('one_period',)))
+
+ARCHIVE_PIPELINE = Pipeline(FULL_PIPELINE.stages, 'archive') \
+    .replace('import', Stage('import', read_archive, ('filename',), ('data',))) \
+    .replace('denoise', Stage('denoise', denoise_archive, ('data',), ('data',))) \
+    .replace('v_stats', Stage('v_stats', archive_v_stats, ('data',), ('v_max', 'v_min', 'v_pp', 'v_avg'))) \
+    .replace('frequency', Stage('frequency', archive_frequency, ('data', 'framerate', 'v_avg'), ('frequency',))) \
+    .replace('one_period', Stage('one_period', capture_n_periods, ('data', 'v_avg', 'period'), ('one_period',)))
+
+EVENTS_PIPELINE = PERIOD_STATS_PIPELINE.insert(
+    Stage('events', detect_events, ('data', 'period_starts', 'period_metrics'), ('events',)),
+    after='period_stats', new_name='events')
+
+# Every value a pipeline can set, so that reanalyze() clears the values of the previous pipeline
+PIPELINE_ATTRIBUTES = tuple(dict.fromkeys(o for pipeline in (EVENTS_PIPELINE, FAST_PIPELINE, SCREENING_PIPELINE,
+                                                             ESTIMATE_PIPELINE, SCOPE_BINARY_PIPELINE, ARCHIVE_PIPELINE)
+                                          for stage in pipeline for o in stage.outputs))
+
+# The attributes a MemoryBudget may evict; every other pipeline output is always kept
+RESIDENT_ATTRIBUTES = ('data', 'one_period')
@@ -0,0 +1,103 @@
+"""Tests of the estimate pipeline and the escalation of waveforms near compliance thresholds"""
+
+import os
+import time
+import numpy as np
+import pytest
+from src import synthetic
+from src.batch import Quarantine
+from src.budget import MemoryBudget
+from src.pipeline import Stage
+from src.standards import verdicts_constant, evaluate_standards
+from src.waveform import FULL_PIPELINE, adaptive_import
+
+
+def brute_force_constant(frequency_range, percent_flicker_range, steps=80):
+    return len(set(evaluate_standards(f, pf) for f in np.linspace(*frequency_range, steps)
+                   for pf in np.linspace(*percent_flicker_range, steps))) == 1
+
+
+@pytest.mark.parametrize('frequency_range, percent_flicker_range, constant', [
+    ((118, 122), (1, 3), True),
+    ((118, 122), (3, 5), False),
+    ((1000, 1100), (20, 25), True),
+    ((1240, 1260), (50, 60), False),
+    ((195, 205), (40, 45), False),
+    # IEEE 1789-2015 is No Risk between 2.5% and 3.33% per 100 Hz below 90 Hz, with Low Risk
+    # on both sides, so none of the corners show the change
+    ((60, 62), (1.4, 2.1), False),
+])
+def test_verdicts_constant(frequency_range, percent_flicker_range, constant):
+    assert verdicts_constant(frequency_range, percent_flicker_range) == constant
+    if constant:
+        assert brute_force_constant(frequency_range, percent_flicker_range)
+
+
+def test_verdicts_constant_random_ranges():
+    rng = np.random.default_rng(0)
+    for _ in range(500):
+        f = np.sort(rng.uniform(85, 1500, 2))
+        f[1] = min(f[1], f[0] + 30)
+        pf = np.sort(rng.uniform(0, 100, 2))
+        pf[1] = min(pf[1], pf[0] + 5)
+        if verdicts_constant(tuple(f), tuple(pf)):
+            assert brute_force_constant(f, pf)
+
+
+def write_captures(tmp_path):
+    # A 28 ms capture, too short to bound, and a 0.2 s one far from every threshold
+    synthetic.write_csv(str(tmp_path / 'short.csv'), 'sine', duration=0.028, frequency=120,
+                        modulation=0.01, phase=0.3)
+    synthetic.write_csv(str(tmp_path / 'long.csv'), 'sine', duration=0.2, frequency=120,
+                        modulation=0.01, phase=0.3)
+    return (str(tmp_path / 'short.csv'), str(tmp_path / 'long.csv'))
+
+
+def test_escalates_short_captures(tmp_path):
+    (short, long) = write_captures(tmp_path)
+    (waveforms, failures, escalated) = adaptive_import([short, long])
+
+    assert failures == []
+    assert escalated == 1
+    assert {w.filename: w.escalated for w in waveforms} == {short: True, long: False}
+    assert {w.filename: w.pipeline.name for w in waveforms} == {short: 'full', long: 'estimate'}
+    assert all(w.ieee_1789_2015 == 'No Risk' for w in waveforms)
+
+
+def fail(data):
+    raise ValueError('bad capture')
+
+
+def hang(data):
+    time.sleep(5)
+    return data
+
+
+def test_escalation_failures_are_recorded_and_quarantined(tmp_path):
+    (short, long) = write_captures(tmp_path)
+    quarantine = Quarantine(str(tmp_path / 'quarantine.json'))
+    budget = MemoryBudget('1GB')
+    pipeline = FULL_PIPELINE.replace('denoise', Stage('denoise', fail, ('data',), ('data',)))
+
+    (waveforms, failures, escalated) = adaptive_import([short, long], pipeline=pipeline,
+                                                       quarantine=quarantine, budget=budget)
+
+    assert [w.filename for w in waveforms] == [long]
+    assert [(f.path, f.stage) for f in failures] == [(short, 'denoise')]
+    assert quarantine.get(short)['stage'] == 'denoise'
+    assert os.path.exists(quarantine.filename)
+    assert budget.get_resident_bytes() == waveforms[0].get_resident_bytes()
+
+
+def test_escalation_times_out(tmp_path):
+    (short, long) = write_captures(tmp_path)
+    quarantine = Quarantine()
+    pipeline = FULL_PIPELINE.replace('denoise', Stage('denoise', hang, ('data',), ('data',)))
+
+    start = time.perf_counter()
+    (waveforms, failures, escalated) = adaptive_import([short, long], pipeline=pipeline,
+                                                       quarantine=quarantine, timeout=0.5)
+
+    assert time.perf_counter() - start < 4
+    assert [(f.path, f.stage) for f in failures] == [(short, 'timeout')]
+    assert quarantine.get_entries() == {}
@@ -0,0 +1,77 @@
+"""Tests of compressed waveform archives"""
+
+import os
+import numpy as np
+import pytest
+from scipy.signal import savgol_filter
+from src import synthetic
+from src.archive import write_archive, read_archive, convert_directory
+from src.waveform import Waveform, denoise
+
+
+FRAMERATE = 500000
+
+
+@pytest.fixture
+def data():
+    return synthetic.generate('sine', framerate=FRAMERATE, duration=0.05, frequency=120, modulation=0.1,
+                              noise=0.01, seed=2, phase=0.3)
+
+
+def test_random_access(tmp_path, data):
+    filename = write_archive(str(tmp_path / 'sine.bfw'), data, header={'Sample Rate': '500kSa/s'}, chunk_size=1000)
+    archive = read_archive(filename)
+
+    assert len(archive) == len(data)
+    assert archive.get_chunks_read() == 0
+    # A range within two chunks decompresses only those chunks
+    rows = archive[1500:2500,:]
+    assert archive.get_chunks_read() == 2
+    assert np.array_equal(rows[:,1], data[1500:2500,1])
+    assert np.allclose(rows[:,0], data[1500:2500,0])
+    assert np.allclose(archive[:,0], data[:,0])
+    assert archive.sample_at(0.01) == 5000
+
+
+def test_filtered_view_matches_whole_capture(tmp_path, data):
+    archive = read_archive(write_archive(str(tmp_path / 'sine.bfw'), data, chunk_size=1000))
+    filtered = archive.with_filter(901)
+    whole = savgol_filter(data[:,1], 901, 3)
+
+    for (start, stop) in ((0, 100), (4000, 7000), (len(data) - 50, len(data))):
+        assert np.allclose(filtered.volts(start, stop), whole[start:stop])
+
+
+def test_truncated_archive(tmp_path, data):
+    filename = write_archive(str(tmp_path / 'sine.bfw'), data, chunk_size=1000)
+    with open(filename, 'rb+') as f:
+        f.truncate(os.path.getsize(filename) - 4)
+    with pytest.raises(ValueError, match='truncated'):
+        read_archive(filename)
+
+
+def test_matches_array_import(tmp_path, data):
+    filename = write_archive(str(tmp_path / 'sine.bfw'), data, chunk_size=4096)
+    w = Waveform.from_archive(filename, 'archive')
+    reference = Waveform.from_array(data, 'array', framerate=FRAMERATE)
+
+    assert w.get_frequency() == reference.get_frequency() == 120
+    assert w.get_percent_flicker(rounded=False) == pytest.approx(reference.get_percent_flicker(rounded=False), rel=1e-6)
+    assert np.allclose(w.get_data()[:1000,1], denoise(data)[:1000,1])
+
+
+def test_convert_directory(tmp_path):
+    src = tmp_path / 'CSVs'
+    (src / 'day').mkdir(parents=True)
+    with open(str(src / 'info.csv'), 'w') as f:
+        f.write('Sample Rate:500kSa/s,\nch1_time(s),ch1_value(V)\n')
+    synthetic.write_csv(str(src / 'day' / 'lamp.csv'), 'sine', duration=0.02, frequency=120)
+    with open(str(src / 'day' / 'broken.csv'), 'w') as f:
+        f.write('not,a\ncapture\n')
+
+    (archives, failures) = convert_directory(str(src), str(tmp_path / 'archives'))
+
+    assert archives == [str(tmp_path / 'archives' / 'day' / 'lamp.bfw')]
+    assert [(os.path.basename(f.path), f.stage) for f in failures] == [('broken.csv', 'convert')]
+    # The header of the parent directory is inherited
+    assert read_archive(archives[0]).header['Sample Rate'] == '500kSa/s'
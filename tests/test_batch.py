@@ -0,0 +1,109 @@
+"""Tests of the fault-tolerant batch import helpers"""
+
+import json
+import shutil
+import pytest
+from src import batch, synthetic
+from src.batch import Quarantine
+from src.waveform import WaveformCollection, batch_import
+
+
+@pytest.fixture
+def fingerprints(monkeypatch):
+    # The paths fingerprinted by the quarantine
+    calls = []
+    original = batch.file_fingerprint
+    def counting(path, *args, **kwargs):
+        calls.append(path)
+        return original(path, *args, **kwargs)
+    monkeypatch.setattr(batch, 'file_fingerprint', counting)
+    return calls
+
+
+def write_files(tmp_path):
+    good = str(tmp_path / 'good.csv')
+    synthetic.write_csv(good, 'sine', duration=0.05, frequency=120, phase=0.3)
+    bad = str(tmp_path / 'bad.csv')
+    with open(bad, 'w') as f:
+        f.write('not a capture\n')
+    empty = str(tmp_path / 'empty.csv')
+    open(empty, 'w').close()
+    return (good, bad, empty)
+
+
+def test_quarantine_skips_failed_files(tmp_path, fingerprints):
+    (good, bad, empty) = write_files(tmp_path)
+    filename = str(tmp_path / 'quarantine.json')
+
+    (waveforms, failures) = batch_import([good, bad, empty], quarantine=Quarantine(filename))
+    assert [w.filename for w in waveforms] == [good]
+    assert [(f.path, f.quarantined) for f in failures] == [(bad, False), (empty, False)]
+    # Only the failed files were fingerprinted
+    assert sorted(fingerprints) == sorted([bad, empty])
+
+    # The next run skips them without parsing them, and does not fingerprint the healthy file
+    fingerprints.clear()
+    (waveforms, failures) = batch_import([good, bad, empty], quarantine=Quarantine(filename))
+    assert [w.filename for w in waveforms] == [good]
+    assert [(f.path, f.stage, f.quarantined) for f in failures] == [(bad, 'import', True), (empty, 'import', True)]
+    assert good not in fingerprints
+
+    # A file is retried once its contents change
+    with open(bad, 'w') as f:
+        f.write('still not a capture\n')
+    assert Quarantine(filename).get(bad) is None
+
+
+def test_quarantine_without_sizes(tmp_path, fingerprints):
+    # Entries saved before sizes were recorded still match, by fingerprinting every file
+    (good, bad, empty) = write_files(tmp_path)
+    filename = str(tmp_path / 'quarantine.json')
+    with open(filename, 'w') as f:
+        json.dump({batch.file_fingerprint(bad): {'path': bad, 'stage': 'import', 'error': 'ValueError: x'}}, f)
+    fingerprints.clear()
+
+    quarantine = Quarantine(filename)
+    assert quarantine.get(good) is None
+    assert quarantine.get(bad)['stage'] == 'import'
+    assert fingerprints == [good, bad]
+
+    quarantine.remove(bad)
+    assert quarantine.get_entries() == {}
+
+
+def test_names_do_not_depend_on_the_entry_point(tmp_path):
+    filename = str(tmp_path / 'Old_Lamp.csv')
+    synthetic.write_csv(filename, 'sine', duration=0.05, frequency=120, phase=0.3)
+    (from_directory, _) = batch_import(str(tmp_path))
+    (from_paths, _) = batch_import([filename])
+
+    assert [w.get_name() for w in from_directory] == [w.get_name() for w in from_paths] == ['Old Lamp']
+
+
+def test_find_duplicates(tmp_path):
+    paths = [str(tmp_path / name) for name in ('a.csv', 'b.csv', 'c.csv', 'd.csv')]
+    for (p, contents) in zip(paths, ('1,2\n', '1,3\n', '1,2\n', '1,2\n')):
+        with open(p, 'w') as f:
+            f.write(contents)
+
+    # b has the size of a but not its contents, and missing files are treated as unique
+    assert batch.content_hash(paths[0]) == batch.content_hash(paths[2]) != batch.content_hash(paths[1])
+    assert batch.find_duplicates(paths + [str(tmp_path / 'missing.csv')]) == {paths[2]: paths[0], paths[3]: paths[0]}
+    assert batch.find_duplicates(paths[:2]) == {}
+
+
+def test_dedupe_analyzes_copies_once(tmp_path):
+    (good, bad, empty) = write_files(tmp_path)
+    (good_copy, bad_copy) = (str(tmp_path / 'good_copy.csv'), str(tmp_path / 'bad_copy.csv'))
+    shutil.copy(good, good_copy)
+    shutil.copy(bad, bad_copy)
+
+    (waveforms, failures) = batch_import([good, bad, empty, good_copy, bad_copy], dedupe=True)
+    assert [w.get_name() for w in waveforms] == ['good']
+    assert waveforms[0].aliases == {good_copy: 'good copy'}
+    # The copy of a failed file fails with it, without being parsed
+    assert sorted(f.path for f in failures) == sorted([bad, bad_copy, empty])
+
+    collection = WaveformCollection(str(tmp_path), dedupe=True)
+    assert len(collection.waveforms) == 1
+    assert collection.get('good copy') is collection.get('good') is not None
@@ -0,0 +1,80 @@
+"""Tests of the memory budget of the raw waveform arrays"""
+
+import numpy as np
+from src import synthetic
+from src.budget import MemoryBudget, parse_size
+from src.waveform import Waveform
+
+
+def make_waveforms(count, tmp_path=None):
+    out = []
+    for i in range(count):
+        params = dict(framerate=500000, duration=0.02, frequency=120, phase=0.3 + i / 10)
+        if tmp_path is None:
+            out.append(Waveform.from_array(synthetic.generate('sine', **params), str(i), framerate=500000))
+        else:
+            filename = str(tmp_path / (str(i) + '.csv'))
+            synthetic.write_csv(filename, 'sine', **params)
+            out.append(Waveform(filename, str(i)))
+    return out
+
+
+def test_parse_size():
+    assert parse_size(2048) == 2048
+    assert parse_size('512MB') == 512000000
+    assert parse_size('1.5 KiB') == 1536
+
+
+def test_evicts_least_recently_used(tmp_path):
+    waveforms = make_waveforms(4)
+    size = waveforms[0].get_resident_bytes()
+    budget = MemoryBudget(2.5 * size, spill_dir=str(tmp_path))
+
+    for w in waveforms[:3]:
+        budget.add(w)
+    assert waveforms[0].get_resident_bytes() == 0
+    assert budget.evictions == 1
+
+    # Using waveform 1 makes waveform 2 the least recently used
+    waveforms[1].get_data()
+    budget.add(waveforms[3])
+    assert [w.get_resident_bytes() > 0 for w in waveforms] == [False, True, False, True]
+    assert budget.get_resident_bytes() <= budget.limit
+
+
+def test_reloads_from_spill(tmp_path):
+    waveforms = make_waveforms(2)
+    expected = waveforms[0].get_data().copy()
+    budget = MemoryBudget(1, spill_dir=str(tmp_path / 'spill'))
+    for w in waveforms:
+        budget.add(w)
+
+    assert waveforms[0].get_resident_bytes() == 0
+    assert np.array_equal(waveforms[0].get_data(), expected)
+    assert budget.reloads == 1
+    assert waveforms[1].get_resident_bytes() == 0
+
+
+def test_reloads_from_file(tmp_path):
+    waveforms = make_waveforms(2, tmp_path)
+    expected = waveforms[0].get_data().copy()
+    frequency = waveforms[0].get_frequency()
+    budget = MemoryBudget(1)
+    for w in waveforms:
+        budget.add(w)
+
+    assert waveforms[0].get_resident_bytes() == 0
+    assert waveforms[0].get_frequency() == frequency
+    assert np.allclose(waveforms[0].get_data(), expected)
+    assert budget.reloads == 1
+
+
+def test_keeps_arrays_without_spill():
+    # Rerunning the pipeline of an in-memory array would not free memory
+    waveforms = make_waveforms(2)
+    budget = MemoryBudget(1)
+    for w in waveforms:
+        budget.add(w)
+
+    assert all(w.get_resident_bytes() > 0 for w in waveforms)
+    assert budget.evictions == 0
@@ -0,0 +1,55 @@
+"""Tests of the detection of transient flicker events"""
+
+import numpy as np
+import pytest
+from src import synthetic
+from src.events import rolling_median, robust_scores
+from src.waveform import EVENTS_PIPELINE, Waveform
+
+
+FRAMERATE = 500000
+
+
+def capture(dropout=None):
+    data = synthetic.generate('sine', framerate=FRAMERATE, duration=0.5, noise=0.01, seed=5,
+                              frequency=120, modulation=0.1, phase=0.3)
+    if dropout is not None:
+        # The light goes out
+        data[int(dropout[0] * FRAMERATE):int(dropout[1] * FRAMERATE),1] = 0
+    return Waveform.from_array(data, 'sine', framerate=FRAMERATE, pipeline=EVENTS_PIPELINE)
+
+
+def test_rolling_median():
+    values = np.random.default_rng(0).normal(size=50)
+    # Every window is full, with the values reflected at both ends
+    padded = np.pad(values, 3, mode='reflect')
+    expected = [np.median(padded[i:i+7]) for i in range(50)]
+    assert np.allclose(rolling_median(values, 7), expected)
+    # Two values reflect into windows of three
+    assert np.array_equal(rolling_median(values[:2], 7), values[1::-1])
+    assert len(rolling_median(np.array([]))) == 0
+
+
+def test_robust_scores():
+    values = np.ones(40)
+    assert not robust_scores(values, 9).any()
+    values[20] = 2
+    scores = robust_scores(values, 9, min_scale=0.1)
+    assert scores[20] == pytest.approx(10)
+    assert np.flatnonzero(scores) == [20]
+
+
+def test_steady_capture_has_no_events():
+    assert capture().get_events() == []
+
+
+def test_finds_dropout():
+    w = capture(dropout=(0.250, 0.270))
+    events = w.get_events()
+
+    assert len(events) == 1
+    assert events[0]['start'] < 0.250 and events[0]['stop'] > 0.270
+    assert events[0]['stop'] - events[0]['start'] < 0.05
+    assert 'period' in events[0]['metrics'] and events[0]['score'] > 5
+    (i, j) = events[0]['periods']
+    assert w.period_metrics['period'][i:j].max() > 0.02
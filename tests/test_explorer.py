@@ -0,0 +1,53 @@
+"""Tests of the interactive waveform explorer, drawn with a non-interactive backend"""
+
+import pytest
+from src import synthetic
+from src.waveform import Waveform
+
+matplotlib = pytest.importorskip('matplotlib')
+matplotlib.use('Agg')
+
+from matplotlib.collections import LineCollection, PolyCollection
+from src.explorer import MAX_PERIOD_LABELS, MAX_RAW_POINTS
+
+
+FRAMERATE = 500000
+
+
+@pytest.fixture
+def explorer():
+    import matplotlib.pyplot as plt
+    data = synthetic.generate('sine', framerate=FRAMERATE, duration=0.1, frequency=120, modulation=0.1, phase=0.3)
+    explorer = Waveform.from_array(data, 'sine', framerate=FRAMERATE).explore()
+    yield explorer
+    plt.close(explorer.fig)
+
+
+def test_overview_draws_the_envelope(explorer):
+    # 50000 samples are too many to draw one by one
+    assert any(isinstance(a, PolyCollection) for a in explorer.ax.collections)
+    assert all(len(line.get_xdata()) <= 2 for line in explorer.ax.lines)
+    # The period boundaries, computed on first use
+    assert explorer.waveform.period_starts is not None
+    assert any(isinstance(a, LineCollection) for a in explorer.ax.collections)
+
+
+def test_zoom_draws_samples(explorer):
+    redraws = explorer.redraws
+    explorer.set_range(0.010, 0.012)
+
+    assert explorer.redraws == redraws + 1
+    assert explorer.get_range() == pytest.approx((0.010, 0.012))
+    drawn = [line for line in explorer.ax.lines if len(line.get_xdata()) > 2]
+    assert len(drawn) == 1 and len(drawn[0].get_xdata()) <= MAX_RAW_POINTS
+    assert not any(isinstance(a, PolyCollection) for a in explorer.ax.collections)
+
+
+def test_labels_visible_periods(explorer):
+    assert len(explorer.ax.texts) == 11 <= MAX_PERIOD_LABELS
+
+    explorer.set_range(0.010, 0.045)
+    labels = [t.get_text() for t in explorer.ax.texts]
+    # The periods with their middle in view, about 35 ms / 8.3 ms of them
+    assert len(labels) == 4
+    assert all(label.startswith('PF ') and '\nFI ' in label for label in labels)
@@ -0,0 +1,44 @@
+"""Tests of Waveforms created from in-memory arrays and buffers"""
+
+import numpy as np
+import pytest
+from src import synthetic
+from src.waveform import Waveform, as_waveform_data
+
+
+FRAMERATE = 500000
+
+
+@pytest.fixture
+def data():
+    return synthetic.generate('sine', framerate=FRAMERATE, duration=0.05, frequency=120, phase=0.3)
+
+
+def test_2d_array_is_not_copied(data):
+    w = Waveform.from_array(data, 'sine', framerate=FRAMERATE, remove_noise=False)
+    assert w.get_data() is data
+    assert w.get_frequency() == 120
+
+
+def test_1d_volts_match_2d(data):
+    w_2d = Waveform.from_array(data, '2d', framerate=FRAMERATE)
+    w_1d = Waveform.from_array(data[:,1].copy(), '1d', framerate=FRAMERATE)
+
+    assert np.allclose(w_1d.get_data(), w_2d.get_data())
+    assert (w_1d.frequency, w_1d.percent_flicker) == (w_2d.frequency, w_2d.percent_flicker)
+    with pytest.raises(ValueError, match='framerate is required'):
+        as_waveform_data(data[:,1])
+    with pytest.raises(ValueError, match='Expected a 1D array'):
+        as_waveform_data(np.zeros((10, 3)))
+
+
+def test_buffer_is_not_copied(data):
+    buffer = bytearray(data.tobytes())
+    w = Waveform.from_buffer(buffer, 'sine', interleaved=True, remove_noise=False)
+
+    assert np.shares_memory(w.get_data(), np.frombuffer(buffer))
+    assert np.array_equal(w.get_data(), data)
+
+    volts = Waveform.from_buffer(data[:,1].astype(np.float32).tobytes(), 'float32', framerate=FRAMERATE,
+                                 dtype='float32')
+    assert volts.get_frequency() == 120
@@ -0,0 +1,39 @@
+"""Tests that the metrics core imports without the plotting libraries"""
+
+import os
+import sys
+import json
+import subprocess
+import numpy as np
+import pytest
+
+
+def imported_modules(code):
+    # Run in a fresh interpreter, as this one may have imported anything already
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    out = subprocess.run([sys.executable, '-c', code + '\nimport sys, json\nprint(json.dumps(list(sys.modules)))'],
+                         capture_output=True, text=True, check=True, cwd=root)
+    return set(json.loads(out.stdout.strip().splitlines()[-1]))
+
+
+def test_core_does_not_import_plotting():
+    modules = imported_modules('import src.waveform, src.sweep, src.multichannel, src.batch')
+    assert not modules & {'matplotlib', 'pylab', 'sklearn', 'numba', 'ipywidgets'}
+
+
+def test_plotting_is_imported_on_first_plot(tmp_path):
+    code = '\n'.join([
+        'import matplotlib', "matplotlib.use('Agg')",
+        'from src import synthetic', 'from src.waveform import Waveform',
+        "w = Waveform.from_array(synthetic.generate('sine', framerate=500000, duration=0.05, frequency=120, phase=0.3), 'sine')",
+        "w.plot(filename=" + repr(str(tmp_path / 'sine.png')) + ')',
+    ])
+    modules = imported_modules(code)
+    assert 'src.plot' in modules and 'sklearn' not in modules
+    assert (tmp_path / 'sine.png').stat().st_size > 0
+
+
+def test_minmax_scale():
+    pytest.importorskip('matplotlib')
+    from src.plot import minmax_scale
+    assert np.allclose(minmax_scale(np.array([2.0, 4.0, 3.0])), [0, 1, 0.5])
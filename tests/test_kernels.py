@@ -0,0 +1,69 @@
+"""Tests of the per-sample kernels and their backends"""
+
+import numpy as np
+import pytest
+from src import kernels, waveform
+
+
+@pytest.fixture
+def backend():
+    previous = kernels.get_backend()
+    yield
+    kernels.set_backend(previous)
+
+
+def test_backends_agree():
+    results = kernels.check_agreement()
+    if 'numba' not in kernels.available_backends():
+        pytest.skip('Numba is not installed')
+    assert results['numba'] == {'rising_edge_idx': True, 'crossings': True, 'clip_above': True, 'minmax': True}
+
+
+@pytest.mark.parametrize('name', ['numpy', 'numba'])
+def test_strided_column(backend, name):
+    if name not in kernels.available_backends():
+        pytest.skip(name + ' is not installed')
+    kernels.set_backend(name)
+
+    t = np.arange(10000) / 10000
+    data = np.column_stack((t, np.sin(2 * np.pi * 5 * t)))
+    volts = data[:,1]
+    contiguous = volts.copy()
+
+    assert np.array_equal(kernels.crossings(volts, 0.0), kernels.crossings(contiguous, 0.0))
+    assert kernels.minmax(volts) == kernels.minmax(contiguous)
+    assert kernels.rising_edge_idx(volts, 0.0) == kernels.rising_edge_idx(contiguous, 0.0)
+    assert np.array_equal(kernels.clip_above(volts, 0.5), kernels.clip_above(contiguous, 0.5))
+    assert len(kernels.crossings(volts, 0.0)) == 10
+
+
+def recursive_rising_idx(array, value):
+    # The original search, which the backends must not change
+    idx = int(np.abs(array - value).argmin())
+    if array[idx] > array[idx-1] and array[idx] < array[idx+1]:
+        return idx
+    return recursive_rising_idx(array[idx+1:], value)
+
+
+@pytest.mark.parametrize('name', ['numpy', 'numba'])
+def test_period_start_unchanged(backend, name):
+    if name not in kernels.available_backends():
+        pytest.skip(name + ' is not installed')
+    kernels.set_backend(name)
+
+    rng = np.random.default_rng(1)
+    t = np.arange(20000) / 100000
+    volts = 1 + 0.1 * np.sin(2 * np.pi * 120 * t + 0.3) + rng.normal(0, 0.02, len(t))
+    for value in (0.95, 1.0, 1.05):
+        assert waveform.find_nearest_idx_rising(volts, value) == recursive_rising_idx(volts, value)
+
+
+@pytest.mark.parametrize('name', ['numpy', 'numba'])
+def test_warm_up(backend, name):
+    if name not in kernels.available_backends():
+        pytest.skip(name + ' is not installed')
+    kernels.set_backend(name)
+
+    kernels.warm_up()
+    # The second call only runs the loaded kernels
+    assert kernels.warm_up() < 0.1
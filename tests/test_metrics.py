@@ -0,0 +1,58 @@
+"""Tests of the compact metrics records of waveforms"""
+
+import pickle
+import numpy as np
+import pytest
+from src import synthetic
+from src.metrics import FIELDS, WaveformMetrics, from_columns, to_columns
+from src.waveform import FAST_PIPELINE, WaveformCollection
+
+
+@pytest.fixture
+def collection(tmp_path):
+    for frequency in (100, 120, 200):
+        synthetic.write_csv(str(tmp_path / (str(frequency) + 'Hz.csv')), 'sine', duration=0.05,
+                            frequency=frequency, modulation=frequency / 1000, phase=0.3)
+    return WaveformCollection(str(tmp_path))
+
+
+def test_record_of_waveform(collection):
+    w = collection.get('120Hz')
+    record = w.summary(format='Metrics')
+
+    assert record == WaveformMetrics.from_waveform(w)
+    assert (record.name, record.filename, record.frequency) == ('120Hz', w.filename, 120)
+    assert record.percent_flicker == w.get_percent_flicker(rounded=False)
+    # Plain Python values, without the data, that survive pickling
+    assert all(not isinstance(v, np.generic) for v in record)
+    data = pickle.dumps(record)
+    assert len(data) < 1000 < w.get_data().nbytes
+    assert pickle.loads(data) == record
+    assert list(record.to_dict()) == list(FIELDS)
+
+
+def test_columns_round_trip(collection, tmp_path):
+    records = collection.get_metrics()
+    assert sorted(r.name for r in records) == ['100Hz', '120Hz', '200Hz']
+
+    # Fields the pipeline did not compute are None, NaN or -1 in the columns
+    records.append(WaveformMetrics(*(['partial', None] + [None] * (len(FIELDS) - 2))))
+    columns = to_columns(records)
+    assert columns['frequency'].dtype == np.float64 and np.isnan(columns['frequency'][-1])
+    assert columns['well_standard_v2'].dtype == np.int8 and columns['well_standard_v2'][-1] == -1
+
+    filename = str(tmp_path / 'survey.npz')
+    np.savez(filename, **columns)
+    with np.load(filename) as loaded:
+        assert from_columns(dict(loaded)) == records
+
+
+def test_missing_columns_are_none(tmp_path):
+    synthetic.write_csv(str(tmp_path / 'a.csv'), 'sine', duration=0.05, frequency=120, phase=0.3)
+    records = WaveformCollection(str(tmp_path), pipeline=FAST_PIPELINE).get_metrics()
+    assert records[0].flicker_index is None
+
+    columns = to_columns(records)
+    del columns['ieee_1789_2015']
+    assert from_columns(columns)[0]._replace(ieee_1789_2015=records[0].ieee_1789_2015) == records[0]
+    assert from_columns(columns)[0].ieee_1789_2015 is None
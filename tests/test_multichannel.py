@@ -0,0 +1,38 @@
+"""Tests of multi-channel captures"""
+
+import numpy as np
+import pytest
+from src import synthetic
+from src.multichannel import MultiChannelCapture
+from src.waveform import Waveform
+
+
+FRAMERATE = 500000
+
+
+def write_capture(filename):
+    a = synthetic.generate('sine', framerate=FRAMERATE, duration=0.05, frequency=120, modulation=0.1, phase=0.3)
+    b = synthetic.generate('sine', framerate=FRAMERATE, duration=0.05, frequency=200, modulation=0.4, phase=0.3)
+    with open(filename, 'w') as f:
+        f.write('Sample Rate:500kSa/s,\n')
+        f.write('Time(s),CH1_value(V),CH2_value(V)\n')
+        np.savetxt(f, np.column_stack((a, b[:,1])), delimiter=',')
+    return (a, b)
+
+
+def test_channels_match_single_imports(tmp_path):
+    filename = str(tmp_path / 'rig.csv')
+    channels = write_capture(filename)
+    capture = MultiChannelCapture(filename, 'rig')
+
+    assert capture.get_channel_names() == ['CH1', 'CH2']
+    assert list(capture.frequency) == [120, 200]
+    for (i, data) in enumerate(channels):
+        w = capture.get_waveform(i)
+        single = Waveform.from_array(data, 'single', framerate=FRAMERATE)
+        assert w.get_name() == 'rig CH' + str(i + 1)
+        assert w.get_percent_flicker(rounded=False) == pytest.approx(single.get_percent_flicker(rounded=False), rel=1e-6)
+        assert w.get_flicker_index(rounded=False) == pytest.approx(single.get_flicker_index(rounded=False), rel=1e-3)
+
+    # The channel waveforms are views into the capture
+    assert np.shares_memory(capture.get_waveform('CH2').get_data(), capture.get_data())
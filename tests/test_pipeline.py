@@ -0,0 +1,63 @@
+"""Tests of the analysis pipelines and of reanalyzing waveforms"""
+
+import pytest
+from src import synthetic
+from src.pipeline import Stage, StageError
+from src.waveform import Waveform, WaveformCollection, FULL_PIPELINE, ESTIMATE_PIPELINE, FAST_PIPELINE
+
+
+def sine_waveform(tmp_path, pipeline):
+    filename = str(tmp_path / 'sine.csv')
+    synthetic.write_csv(filename, 'sine', duration=0.05, frequency=120, phase=0.3)
+    return Waveform(filename, 'sine', pipeline=pipeline)
+
+
+def test_only_changed_stages_rerun(tmp_path):
+    calls = []
+    def counting_period(frequency):
+        calls.append(frequency)
+        return 1 / frequency
+    pipeline = FULL_PIPELINE.replace('period', Stage('period', counting_period, ('frequency',), ('period',)))
+    w = sine_waveform(tmp_path, pipeline)
+
+    # Only the flicker index, and nothing upstream of it, is recomputed
+    w.reanalyze(pipeline.without('flicker_index'))
+    assert len(calls) == 1
+    assert w.flicker_index is None
+    assert w.get_frequency() == 120
+
+
+def test_reanalyze_clears_previous_values(tmp_path):
+    w = sine_waveform(tmp_path, ESTIMATE_PIPELINE)
+    assert w.frequency_bounds is not None
+
+    w.reanalyze(FULL_PIPELINE)
+    assert (w.frequency_bounds, w.percent_flicker_bounds) == (None, None)
+    assert w.get_flicker_index() is not None
+
+    # Including the values of custom stages
+    w.reanalyze(FAST_PIPELINE.insert(Stage('half', lambda f: f / 2, ('frequency',), ('half_frequency',))))
+    assert w.half_frequency == 60
+    w.reanalyze(FAST_PIPELINE)
+    assert w.half_frequency is None
+
+
+def test_stage_errors_name_the_stage(tmp_path):
+    def fail(data):
+        raise ValueError('bad capture')
+    w = sine_waveform(tmp_path, FULL_PIPELINE.replace('denoise', Stage('denoise', fail, ('data',), ('data',))))
+    assert isinstance(w.error, StageError)
+    assert (w.error.stage, type(w.error.error)) == ('denoise', ValueError)
+    assert w.frequency is None
+
+
+def test_collection_passes_options_to_import(tmp_path):
+    for frequency in (100, 120):
+        synthetic.write_csv(str(tmp_path / (str(frequency) + 'Hz.csv')), 'sine', duration=0.05,
+                            frequency=frequency, phase=0.3)
+
+    collection = WaveformCollection(str(tmp_path), pipeline=FAST_PIPELINE, dedupe=True)
+    assert sorted(collection.get_names()) == ['100Hz', '120Hz']
+    assert all(w.pipeline is FAST_PIPELINE for w in collection.get_waveforms())
+    with pytest.raises(TypeError):
+        WaveformCollection(str(tmp_path), piepline=FAST_PIPELINE)
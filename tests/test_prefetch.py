@@ -0,0 +1,57 @@
+"""Tests of the prefetching file loader"""
+
+import time
+import threading
+import numpy as np
+from src import synthetic
+from src.prefetch import Prefetcher
+from src.waveform import batch_import
+
+
+def test_yields_in_order_with_errors():
+    def load(path):
+        if path == 'bad':
+            raise ValueError('bad file')
+        time.sleep(0.01 * (path % 3))
+        return np.zeros(10)
+
+    prefetcher = Prefetcher(workers=3, depth=4)
+    results = list(prefetcher.map([0, 1, 'bad', 2, 3], load))
+
+    assert [p for (p, _, _) in results] == [0, 1, 'bad', 2, 3]
+    assert isinstance(results[2][2], ValueError) and results[2][1] is None
+    counters = prefetcher.get_counters()
+    assert (counters['files'], counters['errors'], counters['bytes']) == (4, 1, 320)
+    assert counters['peak_depth'] == 4
+
+
+def test_depth_and_memory_cap():
+    started = []
+    lock = threading.Lock()
+    def load(path):
+        with lock:
+            started.append(path)
+        return np.zeros(100)
+
+    prefetcher = Prefetcher(workers=2, depth=3, memory_cap=100)
+    for (path, value, error) in prefetcher.map(range(10), load):
+        time.sleep(0.01)
+        # At most depth loads are started ahead of the file being handed over
+        assert len(started) <= path + 1 + 3
+    assert prefetcher.get_counters()['cap_stalls'] > 0
+
+
+def test_overlaps_reading_with_analysis(tmp_path):
+    paths = []
+    for i in range(4):
+        paths.append(str(tmp_path / (str(i) + '.csv')))
+        synthetic.write_csv(paths[-1], 'sine', duration=0.05, frequency=120, phase=0.3 + i / 10)
+
+    (serial, _) = batch_import(paths)
+    prefetcher = Prefetcher(workers=2)
+    (prefetched, failures) = batch_import(paths, prefetcher=prefetcher)
+
+    assert failures == []
+    assert [w.get_flicker_index(rounded=False) for w in prefetched] == [w.get_flicker_index(rounded=False) for w in serial]
+    counters = prefetcher.get_counters()
+    assert counters['files'] == 4 and counters['hidden_time'] > 0
@@ -0,0 +1,74 @@
+"""Tests of the pipeline profiler"""
+
+import json
+import threading
+import numpy as np
+from src import synthetic, kernels
+from src.profiling import Profiler, profile_stage
+from src.waveform import Waveform, FULL_PIPELINE
+
+
+def test_records_every_stage(tmp_path):
+    filename = str(tmp_path / 'sine.csv')
+    synthetic.write_csv(filename, 'sine', duration=0.02, frequency=120, phase=0.3)
+    profiler = Profiler()
+    try:
+        Waveform(filename, 'sine', profiler=profiler)
+        stats = profiler.get_stats()
+    finally:
+        profiler.stop()
+
+    assert list(stats.by_stage()) == FULL_PIPELINE.get_stage_names()
+    assert list(stats.by_file()) == [filename]
+    assert stats.backend == kernels.get_backend()
+    # The parsed array is 10000 x 2 float64
+    assert stats.by_stage()['import']['peak_memory'] >= 10000 * 2 * 8
+    assert 'Kernel backend: ' + kernels.get_backend() in stats.summary()
+
+    trace = stats.to_chrome_trace(str(tmp_path / 'trace.json'))
+    with open(str(tmp_path / 'trace.json')) as f:
+        assert json.load(f) == trace
+    assert [e['name'] for e in trace['traceEvents']] == FULL_PIPELINE.get_stage_names()
+
+
+def test_nested_stages():
+    profiler = Profiler()
+    try:
+        with profiler.stage('outer', 'f'):
+            with profiler.stage('inner', 'f'):
+                np.ones(1000000)
+    finally:
+        profiler.stop()
+
+    (inner, outer) = profiler.records
+    assert (inner.stage, outer.stage) == ('inner', 'outer')
+    assert outer.wall >= inner.wall
+    # The peak of the outer stage includes the peak of the inner one
+    assert outer.peak_memory >= inner.peak_memory >= 8000000
+
+
+def test_concurrent_stages_have_no_peak_memory():
+    profiler = Profiler()
+    started = threading.Event()
+    done = threading.Event()
+    def other():
+        with profiler.stage('other'):
+            started.set()
+            done.wait(5)
+    try:
+        thread = threading.Thread(target=other)
+        thread.start()
+        started.wait(5)
+        with profiler.stage('main'):
+            pass
+        done.set()
+        thread.join()
+    finally:
+        profiler.stop()
+
+    assert all(r.concurrent and r.peak_memory is None for r in profiler.records)
+
+
+def test_disabled_profiling_is_a_no_op():
+    with profile_stage(None, 'stage') as a, profile_stage(None, 'other') as b:
+        assert a is b
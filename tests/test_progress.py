@@ -0,0 +1,70 @@
+"""Tests of the progress and throughput reporting of batch runs"""
+
+import io
+import os
+import json
+from src import synthetic
+from src.progress import ConsoleReporter, JSONLinesSink, ProgressTracker
+from src.waveform import batch_import
+
+
+def write_files(tmp_path):
+    paths = []
+    for frequency in (100, 120):
+        paths.append(str(tmp_path / (str(frequency) + 'Hz.csv')))
+        synthetic.write_csv(paths[-1], 'sine', duration=0.02, frequency=frequency, phase=0.3)
+    paths.append(str(tmp_path / 'bad.csv'))
+    with open(paths[-1], 'w') as f:
+        f.write('not a capture\n')
+    return paths
+
+
+def test_import_events(tmp_path):
+    paths = write_files(tmp_path)
+    events = []
+    (waveforms, failures) = batch_import(paths, progress=ProgressTracker(events.append))
+
+    assert [e['event'] for e in events] == ['start'] + ['file_start', 'file_end'] * 3 + ['end']
+    assert all(e['task'] == 'import' and e['total'] == 3 for e in events)
+    ends = [e for e in events if e['event'] == 'file_end']
+    assert [(e['path'], e['ok'], e['file_samples'], e['samples']) for e in ends] == \
+        [(paths[0], True, 10000, 10000), (paths[1], True, 10000, 20000), (paths[2], False, 0, 20000)]
+    assert [e['file_bytes'] for e in ends] == [os.path.getsize(p) for p in paths]
+    assert ends[2]['error'] is not None and ends[2]['files'] == 3 and ends[2]['eta'] == 0
+
+    last = events[-1]
+    assert (last['files'], last['failed'], last['samples']) == (3, 1, 20000)
+    assert last['bytes'] == sum(os.path.getsize(p) for p in paths)
+    assert 0 < last['utilization'] <= 1 and last['prefetch_utilization'] is None
+
+
+def test_sinks(tmp_path):
+    filename = str(tmp_path / 'events.jsonl')
+    stream = io.StringIO()
+    with JSONLinesSink(filename) as sink:
+        tracker = ProgressTracker([sink, ConsoleReporter(stream, interval=0)])
+        tracker.start(2, 'plot')
+        tracker.file_started('a.png')
+        tracker.file_finished('a.png', error=ValueError('no display'))
+        tracker.finish()
+
+    with open(filename) as f:
+        lines = [json.loads(line) for line in f]
+    assert [e['event'] for e in lines] == ['start', 'file_start', 'file_end', 'end']
+    assert lines[2]['error'] == 'no display' and lines[2]['file_bytes'] == 0
+
+    output = stream.getvalue()
+    assert 'Failed: a.png: no display\n' in output
+    # The line is rewritten in place, and ended at the end of the run
+    last = output.split('\r')[-1]
+    assert last.startswith('plot: 1/2 files (1 failed), 0.0 MB, ')
+    assert ', done in 0s, ' in last and last.endswith('\n')
+
+
+def test_format():
+    event = {'event': 'file_end', 'task': 'import', 'files': 120, 'total': 500, 'failed': 2, 'bytes': 35.2e6,
+             'files_per_second': 4.1, 'eta': 92, 'elapsed': 29, 'utilization': 0.97, 'prefetch_utilization': None}
+    assert ConsoleReporter.format(event) == 'import: 120/500 files (2 failed), 35.2 MB, 4.1 files/s, ETA 1m32s, 97% busy'
+
+    event.update(event='end', total=None, failed=0, elapsed=3725, prefetch_utilization=0.5)
+    assert ConsoleReporter.format(event) == 'import: 120 files, 35.2 MB, 4.1 files/s, done in 1h02m, 97% busy, prefetch 50%'
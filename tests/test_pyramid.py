@@ -0,0 +1,59 @@
+"""Tests of min/max envelope pyramids"""
+
+import numpy as np
+import pytest
+from src import pyramid, synthetic
+from src.pyramid import build_pyramid
+from src.waveform import Waveform
+
+
+def random_data(length, framerate=1000):
+    rng = np.random.default_rng(4)
+    return np.column_stack((np.arange(length) / framerate, rng.normal(1, 0.1, length)))
+
+
+def test_range_stats_match_samples():
+    # An odd number of samples, so the last block is partial
+    data = random_data(10007)
+    p = build_pyramid(data, base=16)
+    rng = np.random.default_rng(5)
+    for _ in range(200):
+        (start, stop) = np.sort(rng.integers(0, len(data), 2))
+        if stop == start:
+            continue
+        # The range is rounded outward to whole blocks
+        (lo, hi) = (start // 16 * 16, min(-(-stop // 16) * 16, len(data)))
+        volts = data[lo:hi,1]
+        assert p.range_stats(start, stop) == pytest.approx((volts.min(), volts.max(), volts.mean()))
+
+
+def test_built_in_chunks(monkeypatch):
+    data = random_data(5000)
+    whole = build_pyramid(data, base=8)
+    monkeypatch.setattr(pyramid, 'CHUNK_SIZE', 64)
+    chunked = build_pyramid(data, base=8)
+
+    assert len(chunked.levels) == len(whole.levels)
+    for (a, b) in zip(chunked.levels, whole.levels):
+        assert all(np.allclose(x, y) for (x, y) in zip(a, b))
+
+
+def test_envelope_width():
+    data = random_data(100000)
+    p = build_pyramid(data, base=64)
+    (times, mins, maxs, means) = p.envelope(0, len(data), width=200)
+
+    # The coarsest level with at least 200 blocks
+    assert 200 <= len(times) < 400
+    assert mins.min() == data[:,1].min() and maxs.max() == data[:,1].max()
+    assert np.all(mins <= means) and np.all(means <= maxs)
+    assert p.envelope_data(0, len(data), width=200).shape == (2 * len(times), 2)
+
+
+def test_waveform_range_stats():
+    data = synthetic.generate('sine', framerate=500000, duration=0.05, frequency=120, modulation=0.1, phase=0.3)
+    w = Waveform.from_array(data, 'sine', framerate=500000)
+    stats = w.get_range_stats(0, 0.05)
+
+    assert stats['percent flicker'] == pytest.approx(w.get_percent_flicker(rounded=False), rel=1e-6)
+    assert w.get_pyramid() is w.get_pyramid()
@@ -0,0 +1,62 @@
+"""Tests of oscilloscope headers and memory-mapped binary exports"""
+
+import numpy as np
+import pytest
+from src import synthetic
+from src.scope import parse_si, read_scope_header, read_scope_binary
+from src.waveform import Waveform
+
+
+FRAMERATE = 500000
+
+HEADER = 'Sample Rate:500kSa/s,\nVertical Sensitivity:200mV/div,\nVertical Offset:-1.36V,\nData Type:int16,\nData:\n'
+
+# Volts per code: 200 mV per division, 6400 codes per division for int16
+SCALE = 0.2 / 6400
+
+
+@pytest.mark.parametrize('value, expected', [
+    ('500MSa/s', 5e8), ('200mV/div', 0.2), ('-1.36V', -1.36), ('2ns', 2e-9), ('3m/s', 3.0), ('1e-3', 1e-3),
+])
+def test_parse_si(value, expected):
+    assert parse_si(value) == pytest.approx(expected)
+
+
+def test_read_scope_header():
+    (header, columns, skiprows) = read_scope_header('CSVs/info.csv')
+    assert header['Sample Rate'] == '500MSa/s'
+    assert columns == ['ch1_time(s)', 'ch1_value(V)']
+    assert skiprows == 10
+
+
+def write_binary(filename):
+    data = synthetic.generate('sine', framerate=FRAMERATE, duration=0.05, frequency=120, modulation=0.1, phase=0.3)
+    codes = np.round((data[:,1] - 1.36) / SCALE).astype('<i2')
+    with open(filename, 'wb') as f:
+        f.write(HEADER.encode())
+        f.write(codes.tobytes())
+    return codes
+
+
+def test_capture_is_converted_where_accessed(tmp_path):
+    filename = str(tmp_path / 'capture.bin')
+    codes = write_binary(filename)
+    capture = read_scope_binary(filename)
+
+    assert (len(capture), capture.framerate, capture.nbytes) == (len(codes), FRAMERATE, 0)
+    assert isinstance(capture.codes, np.memmap)
+    rows = capture[1000:1003,:]
+    assert np.allclose(rows[:,0], np.arange(1000, 1003) / FRAMERATE)
+    assert np.allclose(rows[:,1], codes[1000:1003] * SCALE + 1.36)
+
+
+def test_matches_array_import(tmp_path):
+    filename = str(tmp_path / 'capture.bin')
+    codes = write_binary(filename)
+    w = Waveform.from_scope_binary(filename, 'binary')
+    reference = Waveform.from_array(codes * SCALE + 1.36, 'array', framerate=FRAMERATE)
+
+    assert w.get_frequency() == reference.get_frequency() == 120
+    assert w.get_percent_flicker(rounded=False) == pytest.approx(reference.get_percent_flicker(rounded=False), rel=1e-3)
+    assert w.get_flicker_index(rounded=False) == pytest.approx(reference.get_flicker_index(rounded=False), rel=1e-2)
+    assert len(w.get_one_period()) == int(FRAMERATE / 120)
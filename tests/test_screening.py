@@ -0,0 +1,49 @@
+"""Tests of fast screening at the expected mains harmonics"""
+
+import numpy as np
+import pytest
+from src import synthetic
+from src.screening import decimate, modulation_spectrum, screen, CANDIDATE_FREQUENCIES
+from src.waveform import Waveform, SCREENING_PIPELINE
+
+
+FRAMERATE = 500000
+
+
+def test_decimate():
+    (volts, rate) = decimate(np.arange(10.0), 1000, max_samples=4)
+    assert rate == pytest.approx(1000 / 3)
+    assert list(volts) == [1, 4, 7]
+    assert decimate(np.arange(10.0), 1000, max_samples=10)[1] == 1000
+
+
+def test_modulation_spectrum():
+    t = np.arange(20000) / 10000
+    volts = 1 + 0.2 * np.sin(2 * np.pi * 120 * t) + 0.05 * np.sin(2 * np.pi * 300 * t)
+    amplitudes = dict(zip(CANDIDATE_FREQUENCIES, modulation_spectrum(volts, 10000)))
+
+    assert amplitudes[120] == pytest.approx(0.2, rel=1e-3)
+    assert amplitudes[300] == pytest.approx(0.05, rel=1e-3)
+    assert amplitudes[100] < 1e-3
+
+
+@pytest.mark.parametrize('frequency, modulation', [(100, 0.05), (120, 0.2), (240, 0.4)])
+def test_screen_matches_ground_truth(frequency, modulation):
+    params = dict(frequency=frequency, modulation=modulation, phase=0.3)
+    truth = synthetic.ground_truth('sine', **params)
+    data = synthetic.generate('sine', framerate=FRAMERATE, duration=0.5, noise=0.01, seed=1, **params)
+
+    (f, pf) = screen(data, FRAMERATE)
+    assert f == frequency
+    assert pf == pytest.approx(truth['percent flicker'], rel=0.01)
+
+
+def test_screening_pipeline(tmp_path):
+    filename = str(tmp_path / 'lamp.csv')
+    synthetic.write_csv(filename, 'sine', duration=0.2, frequency=120, modulation=0.01, phase=0.3)
+    w = Waveform(filename, 'lamp', pipeline=SCREENING_PIPELINE)
+
+    assert w.get_frequency() == 120
+    assert w.get_ieee_1789_2015() == 'No Risk'
+    # Stages that are not in the pipeline are not computed
+    assert (w.flicker_index, w.one_period) == (None, None)
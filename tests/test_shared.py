@@ -0,0 +1,90 @@
+"""Tests of the shared-memory transport of parallel imports"""
+
+import gc
+import os
+import time
+import multiprocessing
+import numpy as np
+import pytest
+from src import synthetic
+from src.shared import SharedArray, SharedBlocks, analyze_in_processes
+from src.pipeline import Stage
+from src.waveform import FULL_PIPELINE, batch_import, denoise
+
+
+def blocks_left():
+    # The names given out by SharedBlocks in this process
+    prefix = 'bfw' + str(os.getpid()) + '_'
+    return [f for f in os.listdir('/dev/shm') if f.startswith(prefix)]
+
+
+@pytest.fixture
+def captures(tmp_path):
+    paths = []
+    for frequency in (100, 120, 200):
+        paths.append(str(tmp_path / (str(frequency) + 'Hz.csv')))
+        synthetic.write_csv(paths[-1], 'sine', duration=0.05, frequency=frequency, phase=0.3)
+    return paths
+
+
+def test_take_does_not_copy():
+    with SharedBlocks() as blocks:
+        name = blocks.new_name()
+        with SharedArray.create(name, (4, 2), np.float64) as shared:
+            shared.array[...] = np.arange(8).reshape(4, 2)
+
+        array = blocks.take(name, (4, 2), np.float64)
+        column = array[:,1]
+        assert not array.flags.owndata
+        assert blocks.names == set()
+        with pytest.raises(FileNotFoundError):
+            SharedArray.attach(name, (4, 2), np.float64)
+
+        # The memory stays mapped while any view of the array is used
+        del array
+        gc.collect()
+        assert list(column) == [1, 3, 5, 7]
+
+
+def test_matches_serial_import(captures):
+    (serial, _) = batch_import(captures)
+    (parallel, failures) = batch_import(captures, workers=2)
+
+    assert failures == []
+    for (a, b) in zip(serial, parallel):
+        assert (a.frequency, a.percent_flicker, a.flicker_index) == (b.frequency, b.percent_flicker, b.flicker_index)
+        assert np.array_equal(a.get_data(), b.get_data())
+        assert not b.get_data().flags.owndata
+
+
+@pytest.mark.skipif(not os.path.isdir('/dev/shm'), reason='Blocks are only listed on Linux')
+def test_blocks_are_unlinked(captures):
+    # A file that fails, then the generator is closed with files still in progress
+    paths = captures[:1] + [captures[0] + '.missing'] + captures[1:]
+    results = analyze_in_processes(paths, FULL_PIPELINE, workers=2, depth=4)
+    (p, outputs, error) = next(results)
+    (q, _, missing) = next(results)
+    results.close()
+
+    assert error is None and outputs['denoise']['data'].shape == (25000, 2)
+    assert missing.stage == 'import'
+    assert blocks_left() == []
+
+
+def hang_on_long_captures(data):
+    if len(data) > 25000:
+        time.sleep(60)
+    return denoise(data)
+
+
+def test_timeout_terminates_worker(captures):
+    synthetic.write_csv(captures[1], 'sine', duration=0.06, frequency=120, phase=0.3)
+    pipeline = FULL_PIPELINE.replace('denoise', Stage('denoise', hang_on_long_captures, ('data',), ('data',)))
+
+    start = time.perf_counter()
+    results = list(analyze_in_processes(captures, pipeline, workers=2, timeout=2))
+
+    assert time.perf_counter() - start < 30
+    assert [(p, e.stage if e else None) for (p, _, e) in results] == \
+        [(captures[0], None), (captures[1], 'timeout'), (captures[2], None)]
+    assert multiprocessing.active_children() == []
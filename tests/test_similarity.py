@@ -0,0 +1,61 @@
+"""Tests of the shape fingerprints and the similarity search of waveform collections"""
+
+import numpy as np
+import pytest
+from src import synthetic
+from src.similarity import HARMONICS, FingerprintIndex, shape_fingerprint
+from src.waveform import WaveformCollection
+
+
+FRAMERATE = 500000
+
+
+def one_period(shape, framerate=FRAMERATE, **params):
+    data = synthetic.generate(shape, framerate=framerate, duration=1 / params['frequency'], **params)
+    return data[:int(framerate / params['frequency'])]
+
+
+def test_fingerprint_ignores_brightness_phase_and_length():
+    fingerprint = shape_fingerprint(one_period('pwm', frequency=100, duty_cycle=0.3, v_min=0.2))
+    assert fingerprint.shape == (2 * HARMONICS - 1,)
+
+    # Scaled and offset, starting later in the cycle, and sampled at another rate and frequency
+    data = one_period('pwm', frequency=100, duty_cycle=0.3, v_min=0.2)
+    assert np.allclose(shape_fingerprint(np.column_stack((data[:,0], 3 * data[:,1] + 0.5))), fingerprint)
+    # Resampling to RESAMPLE_LENGTH points moves the edges of a square wave by up to a point
+    assert np.linalg.norm(shape_fingerprint(np.roll(data, 1234, axis=0)) - fingerprint) < 0.05
+    assert np.allclose(shape_fingerprint(one_period('pwm', framerate=100000, frequency=250, duty_cycle=0.3,
+                                                    v_min=0.2)), fingerprint, atol=1e-2)
+
+    # A different shape, and a flat period
+    sine = shape_fingerprint(one_period('sine', frequency=100, modulation=0.1))
+    assert 0.1 < np.linalg.norm(sine - fingerprint) <= 2
+    assert not shape_fingerprint(np.ones((100, 2))).any()
+
+
+def test_index_query():
+    index = FingerprintIndex(['a', 'b', 'c'], [[0, 0], [1, 0], [3, 0]])
+    assert len(index) == 3
+    assert index.query([0.9, 0], k=2) == [('b', pytest.approx(0.1)), ('a', pytest.approx(0.9))]
+    assert [name for (name, _) in index.query([0.9, 0], k=2, exclude='b')] == ['a', 'c']
+    assert FingerprintIndex([], []).query([0, 0]) == []
+
+
+def test_collection_similar(tmp_path):
+    captures = {
+        'sine_dim': ('sine', dict(frequency=120, modulation=0.1, phase=0.3)),
+        'sine_bright': ('sine', dict(frequency=200, modulation=0.4, phase=0.3)),
+        'pwm_a': ('pwm', dict(frequency=100, duty_cycle=0.3, v_min=0.2)),
+        'pwm_b': ('pwm', dict(frequency=250, duty_cycle=0.3, v_min=0.5)),
+        'rectified': ('rectified', dict(frequency=100, v_min=0.5)),
+    }
+    for (name, (shape, params)) in captures.items():
+        synthetic.write_csv(str(tmp_path / (name + '.csv')), shape, duration=0.05, **params)
+    collection = WaveformCollection(str(tmp_path))
+
+    assert len(collection.get_similarity_index()) == 5
+    assert [name for (name, _) in collection.similar('sine dim', k=1)] == ['sine bright']
+    assert [name for (name, _) in collection.similar(collection.get('pwm a'), k=1)] == ['pwm b']
+    assert len(collection.similar('rectified', k=10)) == 4
+    with pytest.raises(ValueError):
+        collection.similar('missing')
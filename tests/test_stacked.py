@@ -0,0 +1,61 @@
+"""Tests of the stacked analysis of equal-length captures"""
+
+import numpy as np
+import pytest
+from src import synthetic, waveform
+from src.pipeline import Stage
+from src.stacked import analyze_stack
+from src.waveform import FULL_PIPELINE, FAST_PIPELINE, batch_import, stacked_stages
+
+
+FRAMERATE = 500000
+
+
+def test_stack_matches_single_stages():
+    datas = [synthetic.generate('sine', framerate=FRAMERATE, duration=0.02, noise=0.01, seed=i,
+                                frequency=100 + 50 * i, modulation=0.1 * (i + 1), phase=0.3) for i in range(3)]
+    expected = [waveform.denoise(d.copy()) for d in datas]
+    out = analyze_stack(datas, FRAMERATE)
+
+    for (d, e, o) in zip(datas, expected, out):
+        # The filtered voltages are written back into the data
+        assert o['denoise']['data'] is d
+        assert np.allclose(d, e, rtol=1e-12, atol=1e-12)
+        (v_max, v_min, v_pp, v_avg) = waveform.v_stats(e)
+        assert o['v_stats']['v_avg'] == pytest.approx(v_avg, rel=1e-12)
+        assert o['frequency']['frequency'] == waveform.frequency(e, FRAMERATE, v_avg)
+        assert o['percent_flicker']['percent_flicker'] == pytest.approx(waveform.percent_flicker(v_max, v_pp), rel=1e-12)
+
+
+def test_stacked_stages():
+    assert stacked_stages(FULL_PIPELINE) == ('denoise', 'framerate', 'v_stats', 'frequency', 'percent_flicker')
+    assert stacked_stages(FAST_PIPELINE) == ('framerate', 'v_stats', 'frequency', 'percent_flicker')
+
+    # The stages that depend on a replaced stage run per file
+    pipeline = FULL_PIPELINE.replace('v_stats', Stage('v_stats', waveform.v_stats, ('data',),
+                                                      ('v_max', 'v_min', 'v_pp', 'v_avg'), params={'unused': 1}))
+    assert stacked_stages(pipeline) == ('denoise', 'framerate')
+
+
+def test_matches_serial_import(tmp_path):
+    # Two stacks of different lengths, a file too short for the filter and a bad file
+    paths = []
+    for (i, duration) in enumerate((0.02, 0.03, 0.02, 0.001, 0.03)):
+        paths.append(str(tmp_path / (str(i) + '.csv')))
+        synthetic.write_csv(paths[-1], 'sine', duration=duration, noise=0.01, seed=i, frequency=120 + 10 * i,
+                            modulation=0.2, phase=0.3)
+    paths.insert(2, str(tmp_path / 'bad.csv'))
+    with open(paths[2], 'w') as f:
+        f.write('not a capture\n')
+
+    (serial, serial_failures) = batch_import(paths)
+    (stacked, stacked_failures) = batch_import(paths, stacked=True)
+
+    assert [w.filename for w in stacked] == [w.filename for w in serial]
+    assert [(f.path, f.stage) for f in stacked_failures] == [(f.path, f.stage) for f in serial_failures] == \
+        [(paths[2], 'import'), (paths[4], 'denoise')]
+    for (a, b) in zip(serial, stacked):
+        assert a.frequency == b.frequency
+        assert a.percent_flicker == pytest.approx(b.percent_flicker, rel=1e-12)
+        assert a.flicker_index == pytest.approx(b.flicker_index, rel=1e-9)
+        assert np.allclose(a.get_data(), b.get_data(), rtol=1e-12, atol=1e-12)
@@ -0,0 +1,80 @@
+"""Tests of dimming sweeps"""
+
+import time
+import multiprocessing
+import pytest
+from src import synthetic
+from src.batch import ImportTimeout
+from src.pipeline import Stage
+from src.sweep import DimmingSweep, parse_level, SWEEP_LEVELS
+from src.waveform import FULL_PIPELINE, denoise
+
+
+@pytest.mark.parametrize('filename, level', [
+    ('50.csv', 50),
+    ('Lamp 50%.csv', 50),
+    ('Lamp_50pct.csv', 50),
+    ('captures/lamp2_30 percent_run3.csv', 30),
+    ('Lamp 100% 100%.csv', 100),
+])
+def test_parse_level(filename, level):
+    assert parse_level(filename) == level
+
+
+@pytest.mark.parametrize('filename, message', [
+    ('Lamp.csv', 'No dim level'),
+    ('Lamp2.csv', 'No dim level'),
+    ('Lamp 50% 60%.csv', 'Several dim levels'),
+])
+def test_parse_level_errors(filename, message):
+    with pytest.raises(ValueError, match=message):
+        parse_level(filename)
+
+
+def test_duplicate_levels(tmp_path):
+    for f in ('Lamp 50%.csv', 'Lamp_50pct_run2.csv'):
+        open(str(tmp_path / f), 'w').close()
+    with pytest.raises(ValueError, match='are at 50%'):
+        DimmingSweep.from_directory(str(tmp_path))
+
+
+@pytest.fixture
+def capture(tmp_path):
+    filename = str(tmp_path / 'lamp.csv')
+    synthetic.write_csv(filename, 'sine', duration=0.05, frequency=120, modulation=0.01, phase=0.3)
+    return filename
+
+
+def test_well_needs_every_level(capture):
+    # One file for every level is analyzed once
+    sweep = DimmingSweep({level: capture for level in SWEEP_LEVELS}, 'Lamp')
+    assert len(set(map(id, sweep.waveforms.values()))) == 1
+    agg = sweep.aggregate()
+    assert (agg['missing levels'], agg['WELL v2 L7'], agg['IEEE 1789-2015']) == ([], True, 'No Risk')
+
+    agg = DimmingSweep({level: capture for level in SWEEP_LEVELS[1:]}, 'Lamp').aggregate()
+    assert (agg['missing levels'], agg['WELL v2 L7'], agg['California JA8 2019']) == ([10], False, True)
+
+
+def hang_on_long_captures(data):
+    if len(data) > 25000:
+        time.sleep(5)
+    return denoise(data)
+
+
+@pytest.mark.parametrize('workers', [None, 2])
+def test_timeout(tmp_path, capture, workers):
+    long = str(tmp_path / 'long.csv')
+    synthetic.write_csv(long, 'sine', duration=0.06, frequency=120, modulation=0.01, phase=0.3)
+    pipeline = FULL_PIPELINE.replace('denoise', Stage('denoise', hang_on_long_captures, ('data',), ('data',)))
+
+    start = time.perf_counter()
+    sweep = DimmingSweep({50: capture, 100: long}, 'Lamp', pipeline=pipeline, workers=workers, timeout=1)
+
+    assert time.perf_counter() - start < 4
+    assert list(sweep.waveforms) == [50]
+    if workers is None:
+        assert isinstance(sweep.errors[100], ImportTimeout)
+    else:
+        assert sweep.errors[100].stage == 'timeout'
+    assert multiprocessing.active_children() == []
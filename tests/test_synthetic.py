@@ -0,0 +1,133 @@
+"""Tests of the flicker metrics against synthetic waveforms with a known ground truth"""
+
+import numpy as np
+import pytest
+from src import synthetic, waveform
+from src.periods import period_stats
+
+
+FRAMERATE = 500000
+
+# The sines are shifted so that no sample lands exactly on v_avg, as in a real capture.
+# frequency() counts a sample that equals v_avg as two crossings
+
+
+def test_ground_truth():
+    sine = synthetic.ground_truth('sine', frequency=120, modulation=0.1)
+    assert sine['frequency'] == 120
+    assert sine['percent flicker'] == pytest.approx(0.2 / 1.1 * 100)
+    assert sine['flicker index'] == pytest.approx(0.1 / np.pi, rel=1e-4)
+
+    pwm = synthetic.ground_truth('pwm', frequency=100, duty_cycle=0.3, v_min=0.2)
+    assert pwm['percent flicker'] == pytest.approx(80)
+    assert pwm['flicker index'] == pytest.approx(0.3 * 0.4 / (0.3 + 0.7 * 0.2), rel=1e-4)
+
+
+def test_chunks_match_generate():
+    params = dict(framerate=10000, duration=0.35, noise=0.01, seed=7, frequency=120)
+    whole = synthetic.generate('sine', **params)
+    chunks = list(synthetic.generate_chunks('sine', chunk_size=1000, **params))
+
+    assert len(chunks) == 4
+    assert np.array_equal(np.concatenate(chunks), whole)
+
+
+@pytest.mark.parametrize('shape, params, count', [
+    ('sine', dict(frequency=120, modulation=0.1, phase=0.3), 11),
+    ('pwm', dict(frequency=100, duty_cycle=0.3, v_min=0.2), 8),
+    ('rectified', dict(frequency=100, v_min=0.5), 9),
+])
+def test_period_stats(shape, params, count):
+    truth = synthetic.ground_truth(shape, **params)
+    data = synthetic.generate(shape, framerate=FRAMERATE, duration=0.1, **params)
+    (starts, metrics, stats) = period_stats(data, truth['v_avg'], truth['v_pp'], FRAMERATE)
+
+    # Every complete period between the first and the last rising edge
+    assert len(starts) == count + 1
+    assert stats['flicker index']['count'] == count
+    assert 1 / stats['period']['mean'] == pytest.approx(truth['frequency'], rel=1e-4)
+    assert metrics['flicker index'] == pytest.approx(truth['flicker index'], rel=1e-3)
+    assert metrics['percent flicker'] == pytest.approx(truth['percent flicker'], rel=1e-3)
+
+
+@pytest.mark.parametrize('frequency, modulation', [(120, 0.1), (200, 0.4)])
+def test_waveform_metrics(frequency, modulation):
+    params = dict(frequency=frequency, modulation=modulation, phase=0.3)
+    truth = synthetic.ground_truth('sine', **params)
+    data = synthetic.generate('sine', framerate=FRAMERATE, duration=0.1, noise=0.01, seed=3, **params)
+    w = waveform.Waveform.from_array(data, 'sine', framerate=FRAMERATE)
+
+    assert w.get_frequency(rounded=False) == frequency
+    assert w.get_percent_flicker(rounded=False) == pytest.approx(truth['percent flicker'], rel=0.01)
+    assert w.get_flicker_index(rounded=False) == pytest.approx(truth['flicker index'], rel=0.01)
+    assert w.get_period_stats('flicker index')['mean'] == pytest.approx(truth['flicker index'], rel=0.01)
+    assert w.get_period_stats('flicker index')['count'] == frequency // 10 - 1
+
+
+@pytest.mark.parametrize('num_periods', [1, 3])
+def test_n_periods(num_periods):
+    params = dict(frequency=120, modulation=0.1, phase=0.3)
+    data = synthetic.generate('sine', framerate=FRAMERATE, duration=0.1, **params)
+    w = waveform.Waveform.from_array(data, 'sine', framerate=FRAMERATE)
+    out = w.get_n_periods(num_periods)
+
+    # Whole periods that start on a rising edge through v_avg, with the time starting at 0
+    samples = int(FRAMERATE / 120)
+    assert len(out) == num_periods * samples
+    assert out[0,0] == 0
+    assert out[0,1] == pytest.approx(w.v_avg, abs=1e-3)
+    assert out[1,1] > out[0,1]
+    assert np.allclose(out[:samples,1], out[-samples:,1], atol=1e-3)
+
+
+def test_per_period_flicker_index():
+    # The crossings of rectified mains are not evenly spaced, so the frequency estimate and
+    # the first period are slightly off. The per-period metrics segment every period instead
+    params = dict(frequency=100, v_min=0.5)
+    truth = synthetic.ground_truth('rectified', **params)
+    data = synthetic.generate('rectified', framerate=FRAMERATE, duration=0.1, noise=0.01, seed=3, **params)
+    w = waveform.Waveform.from_array(data, 'rectified', framerate=FRAMERATE)
+    stats = w.get_period_stats()
+
+    assert stats['flicker index']['count'] == 9
+    assert stats['flicker index']['mean'] == pytest.approx(truth['flicker index'], rel=1e-3)
+    assert stats['flicker index']['std'] < 1e-3
+    assert 1 / stats['period']['mean'] == pytest.approx(100, rel=1e-3)
+    assert w.get_percent_flicker(rounded=False) == pytest.approx(truth['percent flicker'], rel=0.01)
+
+
+def test_csv_round_trip(tmp_path):
+    filename = str(tmp_path / 'sine.csv')
+    written = synthetic.write_csv(filename, 'sine', framerate=10000, duration=0.1, chunk_size=300,
+                                  frequency=120)
+    data = waveform.import_waveform_csv(filename)
+
+    assert written == len(data) == 1000
+    assert np.allclose(data, synthetic.generate('sine', framerate=10000, duration=0.1, frequency=120))
+
+
+def test_n_periods_leaves_room():
+    params = dict(frequency=120, modulation=0.1, phase=0.3)
+    data = synthetic.generate('sine', framerate=FRAMERATE, duration=0.1, **params)
+    v_avg = synthetic.ground_truth('sine', **params)['v_avg']
+    rising = np.flatnonzero((data[:-1,1] <= v_avg) & (data[1:,1] > v_avg)) + 1
+
+    # The sample nearest v_avg is in the last period, which the slice must not start from
+    data[rising[-1],1] = v_avg + 1e-9
+    out = waveform.n_periods(data, v_avg, 1 / 120, num_periods=11)
+
+    assert len(out) == 11 * int(FRAMERATE / 120)
+    assert np.array_equal(out[:,1], data[rising[0]:rising[0]+len(out),1])
+
+
+def test_period_stats_are_opt_in():
+    params = dict(frequency=120, modulation=0.1, phase=0.3)
+    data = synthetic.generate('sine', framerate=FRAMERATE, duration=0.1, noise=0.01, seed=3, **params)
+    w = waveform.Waveform.from_array(data, 'sine', framerate=FRAMERATE)
+    assert (w.period_stats, w.period_starts, w.fingerprint) == (None, None, None)
+
+    # Computed on first use, as PERIOD_STATS_PIPELINE computes them
+    full = waveform.Waveform.from_array(data, 'sine', framerate=FRAMERATE, pipeline=waveform.PERIOD_STATS_PIPELINE)
+    assert w.get_period_stats() == full.period_stats
+    assert np.array_equal(w.period_starts, full.period_starts)
+    assert np.array_equal(w.get_fingerprint(), full.fingerprint)